@@ -2,13 +2,21 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 from .misc import ChemfilesError, set_warnings_callback, add_configuration
-from .atom import Atom
+from .atom import Atom, AtomsTable
 from .residue import Residue
-from .topology import Topology, BondOrder
+from .topology import Topology, BondOrder, BondGraph
 from .cell import UnitCell, CellShape
 from .frame import Frame
 from .trajectory import Trajectory
-from .selection import Selection
+from .selection import Selection, SelectionSet, SelectionMatches, evaluate_selections
 from .property import Property
+from .shared import SharedFrame, SharedFrameHandle, SharedFrameView
+from .neighbors import neighbor_pairs
+from .bonds import BondGuesser
+from .contacts import ContactMap
+from .hbonds import HydrogenBonds
+from .density import DensityGrid, density_grid
+from .store import FrameStore
+from .pipeline import extract_selection
 
 __version__ = "0.9.3"
@@ -0,0 +1,358 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from .misc import ChemfilesError
+from .selection import _selection_indexes
+from .parallel import _parallel_map, _process_count
+
+
+def superposition(mobile, reference, weights=None):
+    """
+    Get the optimal superposition of ``mobile`` onto ``reference`` using the
+    Kabsch algorithm, as a ``(rotations, translations)`` tuple.
+
+    ``mobile`` can be the positions of a single frame with shape ``(natoms,
+    3)``, or a block of frames with shape ``(nframes, natoms, 3)``;
+    ``reference`` must have shape ``(natoms, 3)``. All the frames are
+    processed in a single batched computation. The superposed positions are
+    given by ``np.matmul(mobile, rotations) + translations[..., np.newaxis,
+    :]``, where ``rotations`` has shape ``(..., 3, 3)`` and ``translations``
+    has shape ``(..., 3)``.
+
+    ``weights`` (for example the atomic masses) can be used to perform a
+    weighted superposition.
+    """
+    mobile, reference, weights = _check_inputs(mobile, reference, weights)
+    return _kabsch(mobile, reference, weights)
+
+
+def rmsd(mobile, reference, weights=None, fit=True):
+    """
+    Get the root-mean-square deviation between ``mobile`` and ``reference``.
+    ``mobile`` can have shape ``(natoms, 3)`` or ``(nframes, natoms, 3)``, in
+    which case an array of ``nframes`` RMSD is returned.
+
+    If ``fit`` is ``True``, the RMSD is computed after the optimal
+    superposition of ``mobile`` onto ``reference``, without modifying
+    ``mobile``. ``weights`` can be used to compute a weighted RMSD.
+    """
+    mobile, reference, weights = _check_inputs(mobile, reference, weights)
+    if fit:
+        rotations, translations = _kabsch(mobile, reference, weights)
+        mobile = np.matmul(mobile, rotations) + translations[..., np.newaxis, :]
+    return _rmsd(mobile, reference, weights)
+
+
+def align(positions, reference, fit=None, measure=None, weights=None):
+    """
+    Superpose ``positions`` onto ``reference`` in place, and return the RMSD
+    after the superposition.
+
+    ``positions`` must be a float64 numpy array with shape ``(natoms, 3)`` or
+    ``(nframes, natoms, 3)``, and ``reference`` an array with shape ``(natoms,
+    3)``. ``fit`` and ``measure`` are lists of atomic indexes: the
+    superposition is computed using the atoms in ``fit``, and the RMSD
+    using the atoms in ``measure``. They both default to all atoms, and
+    ``measure`` defaults to ``fit`` if only the latter is given. ``weights``
+    contains one weight per atom, for example the atomic masses, and is
+    used for both the superposition and the RMSD.
+    """
+    if not isinstance(positions, np.ndarray) or positions.dtype != np.float64:
+        raise ChemfilesError("positions must be a numpy array of float64")
+    if positions.ndim not in (2, 3) or positions.shape[-1] != 3:
+        raise ChemfilesError(
+            "positions must have shape (natoms, 3) or (nframes, natoms, 3), "
+            "got {}".format(positions.shape)
+        )
+    reference = np.asarray(reference, dtype=np.float64)
+    if reference.shape != positions.shape[-2:]:
+        raise ChemfilesError(
+            "wrong shape for reference: expected {}, got {}".format(
+                positions.shape[-2:], reference.shape
+            )
+        )
+
+    natoms = positions.shape[-2]
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (natoms,):
+            raise ChemfilesError(
+                "wrong size for weights: expected {}, got {}".format(natoms, len(weights))
+            )
+
+    if fit is None:
+        fit = np.arange(natoms)
+        if measure is None:
+            measure = fit
+    else:
+        fit = np.asarray(fit, dtype=np.int64).reshape(-1)
+        if measure is None:
+            measure = fit
+    measure = np.asarray(measure, dtype=np.int64).reshape(-1)
+
+    fit_weights = None if weights is None else weights[fit]
+    fit_weights = _normalized_weights(fit_weights, len(fit))
+    rotations, translations = _kabsch(
+        positions[..., fit, :], reference[fit], fit_weights
+    )
+
+    positions[...] = np.matmul(positions, rotations) + translations[..., np.newaxis, :]
+
+    measure_weights = None if weights is None else weights[measure]
+    measure_weights = _normalized_weights(measure_weights, len(measure))
+    return _rmsd(positions[..., measure, :], reference[measure], measure_weights)
+
+
+def rmsd_matrix(trajectory, selection=None, steps=None, mass_weighted=False,
+                output=None, block_size=256, processes=None):
+    """
+    Compute the RMSD after superposition between all pairs of ``steps`` (by
+    default all the steps) in the :py:class:`Trajectory` ``trajectory``, and
+    return it as a ``(nsteps, nsteps)`` matrix.
+
+    ``selection`` can be a :py:class:`Selection`, a selection string or a
+    list of atomic indexes, and restricts the computation to the
+    corresponding atoms. The selection is evaluated with the first step. If
+    ``mass_weighted`` is ``True``, the superposition and the RMSD are weighted
+    by the atomic masses.
+
+    The positions are read once from the trajectory. The matrix is then
+    computed by tiles of ``block_size`` by ``block_size`` steps, distributed
+    over ``processes`` worker processes (by default, one per CPU). When using
+    multiple processes, the positions are shared with the workers through a
+    temporary memory-mapped file.
+
+    If ``output`` is a path, the matrix is written to a memory-mapped ``.npy``
+    file at this path, which can be used for matrices larger than the
+    available memory, and a :py:class:`numpy.memmap` is returned.
+    """
+    if steps is None:
+        steps = range(trajectory.nsteps)
+    steps = np.asarray(steps, dtype=np.int64).reshape(-1)
+    nsteps = len(steps)
+    if block_size < 1:
+        raise ChemfilesError("block_size must be at least 1, got {}".format(block_size))
+
+    if output is None:
+        matrix = np.zeros((nsteps, nsteps))
+    else:
+        matrix = np.lib.format.open_memmap(
+            output, mode="w+", dtype=np.float64, shape=(nsteps, nsteps)
+        )
+    if nsteps == 0:
+        return matrix
+
+    frame = trajectory.read_step(int(steps[0]))
+    indexes = _selection_indexes(frame, selection)
+    weights = None
+    if mass_weighted:
+        weights = frame.atoms.table(["masses"]).masses[indexes]
+    weights = _normalized_weights(weights, len(indexes))
+
+    processes = _process_count(processes)
+    blocks = [(start, min(start + block_size, nsteps)) for start in range(0, nsteps, block_size)]
+    tiles = [(blocks[i], blocks[j]) for i in range(len(blocks)) for j in range(i, len(blocks))]
+
+    directory = None
+    try:
+        shape = (nsteps, len(indexes), 3)
+        if processes == 1:
+            positions = np.zeros(shape)
+            source = positions
+        else:
+            directory = tempfile.mkdtemp()
+            source = os.path.join(directory, "positions.npy")
+            positions = np.lib.format.open_memmap(source, mode="w+", dtype=np.float64, shape=shape)
+
+        for start, stop in blocks:
+            block = trajectory.read_positions(steps[start:stop], indexes)
+            block -= np.matmul(weights, block)[:, np.newaxis, :]
+            positions[start:stop] = block
+
+        if directory is not None:
+            positions.flush()
+            del positions
+
+        results = _parallel_map(_rmsd_tile, tiles, _rmsd_setup, (source, weights, output), processes)
+        for ((a_start, a_stop), (b_start, b_stop)), tile in zip(tiles, results):
+            if tile is not None:
+                matrix[a_start:a_stop, b_start:b_stop] = tile
+                matrix[b_start:b_stop, a_start:a_stop] = tile.T
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return matrix
+
+
+def _check_inputs(mobile, reference, weights):
+    mobile = np.asarray(mobile, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    if mobile.ndim not in (2, 3) or mobile.shape[-1] != 3:
+        raise ChemfilesError(
+            "mobile must have shape (natoms, 3) or (nframes, natoms, 3), "
+            "got {}".format(mobile.shape)
+        )
+    if reference.shape != mobile.shape[-2:]:
+        raise ChemfilesError(
+            "wrong shape for reference: expected {}, got {}".format(
+                mobile.shape[-2:], reference.shape
+            )
+        )
+    weights = _normalized_weights(weights, mobile.shape[-2])
+    return mobile, reference, weights
+
+
+def _normalized_weights(weights, natoms):
+    """Get the weights (uniform by default) normalized to a sum of 1"""
+    if natoms == 0:
+        raise ChemfilesError("can not superpose an empty set of atoms")
+    if weights is None:
+        return np.full(natoms, 1.0 / natoms)
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (natoms,):
+        raise ChemfilesError(
+            "wrong size for weights: expected {}, got {}".format(natoms, len(weights))
+        )
+    total = np.sum(weights)
+    if total <= 0:
+        raise ChemfilesError("the sum of the weights must be positive")
+    return weights / total
+
+
+def _kabsch(mobile, reference, weights):
+    """
+    Batched Kabsch algorithm with normalized ``weights``, returning the
+    rotations and translations superposing ``mobile`` onto ``reference``.
+    """
+    mobile_center = np.matmul(weights, mobile)
+    reference_center = np.dot(weights, reference)
+    mobile = mobile - mobile_center[..., np.newaxis, :]
+    reference = reference - reference_center
+
+    # weighted covariance matrices, with shape (..., 3, 3)
+    covariance = np.matmul(np.swapaxes(mobile * weights[:, np.newaxis], -1, -2), reference)
+    u, _, vt = np.linalg.svd(covariance)
+
+    # correct for improper rotations (reflections)
+    sign = np.where(np.linalg.det(np.matmul(u, vt)) < 0, -1.0, 1.0)
+    u[..., :, 2] *= sign[..., np.newaxis]
+
+    rotations = np.matmul(u, vt)
+    translations = reference_center - np.einsum("...i,...ij->...j", mobile_center, rotations)
+
+    return rotations, translations
+
+
+def _rmsd(mobile, reference, weights):
+    squared = np.sum((mobile - reference) ** 2, axis=-1)
+    return np.sqrt(np.matmul(squared, weights))
+
+
+def _rmsd_setup(positions, weights, output):
+    """Open the memory-mapped files used by ``_rmsd_tile`` in a worker"""
+    if not isinstance(positions, np.ndarray):
+        positions = np.load(positions, mmap_mode="r")
+    if output is not None:
+        output = np.load(output, mmap_mode="r+")
+    return positions, weights, output
+
+
+def _rmsd_tile(state, tile):
+    """
+    Compute the RMSD between two blocks of centered positions. The tile is
+    written to the output if there is one, and returned otherwise.
+    """
+    positions, weights, output = state
+    (a_start, a_stop), (b_start, b_stop) = tile
+    first = np.asarray(positions[a_start:a_stop])
+    second = np.asarray(positions[b_start:b_stop])
+    count_a, natoms, _ = first.shape
+    count_b = len(second)
+
+    # covariance matrices for all pairs of frames, with shape (na, nb, 3, 3),
+    # computed with a single matrix product
+    weighted = (first * weights[:, np.newaxis]).transpose(0, 2, 1).reshape(3 * count_a, natoms)
+    covariance = np.dot(weighted, second.transpose(1, 0, 2).reshape(natoms, 3 * count_b))
+    covariance = covariance.reshape(count_a, 3, count_b, 3).transpose(0, 2, 1, 3)
+
+    inner_a = np.dot(np.sum(first ** 2, axis=2), weights)
+    inner_b = np.dot(np.sum(second ** 2, axis=2), weights)
+    inner = (inner_a[:, np.newaxis] + inner_b[np.newaxis, :]) / 2
+
+    squared = 2 * (inner - _qcp_eigenvalue(covariance, inner))
+    result = np.sqrt(np.maximum(squared, 0.0))
+    if a_start == b_start:
+        np.fill_diagonal(result, 0.0)
+
+    if output is None:
+        return result
+    else:
+        output[a_start:a_stop, b_start:b_stop] = result
+        output[b_start:b_stop, a_start:a_stop] = result.T
+        return None
+
+
+def _qcp_eigenvalue(covariance, inner, precision=1e-11, max_iterations=50):
+    """
+    Get the largest eigenvalue of the quaternion key matrix built from the
+    ``covariance`` matrices, using the QCP method (Theobald, Acta Cryst. 2005,
+    A61, 478-480) vectorized over all the matrices. This is equal to the sum
+    of the singular values of the covariance (with a sign correction for
+    reflections), without requiring a singular value decomposition.
+
+    The Newton iterations start from ``inner``, half of the sum of the inner
+    products of the two structures, which is an upper bound of the result.
+    """
+    sxx, sxy, sxz = covariance[..., 0, 0], covariance[..., 0, 1], covariance[..., 0, 2]
+    syx, syy, syz = covariance[..., 1, 0], covariance[..., 1, 1], covariance[..., 1, 2]
+    szx, szy, szz = covariance[..., 2, 0], covariance[..., 2, 1], covariance[..., 2, 2]
+
+    sxx2, syy2, szz2 = sxx * sxx, syy * syy, szz * szz
+    sxy2, syz2, sxz2 = sxy * sxy, syz * syz, sxz * sxz
+    syx2, szy2, szx2 = syx * syx, szy * szy, szx * szx
+
+    syz_szy_syy_szz2 = 2.0 * (syz * szy - syy * szz)
+    sxx2_syy2_szz2_syz2_szy2 = syy2 + szz2 - sxx2 + syz2 + szy2
+    sxy2_sxz2_syx2_szx2 = sxy2 + sxz2 - syx2 - szx2
+
+    c2 = -2.0 * (sxx2 + syy2 + szz2 + sxy2 + syx2 + sxz2 + szx2 + syz2 + szy2)
+    c1 = 8.0 * (sxx * syz * szy + syy * szx * sxz + szz * sxy * syx
+                - sxx * syy * szz - syz * szx * sxy - szy * syx * sxz)
+
+    sxz_p_szx, syz_p_szy, sxy_p_syx = sxz + szx, syz + szy, sxy + syx
+    syz_m_szy, sxz_m_szx, sxy_m_syx = syz - szy, sxz - szx, sxy - syx
+    sxx_p_syy, sxx_m_syy = sxx + syy, sxx - syy
+
+    c0 = sxy2_sxz2_syx2_szx2 * sxy2_sxz2_syx2_szx2
+    c0 += (sxx2_syy2_szz2_syz2_szy2 + syz_szy_syy_szz2) * (sxx2_syy2_szz2_syz2_szy2 - syz_szy_syy_szz2)
+    c0 += (-sxz_p_szx * syz_m_szy + sxy_m_syx * (sxx_m_syy - szz)) * \
+          (-sxz_m_szx * syz_p_szy + sxy_m_syx * (sxx_m_syy + szz))
+    c0 += (-sxz_p_szx * syz_p_szy - sxy_p_syx * (sxx_p_syy - szz)) * \
+          (-sxz_m_szx * syz_m_szy - sxy_p_syx * (sxx_p_syy + szz))
+    c0 += (sxy_p_syx * syz_p_szy + sxz_p_szx * (sxx_m_syy + szz)) * \
+          (-sxy_m_syx * syz_m_szy + sxz_p_szx * (sxx_p_syy + szz))
+    c0 += (sxy_p_syx * syz_m_szy + sxz_m_szx * (sxx_m_syy - szz)) * \
+          (-sxy_m_syx * syz_p_szy + sxz_m_szx * (sxx_p_syy - szz))
+
+    eigenvalue = np.array(inner, dtype=np.float64)
+    # Newton iterations converge slowly to the degenerate root of a zero
+    # covariance matrix, but we know the result in this case
+    eigenvalue[np.all(covariance == 0, axis=(-2, -1))] = 0.0
+    for _ in range(max_iterations):
+        squared = eigenvalue * eigenvalue
+        b = (squared + c2) * eigenvalue
+        a = b + c1
+        denominator = 2.0 * squared * eigenvalue + b + a
+        # avoid dividing by zero when both structures are collapsed on a point
+        denominator[denominator == 0] = 1.0
+        delta = (a * eigenvalue + c0) / denominator
+        eigenvalue -= delta
+        if np.all(np.abs(delta) <= precision * np.abs(eigenvalue)):
+            break
+    return eigenvalue
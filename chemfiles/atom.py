@@ -1,8 +1,9 @@
 # -*- coding=utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
-from ctypes import c_double, c_uint64, c_char_p
+from ctypes import c_double, c_uint64, c_char_p, create_string_buffer
+import numpy as np
 
-from .utils import CxxPointer, _call_with_growing_buffer, string_type
+from .utils import CxxPointer, _call_with_growing_buffer, _check_handle, string_type
 from .misc import ChemfilesError
 from .property import Property
 
@@ -36,6 +37,11 @@ class Atom(CxxPointer):
     def __copy__(self):
         return Atom.from_mutable_ptr(None, self.ffi.chfl_atom_copy(self.ptr))
 
+    def __reduce__(self):
+        properties = dict((name, self[name]) for name in self.list_properties())
+        state = (self.name, self.type, self.mass, self.charge, properties)
+        return (_atom_from_state, state)
+
     def __repr__(self):
         name = self.name
         type = self.type
@@ -183,3 +189,176 @@ class Atom(CxxPointer):
         names = StringArray()
         self.ffi.chfl_atom_list_properties(self.ptr, names, count)
         return list(map(lambda n: n.decode("utf8"), names))
+
+
+def _atom_from_state(name, type, mass, charge, properties):
+    """Re-create an :py:class:`Atom` from the data in ``Atom.__reduce__``"""
+    atom = Atom(name)
+    atom.type = type
+    atom.mass = mass
+    atom.charge = charge
+    for key, value in properties.items():
+        atom[key] = value
+    return atom
+
+
+class AtomsTable(object):
+    """
+    Columnar view of the properties of all the atoms in a :py:class:`Frame`
+    or a :py:class:`Topology`, stored as numpy arrays:
+
+    - ``names`` and ``types``: arrays of strings;
+    - ``masses`` and ``charges``: arrays of ``float64``;
+    - ``atomic_numbers``: array of ``uint64``;
+    - ``vdw_radii`` and ``covalent_radii``: arrays of ``float64``.
+
+    Columns which were not requested when creating the table are ``None``.
+    """
+
+    FIELDS = (
+        "names",
+        "types",
+        "masses",
+        "charges",
+        "atomic_numbers",
+        "vdw_radii",
+        "covalent_radii",
+    )
+
+    def __init__(self, count, fields=None):
+        """
+        Create a new :py:class:`AtomsTable` for ``count`` atoms, allocating
+        the given ``fields`` (all fields by default).
+        """
+        fields = _check_fields(fields)
+        self.names = np.zeros(count, dtype="U1") if "names" in fields else None
+        self.types = np.zeros(count, dtype="U1") if "types" in fields else None
+        self.masses = np.zeros(count, np.float64) if "masses" in fields else None
+        self.charges = np.zeros(count, np.float64) if "charges" in fields else None
+        self.atomic_numbers = (
+            np.zeros(count, np.uint64) if "atomic_numbers" in fields else None
+        )
+        self.vdw_radii = np.zeros(count, np.float64) if "vdw_radii" in fields else None
+        self.covalent_radii = (
+            np.zeros(count, np.float64) if "covalent_radii" in fields else None
+        )
+        self.__count = count
+
+    def __len__(self):
+        return self.__count
+
+    def __repr__(self):
+        fields = [f for f in AtomsTable.FIELDS if getattr(self, f) is not None]
+        return "AtomsTable with {} atoms ({})".format(self.__count, ", ".join(fields))
+
+
+def _check_fields(fields):
+    if fields is None:
+        return AtomsTable.FIELDS
+    fields = tuple(fields)
+    for field in fields:
+        if field not in AtomsTable.FIELDS:
+            raise ChemfilesError("unknown atoms table field '{}'".format(field))
+    return fields
+
+
+def _read_string(function, ptr, buffer):
+    """
+    Read a string from ``function`` for the atom at ``ptr``, re-using the
+    same ``buffer`` across calls as long as it is big enough.
+    """
+    buffer[len(buffer) - 2] = b"\0"
+    function(ptr, buffer, c_uint64(len(buffer)))
+    if buffer[len(buffer) - 2] == b"\0":
+        return buffer.value.decode("utf8")
+    else:
+        return _call_with_growing_buffer(
+            lambda buffer, size: function(ptr, buffer, size), initial=2 * len(buffer)
+        )
+
+
+def _atoms_table(ffi, count, atom_ptr, fields):
+    """
+    Build an :py:class:`AtomsTable` for ``count`` atoms, where ``atom_ptr(i)``
+    returns a new C pointer to the atom ``i``.
+    """
+    table = AtomsTable(count, fields)
+    names = [] if table.names is not None else None
+    types = [] if table.types is not None else None
+
+    buffer = create_string_buffer(64)
+    value = c_double()
+    number = c_uint64()
+    for i in range(count):
+        ptr = atom_ptr(i)
+        _check_handle(ptr)
+        try:
+            if names is not None:
+                names.append(_read_string(ffi.chfl_atom_name, ptr, buffer))
+            if types is not None:
+                types.append(_read_string(ffi.chfl_atom_type, ptr, buffer))
+            if table.masses is not None:
+                ffi.chfl_atom_mass(ptr, value)
+                table.masses[i] = value.value
+            if table.charges is not None:
+                ffi.chfl_atom_charge(ptr, value)
+                table.charges[i] = value.value
+            if table.atomic_numbers is not None:
+                ffi.chfl_atom_atomic_number(ptr, number)
+                table.atomic_numbers[i] = number.value
+            if table.vdw_radii is not None:
+                ffi.chfl_atom_vdw_radius(ptr, value)
+                table.vdw_radii[i] = value.value
+            if table.covalent_radii is not None:
+                ffi.chfl_atom_covalent_radius(ptr, value)
+                table.covalent_radii[i] = value.value
+        finally:
+            ffi.chfl_free(ptr)
+
+    if names is not None:
+        table.names = np.array(names, dtype="U").reshape(count)
+    if types is not None:
+        table.types = np.array(types, dtype="U").reshape(count)
+    return table
+
+
+def _set_atoms_table(ffi, count, atom_ptr, table, names, types, masses, charges):
+    """
+    Set the names, types, masses and charges of ``count`` atoms, where
+    ``atom_ptr(i)`` returns a new C pointer to the atom ``i``. Values are
+    taken from the explicit arguments, or from the ``table`` if they are
+    ``None``.
+    """
+    if table is not None:
+        names = table.names if names is None else names
+        types = table.types if types is None else types
+        masses = table.masses if masses is None else masses
+        charges = table.charges if charges is None else charges
+
+    if masses is not None:
+        masses = np.asarray(masses, dtype=np.float64)
+    if charges is not None:
+        charges = np.asarray(charges, dtype=np.float64)
+
+    for column in (names, types, masses, charges):
+        if column is not None and len(column) != count:
+            raise ChemfilesError(
+                "wrong size for atoms table column: expected {}, got {}".format(
+                    count, len(column)
+                )
+            )
+
+    for i in range(count):
+        ptr = atom_ptr(i)
+        _check_handle(ptr)
+        try:
+            if names is not None:
+                ffi.chfl_atom_set_name(ptr, names[i].encode("utf8"))
+            if types is not None:
+                ffi.chfl_atom_set_type(ptr, types[i].encode("utf8"))
+            if masses is not None:
+                ffi.chfl_atom_set_mass(ptr, c_double(masses[i]))
+            if charges is not None:
+                ffi.chfl_atom_set_charge(ptr, c_double(charges[i]))
+        finally:
+            ffi.chfl_free(ptr)
@@ -0,0 +1,191 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import numpy as np
+
+from .cell import CellShape
+from .neighbors import neighbor_pairs, _cell_widths
+
+# Atoms closer than this are considered to be overlapping, and not bonded
+_MINIMAL_DISTANCE = 0.03
+
+
+class BondGuesser(object):
+    """
+    Guess the bonds in the frames of a trajectory from inter-atomic distances,
+    re-using work between consecutive frames.
+
+    Two atoms ``i`` and ``j`` are considered bonded if their distance ``d``
+    verifies ``0.03 < d < r_i + r_j + tolerance``, where ``r_i`` and ``r_j``
+    are the covalent radii of the atoms. Atoms without a known covalent radius
+    are never bonded. This is not the criterion used by
+    :py:func:`Frame.guess_bonds`, and the bonds found by both functions can be
+    different.
+
+    Covalent radii are fetched once, on the first frame. Candidate pairs are
+    found with a cell list, including all pairs up to ``skin`` Å beyond their
+    bonding threshold. For the following frames, only the candidate pairs
+    which may have crossed their threshold (given the displacement of the
+    atoms) are checked again. The candidates are rebuilt when an atom moved
+    by more than ``skin / 2``. In unit cells too small for a cell list, all
+    the pairs of atoms are checked instead, using the minimum image
+    convention.
+
+    If ``reuse_threshold`` is larger than 0, the bonds from the previous
+    frame are returned directly when no atom moved by more than this
+    threshold.
+
+    The guesser assumes all the frames share the same topology: call
+    :py:func:`BondGuesser.reset` when using it with a new system.
+    """
+
+    def __init__(self, tolerance=0.45, skin=1.0, reuse_threshold=0.0):
+        self.tolerance = tolerance
+        self.skin = skin
+        self.reuse_threshold = reuse_threshold
+        self.reset()
+
+    def reset(self):
+        """Forget all the data cached from the previous frames."""
+        self.__radii = None
+        # candidate pairs, with the corresponding bonding thresholds
+        self.__candidates = None
+        self.__thresholds = None
+        # positions used to compute the candidates distances
+        self.__reference = None
+        self.__distances = None
+        # positions and bonds from the last call to guess
+        self.__last_positions = None
+        self.__bonds = None
+
+    def guess(self, frame):
+        """
+        Guess the bonds in the :py:class:`Frame` ``frame``, and return them as
+        an array of shape ``(n, 2)`` containing atomic indexes ``i < j``.
+        """
+        natoms = len(frame.atoms)
+        if natoms == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        positions = np.array(frame.positions, dtype=np.float64)
+        cell = frame.cell
+        if self.__radii is None or len(self.__radii) != natoms:
+            self.reset()
+            self.__radii = frame.atoms.table(["covalent_radii"]).covalent_radii
+
+        if self.__bonds is not None and self.reuse_threshold > 0:
+            displacement = _displacements(cell, positions, self.__last_positions)
+            if np.max(displacement) < self.reuse_threshold:
+                return self.__bonds.copy()
+
+        if self.__candidates is None:
+            self._build_candidates(positions, cell)
+            distances = self.__distances
+        else:
+            displacement = _displacements(cell, positions, self.__reference)
+            if 2 * np.max(displacement) > self.skin:
+                self._build_candidates(positions, cell)
+                distances = self.__distances
+            else:
+                distances = self._update_distances(positions, cell, displacement)
+
+        bonded = (distances > _MINIMAL_DISTANCE) & (distances < self.__thresholds)
+        self.__bonds = self.__candidates[bonded]
+        self.__last_positions = positions
+        return self.__bonds.copy()
+
+    def apply(self, frame):
+        """
+        Guess the bonds in the :py:class:`Frame` ``frame``, and replace the
+        bonds in its topology with them. Only the bonds which changed are
+        removed from or added to the topology.
+        """
+        natoms = len(frame.atoms)
+        bonds = self.guess(frame)
+        existing = frame.topology.bonds.astype(np.int64)
+
+        new_keys = bonds[:, 0] * natoms + bonds[:, 1]
+        old_keys = existing[:, 0] * natoms + existing[:, 1]
+        removed = np.setdiff1d(old_keys, new_keys)
+        frame.remove_bonds(np.column_stack([removed // natoms, removed % natoms]))
+        added = np.setdiff1d(new_keys, old_keys)
+        frame.add_bonds(np.column_stack([added // natoms, added % natoms]))
+
+    def _build_candidates(self, positions, cell):
+        radii = self.__radii
+        known = np.nonzero(radii > 0)[0]
+        thresholds = np.zeros(0)
+        candidates = np.zeros((0, 2), dtype=np.int64)
+        distances = np.zeros(0)
+        if len(known) >= 2:
+            cutoff = 2 * np.max(radii) + self.tolerance + self.skin
+            if _too_small(cell, cutoff):
+                pairs, distances = _minimum_image_pairs(positions[known], cutoff, cell)
+            else:
+                pairs, distances = neighbor_pairs(positions[known], cutoff, cell)
+            candidates = known[pairs]
+            thresholds = radii[candidates[:, 0]] + radii[candidates[:, 1]] + self.tolerance
+            close = distances < thresholds + self.skin
+            candidates = candidates[close]
+            thresholds = thresholds[close]
+            distances = distances[close]
+
+        self.__candidates = candidates
+        self.__thresholds = thresholds
+        self.__distances = distances
+        self.__reference = positions
+
+    def _update_distances(self, positions, cell, displacement):
+        """
+        Get the current distances for all candidate pairs, only computing the
+        distances of the pairs which may have crossed their threshold.
+        """
+        candidates = self.__candidates
+        thresholds = self.__thresholds
+        distances = self.__distances.copy()
+
+        # the distance of each pair changed at most by this amount since the
+        # reference positions
+        slack = displacement[candidates[:, 0]] + displacement[candidates[:, 1]]
+        surely_bonded = (distances - slack > _MINIMAL_DISTANCE) & (distances + slack < thresholds)
+        surely_not = (distances - slack >= thresholds) | (distances + slack <= _MINIMAL_DISTANCE)
+        uncertain = np.nonzero(~(surely_bonded | surely_not))[0]
+
+        pairs = candidates[uncertain]
+        vectors = cell._minimum_image(positions[pairs[:, 1]] - positions[pairs[:, 0]])
+        distances[uncertain] = np.sqrt(np.sum(vectors ** 2, axis=1))
+        return distances
+
+
+def _too_small(cell, cutoff):
+    """Check if ``cell`` is too small to use a cell list with ``cutoff``"""
+    if cell.shape == CellShape.Infinite:
+        return False
+    matrix, _ = cell._matrices()
+    return np.any(2 * cutoff > _cell_widths(matrix))
+
+
+def _minimum_image_pairs(positions, cutoff, cell):
+    """
+    Find all the pairs of atoms closer than ``cutoff`` in ``positions`` by
+    checking every pair with the minimum image convention, for unit cells
+    too small to use :py:func:`neighbor_pairs`.
+    """
+    all_pairs = [np.zeros((0, 2), dtype=np.int64)]
+    all_distances = [np.zeros(0)]
+    # process the pairs by blocks of rows to limit memory use
+    block = max(1, 2 ** 20 // max(len(positions), 1))
+    for start in range(0, len(positions), block):
+        first = np.arange(start, min(start + block, len(positions)))
+        vectors = cell._minimum_image(positions[None, :, :] - positions[first, None, :])
+        distances = np.sqrt(np.sum(vectors ** 2, axis=2))
+        after = np.arange(len(positions))[None, :] > first[:, None]
+        i, j = np.nonzero((distances < cutoff) & after)
+        all_pairs.append(np.column_stack([first[i], j]))
+        all_distances.append(distances[i, j])
+    return np.concatenate(all_pairs).astype(np.int64), np.concatenate(all_distances)
+
+
+def _displacements(cell, positions, reference):
+    """Get the displacement of each atom between ``reference`` and ``positions``"""
+    vectors = cell._minimum_image(positions - reference)
+    return np.sqrt(np.sum(vectors ** 2, axis=1))
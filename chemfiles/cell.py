@@ -2,8 +2,10 @@
 from __future__ import absolute_import, print_function, unicode_literals
 from ctypes import c_double, ARRAY
 from enum import IntEnum
+import numpy as np
 
 from .utils import CxxPointer
+from .misc import ChemfilesError
 from .ffi import chfl_cellshape, chfl_vector3d
 
 
@@ -62,6 +64,9 @@ class UnitCell(CxxPointer):
     def __copy__(self):
         return UnitCell.from_mutable_ptr(None, self.ffi.chfl_cell_copy(self.ptr))
 
+    def __reduce__(self):
+        return (_cell_from_state, (self.lengths, self.angles, int(self.shape)))
+
     def __repr__(self):
         return "UnitCell({}, {}, {}, {}, {}, {})".format(*(self.lengths + self.angles))
 
@@ -148,3 +153,58 @@ class UnitCell(CxxPointer):
         vector = chfl_vector3d(vector[0], vector[1], vector[2])
         self.ffi.chfl_cell_wrap(self.ptr, vector)
         return (vector[0], vector[1], vector[2])
+
+    def wrap_positions(self, positions):
+        """
+        Wrap all the vectors in the numpy array ``positions`` in this
+        :py:class:`UnitCell`, in place, and return the array.
+
+        ``positions`` must be an array of ``float64`` with shape ``(..., 3)``,
+        for example the :py:attr:`Frame.positions` array. The vectors are
+        wrapped in the same way as :py:func:`UnitCell.wrap`, but all at once.
+        """
+        if not isinstance(positions, np.ndarray) or positions.dtype != np.float64:
+            raise ChemfilesError("positions must be a numpy array of float64")
+        if positions.ndim == 0 or positions.shape[-1] != 3:
+            raise ChemfilesError(
+                "positions must have a shape of (..., 3), got {}".format(positions.shape)
+            )
+
+        shape = self.shape
+        if shape == CellShape.Orthorhombic:
+            lengths = np.array(self.lengths)
+            positions -= lengths * _round(positions / lengths)
+        elif shape == CellShape.Triclinic:
+            matrix, inverse = self._matrices()
+            fractional = np.dot(positions, inverse.T)
+            fractional -= _round(fractional)
+            positions[...] = np.dot(fractional, matrix.T)
+        return positions
+
+    def _matrices(self):
+        """
+        Get the matrix of this :py:class:`UnitCell` and its inverse as numpy
+        arrays.
+        """
+        matrix = np.array(self.matrix, dtype=np.float64)
+        return matrix, np.linalg.inv(matrix)
+
+    def _minimum_image(self, vectors):
+        """
+        Apply the minimum image convention to an array of ``vectors`` with
+        shape ``(..., 3)``, and return the new vectors.
+        """
+        return self.wrap_positions(np.array(vectors, dtype=np.float64))
+
+
+def _round(array):
+    """Round to the nearest integer, with halfway cases away from zero"""
+    return np.trunc(array + np.copysign(0.5, array))
+
+
+def _cell_from_state(lengths, angles, shape):
+    """Re-create an :py:class:`UnitCell` from the data in ``UnitCell.__reduce__``"""
+    cell = UnitCell(*(lengths + angles))
+    if cell.shape != shape:
+        cell.shape = shape
+    return cell
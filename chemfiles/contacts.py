@@ -0,0 +1,178 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import numpy as np
+
+from .misc import ChemfilesError
+from .neighbors import neighbor_pairs
+from .selection import _selection_indexes
+
+# Compact the pending contacts once they contain this many entries
+_COMPACT_SIZE = 1 << 20
+
+
+class ContactMap(object):
+    """
+    Compute the contacts between atoms or residues closer than ``cutoff``,
+    and accumulate the contact frequencies over the frames of a trajectory.
+
+    ``selection`` can be a :py:class:`Selection`, a selection string or a
+    list of atomic indexes, and restricts the contacts to the corresponding
+    atoms. If ``residues`` is ``True``, two residues are in contact if any
+    pair of atoms in these residues is in contact; contacts inside a residue
+    and with atoms not part of a residue are ignored.
+
+    The selection and the residue of each atom are only computed with the
+    first frame, the topology is assumed to be the same for all the
+    following frames. Call :py:func:`ContactMap.reset` when using it with a
+    new system.
+
+    Contacts are given in a sparse format, as a ``(pairs, values)`` tuple,
+    where ``pairs`` is an array of shape ``(n, 2)`` containing the atomic or
+    residue indexes ``i < j`` of the pairs in contact.
+    """
+
+    def __init__(self, cutoff, selection=None, residues=False):
+        self.cutoff = cutoff
+        self.selection = selection
+        self.residues = residues
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the selection and residues computed with the previous frames,
+        and the accumulated contact frequencies.
+        """
+        self.__natoms = None
+        self.__indexes = None
+        self.__residue_indexes = None
+        # number of atoms or residues, used to encode pairs as a single key
+        self.__size = 0
+        self.__nframes = 0
+        self.__counter = _KeyCounter()
+
+    @property
+    def nframes(self):
+        """Get the number of frames added to this :py:class:`ContactMap`."""
+        return self.__nframes
+
+    def compute(self, frame):
+        """
+        Get the contacts in the :py:class:`Frame` ``frame``, as a ``(pairs,
+        distances)`` tuple. For residues, the distance is the minimal distance
+        between atoms in the two residues.
+        """
+        natoms = len(frame.atoms)
+        if self.__indexes is None or natoms != self.__natoms:
+            self._setup(frame)
+
+        indexes = self.__indexes
+        if natoms == 0:
+            positions = np.zeros((0, 3))
+        else:
+            positions = frame.positions[indexes]
+        pairs, distances = neighbor_pairs(positions, self.cutoff, frame.cell)
+
+        if not self.residues:
+            return np.sort(indexes[pairs], axis=1), distances
+
+        pairs = self.__residue_indexes[pairs]
+        keep = (pairs[:, 0] >= 0) & (pairs[:, 1] >= 0) & (pairs[:, 0] != pairs[:, 1])
+        pairs = np.sort(pairs[keep], axis=1)
+        distances = distances[keep]
+
+        # only keep the shortest distance for each pair of residues
+        keys = pairs[:, 0] * self.__size + pairs[:, 1]
+        order = np.lexsort((distances, keys))
+        keys = keys[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        return pairs[order][first], distances[order][first]
+
+    def add(self, frame):
+        """
+        Compute the contacts in the :py:class:`Frame` ``frame`` with
+        :py:func:`ContactMap.compute`, and add them to the accumulated
+        contact frequencies. The contacts in this frame are returned, and can
+        be used to build a time series of contacts.
+        """
+        pairs, distances = self.compute(frame)
+        self.__counter.add(pairs[:, 0] * self.__size + pairs[:, 1])
+        self.__nframes += 1
+        return pairs, distances
+
+    def frequencies(self):
+        """
+        Get the accumulated contact frequencies, as a ``(pairs,
+        frequencies)`` tuple. The frequency of a pair is the fraction of the
+        frames where this pair was in contact, and only pairs in contact in at
+        least one frame are included.
+        """
+        if self.__nframes == 0:
+            raise ChemfilesError("no frame was added to this ContactMap")
+        keys, counts = self.__counter.counts()
+        pairs = np.stack([keys // self.__size, keys % self.__size], axis=1)
+        return pairs, counts / float(self.__nframes)
+
+    def frequency_matrix(self):
+        """
+        Get the accumulated contact frequencies as a dense, symmetric matrix
+        with one row and one column for each atom (or residue).
+        """
+        pairs, frequencies = self.frequencies()
+        matrix = np.zeros((self.__size, self.__size))
+        matrix[pairs[:, 0], pairs[:, 1]] = frequencies
+        matrix[pairs[:, 1], pairs[:, 0]] = frequencies
+        return matrix
+
+    def _setup(self, frame):
+        natoms = len(frame.atoms)
+        if self.__natoms is not None and self.__nframes != 0:
+            raise ChemfilesError(
+                "the number of atoms changed from {} to {}, call reset() to use "
+                "this ContactMap with a different system".format(self.__natoms, natoms)
+            )
+        self.__natoms = natoms
+        self.__indexes = _selection_indexes(frame, self.selection)
+        if self.residues:
+            topology = frame.topology
+            self.__residue_indexes = topology.residue_indexes()[self.__indexes]
+            self.__size = len(topology.residues)
+        else:
+            self.__size = natoms
+
+
+class _KeyCounter(object):
+    """
+    Count the number of times integer keys are seen, accumulating the keys
+    in bulk and merging them with numpy once enough keys are pending.
+    """
+
+    def __init__(self):
+        # sorted unique keys, and the corresponding counts
+        self.__keys = np.zeros(0, dtype=np.int64)
+        self.__counts = np.zeros(0, dtype=np.int64)
+        self.__pending = []
+        self.__pending_size = 0
+
+    def add(self, keys):
+        """Add all the values in the ``keys`` array"""
+        self.__pending.append(np.asarray(keys, dtype=np.int64))
+        self.__pending_size += len(keys)
+        if self.__pending_size > max(len(self.__keys), _COMPACT_SIZE):
+            self._compact()
+
+    def counts(self):
+        """Get the sorted unique keys, and how many times they were seen"""
+        self._compact()
+        return self.__keys, self.__counts
+
+    def _compact(self):
+        """Merge the pending keys with the accumulated ones"""
+        if len(self.__pending) == 0:
+            return
+        keys = np.concatenate([self.__keys] + self.__pending)
+        counts = np.concatenate([self.__counts, np.ones(self.__pending_size, dtype=np.int64)])
+        self.__keys, inverse = np.unique(keys, return_inverse=True)
+        self.__counts = np.bincount(inverse.reshape(-1), weights=counts).astype(np.int64)
+        self.__pending = []
+        self.__pending_size = 0
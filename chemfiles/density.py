@@ -0,0 +1,174 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import numpy as np
+
+from .misc import ChemfilesError
+from .cell import CellShape
+from .selection import _selection_indexes
+from .parallel import _parallel_map, _process_count, _worker_copy
+
+# Conversion factor from Angstroms to Bohr, used by cube files
+_ANGSTROM_TO_BOHR = 1.0 / 0.52917721092
+
+
+class DensityGrid(object):
+    """
+    Volumetric density of a group of atoms, accumulated over the frames of a
+    trajectory.
+
+    Positions are binned on a grid with ``bins`` points (an integer, or one
+    integer per cell vector) in fractional coordinates of the
+    :py:class:`UnitCell`, so the same grid can be used for frames with
+    different unit cells. ``selection`` can be a :py:class:`Selection`, a
+    selection string or a list of atomic indexes, and is evaluated for each
+    frame.
+
+    Partial grids (for example computed in different processes) can be
+    combined with :py:func:`DensityGrid.merge`.
+    """
+
+    def __init__(self, bins, selection=None):
+        bins = np.zeros(3, dtype=np.int64) + np.asarray(bins, dtype=np.int64)
+        if bins.shape != (3,) or np.any(bins < 1):
+            raise ChemfilesError("invalid number of bins: {}".format(bins.tolist()))
+        self.bins = tuple(int(n) for n in bins)
+        self.selection = selection
+        self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.nframes = 0
+        # sum of the unit cell matrices, to get the average cell
+        self.matrices = np.zeros((3, 3))
+
+    def add(self, frame, indexes=None):
+        """
+        Add the positions of the selected atoms in the :py:class:`Frame`
+        ``frame`` to this grid. If given, ``indexes`` are used instead of
+        evaluating the selection.
+        """
+        cell = frame.cell
+        if cell.shape == CellShape.Infinite:
+            raise ChemfilesError("can not compute a density grid with an infinite unit cell")
+
+        if indexes is None:
+            indexes = _selection_indexes(frame, self.selection)
+        matrix, inverse = cell._matrices()
+        if len(frame.atoms) != 0 and len(indexes) != 0:
+            fractional = np.dot(frame.positions[indexes], inverse.T)
+            fractional -= np.floor(fractional)
+            bins = np.array(self.bins)
+            cells = np.minimum((fractional * bins).astype(np.int64), bins - 1)
+            flat = np.ravel_multi_index(cells.T, self.bins)
+            self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.bins)
+
+        self.nframes += 1
+        self.matrices += matrix
+
+    def merge(self, other):
+        """
+        Add the data from the :py:class:`DensityGrid` ``other`` to this grid.
+        Both grids must have the same number of bins.
+        """
+        if other.bins != self.bins:
+            raise ChemfilesError(
+                "can not merge grids with different bins: {} and {}".format(self.bins, other.bins)
+            )
+        self.counts += other.counts
+        self.nframes += other.nframes
+        self.matrices += other.matrices
+
+    @property
+    def matrix(self):
+        """Get the matrix of the average unit cell over all the frames."""
+        if self.nframes == 0:
+            raise ChemfilesError("no frame was added to this DensityGrid")
+        return self.matrices / self.nframes
+
+    def density(self):
+        """
+        Get the average number density (in atoms per cubic Angstrom) in each
+        voxel of the grid, using the volume of the average unit cell.
+        """
+        volume = abs(np.linalg.det(self.matrix)) / self.counts.size
+        return self.counts / (self.nframes * volume)
+
+    def write_cube(self, path, frame=None, comment="density computed by chemfiles"):
+        """
+        Write the density to a Gaussian cube file at ``path``. The atoms in
+        the :py:class:`Frame` ``frame`` are included in the file if given.
+        """
+        matrix = self.matrix * _ANGSTROM_TO_BOHR
+        density = self.density()
+        if frame is not None:
+            natoms = len(frame.atoms)
+            numbers = frame.atoms.table(["atomic_numbers"]).atomic_numbers
+            positions = np.asarray(frame.positions).reshape(-1, 3) * _ANGSTROM_TO_BOHR
+        else:
+            natoms = 0
+
+        with open(path, "w") as fd:
+            fd.write(comment.replace("\n", " ") + "\n")
+            fd.write("outer loop: a, middle loop: b, inner loop: c\n")
+            fd.write("{:5d} {:12.6f} {:12.6f} {:12.6f}\n".format(natoms, 0.0, 0.0, 0.0))
+            for n, vector in zip(self.bins, matrix.T):
+                vector = vector / n
+                fd.write("{:5d} {:12.6f} {:12.6f} {:12.6f}\n".format(n, *vector))
+            for i in range(natoms):
+                number = int(numbers[i])
+                fd.write("{:5d} {:12.6f} {:12.6f} {:12.6f} {:12.6f}\n".format(
+                    number, float(number), *positions[i]
+                ))
+
+            # cube files store at most 6 values per line, and start a new
+            # line for each (a, b) row
+            values = density.reshape(-1, self.bins[2])
+            for row in values:
+                for start in range(0, len(row), 6):
+                    fd.write(" ".join("{:13.5E}".format(v) for v in row[start:start + 6]))
+                    fd.write("\n")
+
+
+def density_grid(trajectory, bins, selection=None, steps=None, processes=None):
+    """
+    Compute the :py:class:`DensityGrid` of the atoms in ``selection`` over
+    ``steps`` (by default all the steps) of the :py:class:`Trajectory`
+    ``trajectory``.
+
+    The selection is evaluated with the first step only. The steps are split
+    in chunks processed by ``processes`` worker processes (by default, one
+    per CPU), each opening the trajectory again and computing a partial grid;
+    the partial grids are then merged together.
+    """
+    if steps is None:
+        steps = range(trajectory.nsteps)
+    steps = np.asarray(steps, dtype=np.int64).reshape(-1)
+
+    grid = DensityGrid(bins, selection)
+    if len(steps) == 0:
+        return grid
+
+    indexes = _selection_indexes(trajectory.read_step(int(steps[0])), selection)
+    processes = _process_count(processes)
+    chunks = [chunk for chunk in np.array_split(steps, 4 * processes) if len(chunk) != 0]
+    # the trajectory is opened again in each worker by _density_setup
+    results = _parallel_map(
+        _density_chunk, chunks, _density_setup, (trajectory, grid.bins, indexes), processes
+    )
+    for partial in results:
+        grid.merge(partial)
+    return grid
+
+
+def _density_setup(trajectory, bins, indexes):
+    """
+    Store the data used by ``_density_chunk`` in a worker, opening the
+    trajectory again so that workers do not share the same file.
+    """
+    return _worker_copy(trajectory), bins, indexes
+
+
+def _density_chunk(state, steps):
+    """Compute a partial :py:class:`DensityGrid` for the given ``steps``"""
+    trajectory, bins, indexes = state
+    grid = DensityGrid(bins, indexes)
+    for step in steps:
+        grid.add(trajectory.read_step(int(step)), indexes)
+    return grid
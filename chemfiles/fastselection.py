@@ -0,0 +1,250 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import operator
+import re
+import numpy as np
+
+from .misc import ChemfilesError
+
+# Evaluation of simple atomic selections with numpy, used by SelectionSet
+# with engine="numpy". Only comparisons of name, type, resname, resid, index,
+# mass, x, y and z with a constant value are supported, combined with and,
+# or, not and parentheses; as well as all and none. Other selections are
+# evaluated by chemfiles.
+
+_TOKENS = re.compile(r'\s*(?:(\(|\)|==|!=|<=|>=|<|>)|("[^"]*")|([^\s()"=!<>]+))')
+_CONTEXT = re.compile(r"^\s*atoms\s*:")
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_STRING_FIELDS = ("name", "type", "resname")
+_NUMERIC_FIELDS = ("index", "mass", "resid", "x", "y", "z")
+_KEYWORDS = ("and", "or", "not", "all", "none")
+# AtomsTable column for the fields taken from the atoms
+_TABLE_COLUMNS = {"name": "names", "type": "types", "mass": "masses"}
+
+
+class _Unsupported(Exception):
+    """This selection can not be evaluated with numpy for this frame"""
+    pass
+
+
+def _compile(string):
+    """
+    Compile the selection ``string`` to a function taking an
+    ``_AtomColumns`` and returning a boolean mask of the matching atoms; or
+    return ``None`` if this selection is not supported.
+    """
+    match = _CONTEXT.match(string)
+    if match is not None:
+        string = string[match.end():]
+
+    tokens = _tokenize(string)
+    if tokens is None:
+        return None
+
+    try:
+        parser = _Parser(tokens)
+        node = parser.expression()
+        if parser.peek() is not None:
+            return None
+    except _Unsupported:
+        return None
+    return lambda columns: _evaluate(node, columns)
+
+
+def _tokenize(string):
+    tokens = []
+    position = 0
+    string = string.rstrip()
+    while position < len(string):
+        match = _TOKENS.match(string, position)
+        if match is None or match.end() == position:
+            return None
+        symbol, quoted, word = match.groups()
+        if symbol is not None:
+            tokens.append(("symbol", symbol))
+        elif quoted is not None:
+            tokens.append(("string", quoted[1:-1]))
+        else:
+            tokens.append(("word", word))
+        position = match.end()
+    return tokens
+
+
+class _Parser(object):
+    """
+    Recursive descent parser for the supported selections, producing nested
+    tuples: ``("or", a, b)``, ``("and", a, b)``, ``("not", a)``,
+    ``("all",)``, ``("none",)`` and ``("compare", field, op, value)``.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise _Unsupported()
+        self.position += 1
+        return token
+
+    def accept(self, kind, value):
+        if self.peek() == (kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def expression(self):
+        node = self.conjunction()
+        while self.accept("word", "or"):
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept("word", "and"):
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept("word", "not"):
+            return ("not", self.negation())
+        return self.primary()
+
+    def primary(self):
+        if self.accept("symbol", "("):
+            node = self.expression()
+            if not self.accept("symbol", ")"):
+                raise _Unsupported()
+            return node
+
+        kind, field = self.next()
+        if kind != "word":
+            raise _Unsupported()
+        if field in ("all", "none"):
+            return (field,)
+        if field not in _STRING_FIELDS and field not in _NUMERIC_FIELDS:
+            raise _Unsupported()
+
+        # optional variable, only #1 is valid for atomic selections
+        if self.accept("symbol", "("):
+            if not self.accept("word", "#1") or not self.accept("symbol", ")"):
+                raise _Unsupported()
+
+        op = "=="
+        kind, value = self.peek() or (None, None)
+        if kind == "symbol" and value in _OPERATORS:
+            op = value
+            self.position += 1
+
+        kind, value = self.next()
+        if kind == "symbol" or (kind == "word" and value in _KEYWORDS):
+            raise _Unsupported()
+
+        if field in _STRING_FIELDS:
+            if op not in ("==", "!="):
+                raise _Unsupported()
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                raise _Unsupported()
+        return ("compare", field, op, value)
+
+
+def _evaluate(node, columns):
+    kind = node[0]
+    if kind == "or":
+        return _evaluate(node[1], columns) | _evaluate(node[2], columns)
+    elif kind == "and":
+        return _evaluate(node[1], columns) & _evaluate(node[2], columns)
+    elif kind == "not":
+        return ~_evaluate(node[1], columns)
+    elif kind == "all":
+        return np.ones(columns.natoms, dtype=bool)
+    elif kind == "none":
+        return np.zeros(columns.natoms, dtype=bool)
+    else:
+        _, field, op, value = node
+        return _OPERATORS[op](columns.get(field), value)
+
+
+class _AtomColumns(object):
+    """
+    Columns of atomic properties for a :py:class:`Frame`, extracted when
+    first used. Columns coming from the topology are kept when calling
+    ``update`` with a frame with the same topology.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.natoms = len(frame.atoms)
+        self.__topology = {}
+        self.__positions = None
+
+    def update(self, frame):
+        """Use the positions from ``frame``, which has the same topology"""
+        self.frame = frame
+        self.__positions = None
+
+    def get(self, field):
+        if field in ("x", "y", "z"):
+            if self.__positions is None:
+                if self.natoms == 0:
+                    self.__positions = np.zeros((0, 3))
+                else:
+                    self.__positions = self.frame.positions
+            return self.__positions[:, "xyz".index(field)]
+
+        if field not in self.__topology:
+            self.__topology.update(self._extract(field))
+        column = self.__topology[field]
+        if column is None:
+            # some atoms are not in a residue, or their residue has no id
+            raise _Unsupported()
+        return column
+
+    def _extract(self, field):
+        if field == "index":
+            return {"index": np.arange(self.natoms)}
+        elif field in _TABLE_COLUMNS:
+            column = _TABLE_COLUMNS[field]
+            table = self.frame.atoms.table([column])
+            return {field: getattr(table, column)}
+        else:
+            topology = self.frame.topology
+            residues = topology.residue_indexes()
+            if self.natoms == 0:
+                return {"resname": residues.astype("U"), "resid": residues}
+            if np.any(residues < 0):
+                return {"resname": None, "resid": None}
+
+            names = []
+            ids = []
+            for residue in topology.residues:
+                names.append(residue.name)
+                if ids is not None:
+                    try:
+                        ids.append(residue.id)
+                    except ChemfilesError:
+                        # this residue has no id
+                        ids = None
+
+            names = np.array(names, dtype="U")[residues]
+            if ids is not None:
+                ids = np.array(ids, dtype=np.int64)[residues]
+            return {"resname": names, "resid": ids}
@@ -1,15 +1,19 @@
 # -*- coding=utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 import numpy as np
+import pickle
 from ctypes import c_uint64, c_bool, c_double, c_char_p, POINTER
 
 from .utils import CxxPointer, string_type
 from .misc import ChemfilesError
 from .ffi import chfl_vector3d, chfl_bond_order
-from .atom import Atom
-from .topology import Topology
+from .atom import Atom, _atoms_table, _set_atoms_table
+from .topology import Topology, _topology_state, _topology_from_state
+from .topology import _new_bonds, _existing_bonds, _bonds_csr
 from .cell import UnitCell
 from .property import Property
+from .selection import _selection_indexes
+from .align import align
 
 
 class FrameAtoms(object):
@@ -32,16 +36,99 @@ class FrameAtoms(object):
         if index >= len(self):
             raise IndexError("atom index ({}) out of range for this frame".format(index))
         else:
-            ptr = self.frame.ffi.chfl_atom_from_frame(self.frame.mut_ptr, c_uint64(index))
-            return Atom.from_mutable_ptr(self, ptr)
+            return Atom.from_mutable_ptr(self, self._atom_ptr(index))
 
     def __iter__(self):
         for i in range(len(self)):
-            yield self[i]
+            yield Atom.from_mutable_ptr(self, self._atom_ptr(i))
 
     def __repr__(self):
         return "[" + ", ".join([atom.__repr__() for atom in self]) + "]"
 
+    def table(self, fields=None):
+        """
+        Get the properties of all the atoms in the associated
+        :py:class:`Frame` as an :py:class:`AtomsTable` of numpy arrays.
+
+        ``fields`` can be a list of the :py:class:`AtomsTable` columns to
+        fetch (for example ``["masses", "charges"]``), by default all the
+        columns are fetched.
+        """
+        return _atoms_table(self.frame.ffi, len(self), self._atom_ptr, fields)
+
+    def set_table(self, table=None, names=None, types=None, masses=None, charges=None):
+        """
+        Set the names, types, masses and charges of all the atoms in the
+        associated :py:class:`Frame` from arrays with one value per atom.
+
+        Columns are taken from the :py:class:`AtomsTable` ``table`` if it is
+        given, and the other arguments override the corresponding columns.
+        Columns which are ``None`` are left unchanged.
+        """
+        _set_atoms_table(
+            self.frame.ffi, len(self), self._atom_ptr, table, names, types, masses, charges
+        )
+
+    def _atom_ptr(self, index):
+        return self.frame.ffi.chfl_atom_from_frame(self.frame.mut_ptr, c_uint64(index))
+
+
+class FrameArrayView(object):
+    """
+    Lifetime-safe view into the positions or velocities of a
+    :py:class:`Frame`.
+
+    This object keeps a reference to the frame, and re-acquires the underlying
+    C++ pointer when the frame was modified in a way that may invalidate it
+    (:py:func:`Frame.resize`, :py:func:`Frame.add_atom`,
+    :py:func:`Frame.remove`, ...). It can be indexed like a numpy array, and
+    the :py:attr:`FrameArrayView.array` property gives the current numpy
+    array without any copy.
+    """
+
+    def __init__(self, frame, getter):
+        self.frame = frame
+        self.__getter = getter
+        self.__array = None
+        self.__generation = None
+
+    @property
+    def array(self):
+        """
+        Get a numpy array pointing to the current data in the associated
+        :py:class:`Frame`.
+        """
+        generation = self.frame._Frame__generation
+        if self.__generation != generation:
+            self.__array = self.__getter(self.frame)
+            self.__generation = generation
+        return self.__array
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.array, dtype=dtype)
+        else:
+            return np.asarray(self.array, dtype=dtype)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __setitem__(self, index, value):
+        self.array[index] = value
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __repr__(self):
+        return repr(self.array)
+
 
 class Frame(CxxPointer):
     """
@@ -51,6 +138,13 @@ class Frame(CxxPointer):
     cell), the corresponding data is filled with a default value.
     """
 
+    # Incremented every time the positions and velocities arrays may have been
+    # re-allocated, used by FrameArrayView
+    __generation = 0
+    # Incremented every time the topology may have been modified, used to
+    # invalidate the arrays cached by Topology
+    __topology_generation = 0
+
     def __init__(self):
         """
         Create an empty :py:class:`Frame` that will be resized by the runtime
@@ -61,6 +155,27 @@ class Frame(CxxPointer):
     def __copy__(self):
         return Frame.from_mutable_ptr(None, self.ffi.chfl_frame_copy(self.ptr))
 
+    def __reduce_ex__(self, protocol):
+        positions = self.positions
+        velocities = self.velocities if self.has_velocities() else None
+        if protocol >= 5 and _PickleBuffer is not None:
+            # Send positions and velocities as out-of-band buffers, pointing
+            # directly to the memory of this frame.
+            positions = _PickleBuffer(positions)
+            if velocities is not None:
+                velocities = _PickleBuffer(velocities)
+
+        properties = dict((name, self[name]) for name in self.list_properties())
+        state = (
+            _topology_state(self.topology),
+            positions,
+            velocities,
+            self.cell,
+            self.step,
+            properties,
+        )
+        return (_frame_from_state, state)
+
     def __repr__(self):
         return "Frame with {} atoms".format(len(self.atoms))
 
@@ -79,6 +194,8 @@ class Frame(CxxPointer):
         absence of velocities.
         """
         self.ffi.chfl_frame_resize(self.mut_ptr, c_uint64(count))
+        self._invalidate_arrays()
+        self._topology_modified()
 
     def add_atom(self, atom, position, velocity=None):
         """
@@ -92,6 +209,8 @@ class Frame(CxxPointer):
         if velocity:
             velocity = chfl_vector3d(velocity[0], velocity[1], velocity[2])
         self.ffi.chfl_frame_add_atom(self.mut_ptr, atom.ptr, position, velocity)
+        self._invalidate_arrays()
+        self._topology_modified()
 
     def remove(self, index):
         """
@@ -102,6 +221,8 @@ class Frame(CxxPointer):
         :py:func:`Frame.positions` or :py:func:`Frame.velocities`.
         """
         self.ffi.chfl_frame_remove(self.mut_ptr, c_uint64(index))
+        self._invalidate_arrays()
+        self._topology_modified()
 
     def add_bond(self, i, j, order=None):
         """
@@ -114,6 +235,7 @@ class Frame(CxxPointer):
             self.ffi.chfl_frame_bond_with_order(
                 self.mut_ptr, c_uint64(i), c_uint64(j), chfl_bond_order(order)
             )
+        self._topology_modified()
 
     def remove_bond(self, i, j):
         """
@@ -123,6 +245,40 @@ class Frame(CxxPointer):
         This function does nothing if there is no bond between ``i`` and ``j``.
         """
         self.ffi.chfl_frame_remove_bond(self.mut_ptr, c_uint64(i), c_uint64(j))
+        self._topology_modified()
+
+    def add_bonds(self, bonds, orders=None):
+        """
+        Add all the ``bonds`` (an array of shape ``(n, 2)`` of atomic
+        indexes) to this :py:class:`Frame`'s topology, optionally setting the
+        bond ``orders``. See :py:func:`Topology.add_bonds` for more
+        information.
+        """
+        existing = self.topology.bonds
+        bonds, orders = _new_bonds(bonds, orders, len(self.atoms), existing)
+        ptr = self.mut_ptr
+        if orders is None:
+            add_bond = self.ffi.chfl_frame_add_bond
+            for i, j in bonds.tolist():
+                add_bond(ptr, i, j)
+        else:
+            add_bond = self.ffi.chfl_frame_bond_with_order
+            for (i, j), order in zip(bonds.tolist(), orders.tolist()):
+                add_bond(ptr, i, j, order)
+        self._topology_modified()
+
+    def remove_bonds(self, bonds):
+        """
+        Remove all the ``bonds`` (an array of shape ``(n, 2)`` of atomic
+        indexes) from this :py:class:`Frame`'s topology. Bonds which are not
+        in the topology are ignored.
+        """
+        bonds = _existing_bonds(bonds, len(self.atoms), self.topology.bonds)
+        ptr = self.mut_ptr
+        remove_bond = self.ffi.chfl_frame_remove_bond
+        for i, j in bonds.tolist():
+            remove_bond(ptr, i, j)
+        self._topology_modified()
 
     def add_residue(self, residue):
         """
@@ -134,6 +290,75 @@ class Frame(CxxPointer):
         """
         self.ffi.chfl_frame_add_residue(self.mut_ptr, residue.ptr)
 
+    def subset(self, indexes):
+        """
+        Create a new :py:class:`Frame` containing only the atoms at the given
+        ``indexes`` in this :py:class:`Frame`.
+
+        The atom at ``indexes[i]`` becomes the atom ``i`` of the new frame.
+        Positions, velocities, unit cell, step and properties are copied; bonds
+        between selected atoms are kept with their order, angles and dihedrals
+        are recomputed from these bonds, and residues are restricted to the
+        selected atoms.
+        """
+        indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+        return self._subset(indexes, self._subset_topology(indexes))
+
+    def _subset_topology(self, indexes):
+        """
+        Create the :py:class:`Topology` used by :py:func:`Frame.subset`, which
+        can be re-used for frames with the same topology.
+        """
+        natoms = len(self.atoms)
+        if len(indexes) != 0 and (indexes.min() < 0 or indexes.max() >= natoms):
+            raise IndexError("atom index out of range for this frame")
+
+        mapping = np.full(natoms, -1, dtype=np.int64)
+        mapping[indexes] = np.arange(len(indexes))
+        if np.count_nonzero(mapping >= 0) != len(indexes):
+            raise ChemfilesError("duplicated atom indexes in Frame.subset")
+
+        old_topology = self.topology
+        topology = Topology()
+        for i in indexes:
+            ptr = self.ffi.chfl_atom_from_frame(self.mut_ptr, c_uint64(i))
+            topology.atoms.append(Atom.from_mutable_ptr(self, ptr))
+
+        bonds = old_topology.bonds
+        if len(bonds) != 0:
+            orders = np.array(old_topology.bonds_orders, dtype=np.int64)
+            new_bonds = mapping[bonds.astype(np.int64)]
+            kept = (new_bonds[:, 0] >= 0) & (new_bonds[:, 1] >= 0)
+            topology.add_bonds(new_bonds[kept], orders[kept])
+
+        for residue in old_topology.residues:
+            atoms = mapping[np.array(list(residue.atoms), dtype=np.int64)]
+            atoms = atoms[atoms >= 0]
+            if len(atoms) != 0:
+                topology.residues.append(residue._subset(atoms))
+        return topology
+
+    def _subset(self, indexes, topology):
+        """
+        Create a new :py:class:`Frame` containing the atoms at ``indexes``,
+        using ``topology`` from :py:func:`Frame._subset_topology`.
+        """
+        frame = Frame()
+        frame.resize(len(indexes))
+        frame.topology = topology
+        if self.has_velocities():
+            frame.add_velocities()
+        if len(indexes) != 0:
+            frame.positions[:] = self.positions[indexes]
+            if self.has_velocities():
+                frame.velocities[:] = self.velocities[indexes]
+
+        frame.cell = self.cell
+        frame.step = self.step
+        for name in self.list_properties():
+            frame[name] = self[name]
+        return frame
+
     @property
     def positions(self):
         """
@@ -145,17 +370,10 @@ class Frame(CxxPointer):
         If the frame is resized (by writing to it, calling
         :py:func:`Frame.resize`, :py:func:`Frame.add_atom`,
         :py:func:`Frame.remove`), the array is invalidated. Accessing it can
-        cause a segfault.
+        cause a segfault. Use :py:func:`Frame.positions_view` to get a view
+        that stays valid after such modifications.
         """
-        count = c_uint64()
-        data = POINTER(chfl_vector3d)()
-        self.ffi.chfl_frame_positions(self.mut_ptr, data, count)
-        count = count.value
-        if count != 0:
-            positions = np.ctypeslib.as_array(data, shape=(count,))
-            return positions.view(np.float64).reshape((count, 3))
-        else:
-            return np.array([[], [], []], dtype=np.float64)
+        return self._positions_array()
 
     @property
     def velocities(self):
@@ -168,17 +386,42 @@ class Frame(CxxPointer):
         If the frame is resized (by writing to it, calling
         :py:func:`Frame.resize`, :py:func:`Frame.add_atom`,
         :py:func:`Frame.remove`), the array is invalidated. Accessing it can
-        cause a segfault.
+        cause a segfault. Use :py:func:`Frame.velocities_view` to get a view
+        that stays valid after such modifications.
         """
+        return self._velocities_array()
+
+    def positions_view(self):
+        """
+        Get a :py:class:`FrameArrayView` into the positions of this
+        :py:class:`Frame`, which stays valid when the frame is resized.
+        """
+        return FrameArrayView(self, Frame._positions_array)
+
+    def velocities_view(self):
+        """
+        Get a :py:class:`FrameArrayView` into the velocities of this
+        :py:class:`Frame`, which stays valid when the frame is resized.
+        """
+        return FrameArrayView(self, Frame._velocities_array)
+
+    def _positions_array(self):
+        count = c_uint64()
+        data = POINTER(chfl_vector3d)()
+        self.ffi.chfl_frame_positions(self.mut_ptr, data, count)
+        return _vector3d_array(data, count.value)
+
+    def _velocities_array(self):
         count = c_uint64()
         data = POINTER(chfl_vector3d)()
         self.ffi.chfl_frame_velocities(self.mut_ptr, data, count)
-        count = count.value
-        if count != 0:
-            velocities = np.ctypeslib.as_array(data, shape=(count,))
-            return velocities.view(np.float64).reshape((count, 3))
-        else:
-            return np.array([[], [], []], dtype=np.float64)
+        return _vector3d_array(data, count.value)
+
+    def _invalidate_arrays(self):
+        self.__generation += 1
+
+    def _topology_modified(self):
+        self.__topology_generation += 1
 
     def add_velocities(self):
         """
@@ -188,6 +431,7 @@ class Frame(CxxPointer):
         velocities, this function does nothing.
         """
         self.ffi.chfl_frame_add_velocities(self.mut_ptr)
+        self._invalidate_arrays()
 
     def has_velocities(self):
         """Check if this :py:class:`Frame` contains velocity."""
@@ -225,6 +469,7 @@ class Frame(CxxPointer):
         Set the :py:class:`Topology` of this :py:class:`Frame` to ``topology``.
         """
         self.ffi.chfl_frame_set_topology(self.mut_ptr, topology.ptr)
+        self._topology_modified()
 
     @property
     def step(self):
@@ -249,6 +494,7 @@ class Frame(CxxPointer):
         and dihedrals are guessed from the bonds.
         """
         self.ffi.chfl_frame_guess_bonds(self.mut_ptr)
+        self._topology_modified()
 
     def distance(self, i, j):
         """
@@ -297,6 +543,202 @@ class Frame(CxxPointer):
         )
         return distance.value
 
+    def wrap(self):
+        """
+        Wrap the positions of all the atoms in this :py:class:`Frame` inside
+        the unit cell, using :py:func:`UnitCell.wrap_positions`.
+        """
+        if len(self.atoms) != 0:
+            self.cell.wrap_positions(self.positions)
+
+    def unwrap(self, reference):
+        """
+        Unwrap the positions of all the atoms in this :py:class:`Frame`, by
+        moving each atom by a lattice vector to the periodic image closest to
+        its position in ``reference``.
+
+        ``reference`` can be another :py:class:`Frame` (typically the previous,
+        already unwrapped frame in a trajectory) or an array of positions. This
+        gives continuous trajectories for atoms moving less than half of the
+        cell between two frames.
+        """
+        if isinstance(reference, Frame):
+            reference = reference.positions
+        reference = np.asarray(reference, dtype=np.float64)
+
+        positions = self.positions
+        if reference.shape != positions.shape:
+            raise ChemfilesError(
+                "wrong shape for reference positions: expected {}, got {}".format(
+                    positions.shape, reference.shape
+                )
+            )
+        if len(self.atoms) != 0:
+            positions[:] = reference + self.cell._minimum_image(positions - reference)
+
+    def make_whole(self):
+        """
+        Reconstruct the molecules broken across periodic boundaries in this
+        :py:class:`Frame`.
+
+        Molecules are defined as the connected components of the bond graph
+        in the topology. Each molecule is traversed breadth-first starting
+        from its atom with the lowest index, which is not moved; and every
+        other atom is moved by a lattice vector to the periodic image closest
+        to the atom it was reached from. This requires all the bonds to be
+        shorter than half of the unit cell.
+        """
+        bonds = self.topology.bonds.astype(np.int64)
+        if len(self.atoms) == 0 or len(bonds) == 0:
+            return
+
+        graph = self.topology.adjacency()
+        _make_whole(self.positions, self.cell, bonds, graph.offsets, graph.neighbors)
+
+    def center_of_mass(self, selection=None, masses=None, pbc=False):
+        """
+        Get the center of mass of the atoms in this :py:class:`Frame`.
+
+        ``selection`` can be a :py:class:`Selection`, a selection string or a
+        list of atomic indexes, and restricts the computation to the
+        corresponding atoms. ``masses`` can be used to give the masses of the
+        selected atoms, instead of fetching them from the topology: this is
+        useful to fetch the masses only once when iterating over a trajectory.
+
+        If ``pbc`` is ``True``, the selected atoms are first unwrapped: the
+        molecules formed by the bonds between selected atoms are made whole
+        by following the bonds (as in :py:func:`Frame.make_whole`), and moved
+        to their periodic image closest to the first selected atom. Selected
+        atoms without bonds to other selected atoms are only moved to their
+        periodic image closest to the first selected atom, using the minimum
+        image convention. Bonded selections can span more than half of the
+        unit cell, but all the bonds must be shorter than half of the cell.
+        """
+        positions, masses = self._mass_weighted(selection, masses, pbc)
+        return np.dot(masses, positions) / np.sum(masses)
+
+    def radius_of_gyration(self, selection=None, masses=None, pbc=False):
+        """
+        Get the mass-weighted radius of gyration of the atoms in this
+        :py:class:`Frame`. The ``selection``, ``masses`` and ``pbc`` parameters
+        have the same meaning as in :py:func:`Frame.center_of_mass`.
+        """
+        positions, masses = self._mass_weighted(selection, masses, pbc)
+        total = np.sum(masses)
+        positions -= np.dot(masses, positions) / total
+        return np.sqrt(np.dot(masses, np.sum(positions ** 2, axis=1)) / total)
+
+    def inertia_tensor(self, selection=None, masses=None, pbc=False):
+        """
+        Get the inertia tensor of the atoms in this :py:class:`Frame`, relative
+        to their center of mass, as a 3x3 numpy array. The ``selection``,
+        ``masses`` and ``pbc`` parameters have the same meaning as in
+        :py:func:`Frame.center_of_mass`.
+        """
+        positions, masses = self._mass_weighted(selection, masses, pbc)
+        positions -= np.dot(masses, positions) / np.sum(masses)
+        weighted = positions * masses[:, np.newaxis]
+        tensor = -np.dot(weighted.T, positions)
+        tensor += np.eye(3) * np.dot(masses, np.sum(positions ** 2, axis=1))
+        return tensor
+
+    def principal_axes(self, selection=None, masses=None, pbc=False):
+        """
+        Get the principal moments of inertia and the principal axes of the
+        atoms in this :py:class:`Frame`, as a ``(moments, axes)`` tuple. The
+        moments are sorted in increasing order, and ``axes[i]`` is the unit
+        vector corresponding to ``moments[i]``. The ``selection``, ``masses``
+        and ``pbc`` parameters have the same meaning as in
+        :py:func:`Frame.center_of_mass`.
+        """
+        tensor = self.inertia_tensor(selection, masses, pbc)
+        moments, axes = np.linalg.eigh(tensor)
+        return moments, axes.T
+
+    def align_to(self, reference, selection=None, measure=None, mass_weighted=False):
+        """
+        Superpose this :py:class:`Frame` onto ``reference`` in place, by
+        applying to all atoms the rotation and translation minimizing the RMSD
+        between the selected atoms, and return the RMSD between the atoms in
+        ``measure`` after the superposition.
+
+        ``reference`` can be a :py:class:`Frame` or an array of positions, with
+        the same number of atoms as this frame. ``selection`` and ``measure``
+        can be a :py:class:`Selection`, a selection string or a list of atomic
+        indexes, and default to all atoms; ``measure`` defaults to
+        ``selection``. If ``mass_weighted`` is ``True``, the superposition and
+        the RMSD are weighted by the atomic masses.
+
+        To align many frames at once, use :py:func:`chemfiles.align.align`
+        with the positions from :py:func:`Trajectory.read_positions`.
+        """
+        if len(self.atoms) == 0:
+            raise ChemfilesError("can not align an empty frame")
+
+        if isinstance(reference, Frame):
+            reference = reference.positions
+        fit = _selection_indexes(self, selection)
+        if measure is None:
+            measure = fit
+        else:
+            measure = _selection_indexes(self, measure)
+
+        weights = None
+        if mass_weighted:
+            weights = self.atoms.table(["masses"]).masses
+        return float(align(self.positions, reference, fit, measure, weights))
+
+    def _mass_weighted(self, selection, masses, pbc):
+        """
+        Get a copy of the positions and the masses of the selected atoms, for
+        mass-weighted computations.
+        """
+        indexes = _selection_indexes(self, selection)
+        if len(indexes) == 0:
+            raise ChemfilesError("can not compute mass-weighted properties of an empty selection")
+
+        positions = self.positions[indexes]
+        if masses is None:
+            atoms = self.atoms
+            masses = _atoms_table(
+                self.ffi, len(indexes), lambda i: atoms._atom_ptr(int(indexes[i])), ["masses"]
+            ).masses
+        else:
+            masses = np.asarray(masses, dtype=np.float64)
+            if masses.shape != (len(indexes),):
+                raise ChemfilesError(
+                    "wrong size for masses: expected {}, got {}".format(len(indexes), len(masses))
+                )
+
+        if np.sum(masses) == 0:
+            raise ChemfilesError("the total mass of the selected atoms is zero")
+
+        if pbc:
+            self._unwrap_selected(indexes, positions)
+        return positions, masses
+
+    def _unwrap_selected(self, indexes, positions):
+        """
+        Unwrap in place the ``positions`` of the atoms in ``indexes``: the
+        molecules formed by the bonds between these atoms are made whole,
+        and then moved to the periodic image of their first atom closest to
+        the first selected atom. Atoms without bonds to other selected atoms
+        are moved to their periodic image closest to the first selected atom.
+        """
+        cell = self.cell
+        mapping = np.full(len(self.atoms), -1, dtype=np.int64)
+        mapping[indexes] = np.arange(len(indexes))
+        bonds = mapping[self.topology.bonds.astype(np.int64)]
+        bonds = bonds[np.all(bonds >= 0, axis=1)]
+
+        offsets, neighbors, _ = _bonds_csr(bonds, len(indexes))
+        labels = _make_whole(positions, cell, bonds, offsets, neighbors)
+
+        roots = np.unique(labels)
+        reference = positions[0].copy()
+        shifts = reference + cell._minimum_image(positions[roots] - reference) - positions[roots]
+        positions += shifts[np.searchsorted(roots, labels)]
+
     def __iter__(self):
         # Disable automatic iteration from __getitem__
         raise TypeError("use Frame.atoms to iterate over a frame")
@@ -340,3 +782,91 @@ class Frame(CxxPointer):
         names = StringArray()
         self.ffi.chfl_frame_list_properties(self.ptr, names, count)
         return list(map(lambda n: n.decode("utf8"), names))
+
+
+def _make_whole(positions, cell, bonds, offsets, neighbors):
+    """
+    Move the atoms in ``positions`` in place by lattice vectors to make the
+    molecules defined by ``bonds`` whole, as described in
+    :py:func:`Frame.make_whole`. ``offsets`` and ``neighbors`` are the
+    compressed sparse row representation of the bonds graph. This returns
+    the lowest atom index in the molecule of each atom, which is the atom
+    itself for atoms without bonds.
+    """
+    natoms = len(positions)
+    degrees = np.diff(offsets)
+
+    # Find the lowest atom index in each molecule by propagating labels
+    # along the bonds
+    labels = np.arange(natoms)
+    while True:
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, bonds[:, 0], labels[bonds[:, 1]])
+        np.minimum.at(new_labels, bonds[:, 1], labels[bonds[:, 0]])
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    roots = np.nonzero((labels == np.arange(natoms)) & (degrees != 0))[0]
+    visited = np.zeros(natoms, dtype=bool)
+    visited[roots] = True
+
+    frontier = roots
+    while len(frontier) != 0:
+        # all the (parent, child) pairs from the current frontier
+        counts = degrees[frontier]
+        parents = np.repeat(frontier, counts)
+        starts = np.repeat(offsets[frontier] - np.cumsum(counts) + counts, counts)
+        children = neighbors[starts + np.arange(len(parents))]
+
+        unvisited = ~visited[children]
+        parents = parents[unvisited]
+        children, first = np.unique(children[unvisited], return_index=True)
+        parents = parents[first]
+
+        visited[children] = True
+        parent_positions = positions[parents]
+        positions[children] = parent_positions + cell._minimum_image(
+            positions[children] - parent_positions
+        )
+        frontier = children
+    return labels
+
+
+# PickleBuffer is only available with Python 3.8+
+_PickleBuffer = getattr(pickle, "PickleBuffer", None)
+
+
+def _frame_from_state(topology, positions, velocities, cell, step, properties):
+    """Re-create a :py:class:`Frame` from the data in ``Frame.__reduce_ex__``"""
+    topology = _topology_from_state(*topology)
+    natoms = len(topology.atoms)
+
+    frame = Frame()
+    frame.resize(natoms)
+    frame.topology = topology
+    if natoms != 0:
+        positions = np.frombuffer(positions, dtype=np.float64).reshape((natoms, 3))
+        frame.positions[:] = positions
+
+    if velocities is not None:
+        frame.add_velocities()
+        if natoms != 0:
+            velocities = np.frombuffer(velocities, dtype=np.float64).reshape((natoms, 3))
+            frame.velocities[:] = velocities
+
+    frame.cell = cell
+    frame.step = step
+    for name, value in properties.items():
+        frame[name] = value
+    return frame
+
+
+def _vector3d_array(data, count):
+    """Create a numpy array from a pointer to ``count`` chfl_vector3d"""
+    if count != 0:
+        array = np.ctypeslib.as_array(data, shape=(count,))
+        return array.view(np.float64).reshape((count, 3))
+    else:
+        return np.array([[], [], []], dtype=np.float64)
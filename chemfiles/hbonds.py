@@ -0,0 +1,220 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import numpy as np
+
+from .misc import ChemfilesError
+from .neighbors import neighbor_pairs
+from .selection import _selection_indexes
+from .contacts import _KeyCounter
+
+
+class HydrogenBonds(object):
+    """
+    Find the hydrogen bonds in the frames of a trajectory using geometric
+    criteria, and accumulate frequency and lifetime statistics.
+
+    A hydrogen bond ``D-H...A`` exists between a donor ``D``, a hydrogen
+    ``H`` bonded to the donor, and an acceptor ``A`` if the ``D...A``
+    distance is smaller than ``distance`` (in Angstroms) and the ``D-H...A``
+    angle is larger than ``angle`` (in degrees).
+
+    Donor-hydrogen pairs are taken from the bonds in the topology, between
+    an atom of type ``H`` and a donor. ``donors`` and ``acceptors`` can be a
+    :py:class:`Selection`, a selection string or a list of atomic indexes,
+    and default to all the atoms with type ``N``, ``O`` or ``F``.
+
+    The donors, hydrogens and acceptors are only computed with the first
+    frame, the topology is assumed to be the same for all the following
+    frames. Call :py:func:`HydrogenBonds.reset` when using it with a new
+    system.
+    """
+
+    ELECTRONEGATIVE = ("N", "O", "F")
+
+    def __init__(self, distance=3.0, angle=150.0, donors=None, acceptors=None):
+        self.distance = distance
+        self.angle = angle
+        self.donors = donors
+        self.acceptors = acceptors
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the donors and acceptors computed with the previous frames, and
+        the accumulated statistics.
+        """
+        self.__natoms = None
+        # donor-hydrogen pairs, sorted by donor
+        self.__pairs = None
+        # for each atom, the range of its hydrogens in __pairs if it is a donor
+        self.__hydrogens_start = None
+        self.__hydrogens_count = None
+        self.__is_acceptor = None
+        # donors and acceptors, used for the neighbor search
+        self.__atoms = None
+        self.__nframes = 0
+        self.__counter = _KeyCounter()
+        # hydrogen bonds present in the last frame, and the frame where they
+        # appeared
+        self.__active_keys = np.zeros(0, dtype=np.int64)
+        self.__active_start = np.zeros(0, dtype=np.int64)
+        self.__lifetimes_keys = []
+        self.__lifetimes = []
+
+    @property
+    def nframes(self):
+        """Get the number of frames added to this :py:class:`HydrogenBonds`."""
+        return self.__nframes
+
+    def compute(self, frame):
+        """
+        Get the hydrogen bonds in the :py:class:`Frame` ``frame``, as a
+        ``(triplets, distances, angles)`` tuple. ``triplets`` is an array of
+        shape ``(n, 3)`` containing the indexes of the donor, hydrogen and
+        acceptor; ``distances`` contains the donor-acceptor distances and
+        ``angles`` the donor-hydrogen-acceptor angles in degrees.
+        """
+        triplets, distances, angles, _ = self._compute(frame)
+        return triplets, distances, angles
+
+    def add(self, frame):
+        """
+        Compute the hydrogen bonds in the :py:class:`Frame` ``frame`` with
+        :py:func:`HydrogenBonds.compute`, and add them to the accumulated
+        statistics. The hydrogen bonds in this frame are returned.
+        """
+        triplets, distances, angles, keys = self._compute(frame)
+        keys = np.unique(keys)
+        self.__counter.add(keys)
+
+        # update the hydrogen bonds lifetimes
+        present = np.isin(self.__active_keys, keys)
+        self.__lifetimes_keys.append(self.__active_keys[~present])
+        self.__lifetimes.append(self.__nframes - self.__active_start[~present])
+
+        new_keys = np.setdiff1d(keys, self.__active_keys, assume_unique=True)
+        active_keys = np.concatenate([self.__active_keys[present], new_keys])
+        active_start = np.concatenate([
+            self.__active_start[present],
+            np.full(len(new_keys), self.__nframes, dtype=np.int64),
+        ])
+        order = np.argsort(active_keys)
+        self.__active_keys = active_keys[order]
+        self.__active_start = active_start[order]
+
+        self.__nframes += 1
+        return triplets, distances, angles
+
+    def frequencies(self):
+        """
+        Get the fraction of frames where each hydrogen bond is present, as a
+        ``(triplets, frequencies)`` tuple. Only the hydrogen bonds present in
+        at least one frame are included.
+        """
+        if self.__nframes == 0:
+            raise ChemfilesError("no frame was added to this HydrogenBonds")
+        keys, counts = self.__counter.counts()
+        return self._triplets(keys), counts / float(self.__nframes)
+
+    def lifetimes(self):
+        """
+        Get the duration (in number of frames) of all the continuous
+        occurrences of hydrogen bonds, as a ``(triplets, lifetimes)`` tuple.
+        The same hydrogen bond can appear multiple times if it breaks and
+        forms again. Hydrogen bonds still present in the last frame are
+        included with their duration so far.
+        """
+        if self.__nframes == 0:
+            raise ChemfilesError("no frame was added to this HydrogenBonds")
+        keys = np.concatenate(self.__lifetimes_keys + [self.__active_keys])
+        lifetimes = np.concatenate(
+            self.__lifetimes + [self.__nframes - self.__active_start]
+        )
+        return self._triplets(keys), lifetimes
+
+    def _triplets(self, keys):
+        """Get the (donor, hydrogen, acceptor) triplets from bonds keys"""
+        keys = np.asarray(keys, dtype=np.int64)
+        pairs = self.__pairs[keys // self.__natoms]
+        return np.column_stack([pairs, keys % self.__natoms])
+
+    def _compute(self, frame):
+        natoms = len(frame.atoms)
+        if self.__pairs is None or natoms != self.__natoms:
+            self._setup(frame)
+
+        empty = np.zeros(0)
+        atoms = self.__atoms
+        if len(atoms) == 0 or len(self.__pairs) == 0:
+            return np.zeros((0, 3), dtype=np.int64), empty, empty, np.zeros(0, dtype=np.int64)
+
+        cell = frame.cell
+        positions = frame.positions
+        pairs, distances = neighbor_pairs(positions[atoms], self.distance, cell)
+        pairs = atoms[pairs]
+
+        # donor-acceptor pairs, in both directions
+        count = self.__hydrogens_count
+        is_acceptor = self.__is_acceptor
+        forward = (count[pairs[:, 0]] != 0) & is_acceptor[pairs[:, 1]]
+        backward = (count[pairs[:, 1]] != 0) & is_acceptor[pairs[:, 0]]
+        donors = np.concatenate([pairs[forward, 0], pairs[backward, 1]])
+        acceptors = np.concatenate([pairs[forward, 1], pairs[backward, 0]])
+        distances = np.concatenate([distances[forward], distances[backward]])
+
+        # expand to all the hydrogens bonded to each donor
+        counts = count[donors]
+        first = np.repeat(self.__hydrogens_start[donors] - np.cumsum(counts) + counts, counts)
+        indexes = first + np.arange(len(first))
+        acceptors = np.repeat(acceptors, counts)
+        distances = np.repeat(distances, counts)
+        donors = self.__pairs[indexes, 0]
+        hydrogens = self.__pairs[indexes, 1]
+
+        # D-H...A angles
+        to_donor = cell._minimum_image(positions[donors] - positions[hydrogens])
+        to_acceptor = cell._minimum_image(positions[acceptors] - positions[hydrogens])
+        cosines = np.sum(to_donor * to_acceptor, axis=1)
+        cosines /= np.sqrt(np.sum(to_donor ** 2, axis=1) * np.sum(to_acceptor ** 2, axis=1))
+        angles = np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+
+        keep = (angles > self.angle) & (acceptors != hydrogens)
+        triplets = np.column_stack([donors[keep], hydrogens[keep], acceptors[keep]])
+        keys = indexes[keep] * natoms + acceptors[keep]
+        return triplets, distances[keep], angles[keep], keys
+
+    def _setup(self, frame):
+        natoms = len(frame.atoms)
+        if self.__natoms is not None and self.__nframes != 0:
+            raise ChemfilesError(
+                "the number of atoms changed from {} to {}, call reset() to use "
+                "this HydrogenBonds with a different system".format(self.__natoms, natoms)
+            )
+        self.__natoms = natoms
+
+        types = frame.atoms.table(["types"]).types
+        electronegative = np.isin(types, self.ELECTRONEGATIVE)
+        is_donor = self._atoms_mask(frame, self.donors, electronegative)
+        is_acceptor = self._atoms_mask(frame, self.acceptors, electronegative)
+        is_hydrogen = types == "H"
+
+        bonds = frame.topology.bonds.astype(np.int64).reshape(-1, 2)
+        forward = is_donor[bonds[:, 0]] & is_hydrogen[bonds[:, 1]]
+        backward = is_donor[bonds[:, 1]] & is_hydrogen[bonds[:, 0]]
+        pairs = np.concatenate([bonds[forward], bonds[backward][:, ::-1]])
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+        count = np.bincount(pairs[:, 0], minlength=natoms)
+        self.__pairs = pairs
+        self.__hydrogens_count = count
+        self.__hydrogens_start = np.cumsum(count) - count
+        self.__is_acceptor = is_acceptor
+        self.__atoms = np.nonzero((count != 0) | is_acceptor)[0]
+
+    @staticmethod
+    def _atoms_mask(frame, selection, default):
+        if selection is None:
+            return default
+        mask = np.zeros(len(frame.atoms), dtype=bool)
+        mask[_selection_indexes(frame, selection)] = True
+        return mask
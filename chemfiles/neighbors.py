@@ -0,0 +1,126 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import itertools
+import numpy as np
+
+from .misc import ChemfilesError
+from .cell import CellShape
+
+
+def neighbor_pairs(positions, cutoff, cell=None):
+    """
+    Find all the pairs of atoms closer than ``cutoff`` in ``positions``, using
+    a cell list. This returns a ``(pairs, distances)`` tuple, where ``pairs``
+    is an array of shape ``(n, 2)`` containing atomic indexes ``i < j``, and
+    ``distances`` contains the corresponding distances.
+
+    If ``cell`` is a :py:class:`UnitCell` with periodic boundary conditions,
+    distances use the minimum image convention. In this case, ``cutoff`` must
+    be smaller than half of the cell width in all directions.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    natoms = len(positions)
+    if cutoff <= 0:
+        raise ChemfilesError("the cutoff must be positive, got {}".format(cutoff))
+
+    periodic = cell is not None and cell.shape != CellShape.Infinite
+    if periodic:
+        matrix, inverse = cell._matrices()
+        widths = _cell_widths(matrix)
+        if np.any(2 * cutoff > widths):
+            raise ChemfilesError(
+                "cutoff ({}) is larger than half of the unit cell".format(cutoff)
+            )
+        fractional = np.dot(positions, inverse.T)
+        fractional -= np.floor(fractional)
+        nbins = np.floor(widths / cutoff).astype(np.int64)
+        nbins = _limit_bins(nbins, natoms)
+        # with less than 3 bins in a direction, the same pair of bins would
+        # be visited multiple times through periodic images
+        nbins[nbins < 3] = 1
+        bins = np.minimum((fractional * nbins).astype(np.int64), nbins - 1)
+    else:
+        if natoms == 0:
+            return _empty_pairs()
+        lower = positions.min(axis=0)
+        span = positions.max(axis=0) - lower
+        nbins = np.maximum(np.floor(span / cutoff).astype(np.int64), 1)
+        nbins = _limit_bins(nbins, natoms)
+        span[span == 0] = 1.0
+        bins = np.minimum(((positions - lower) / span * nbins).astype(np.int64), nbins - 1)
+
+    if natoms < 2:
+        return _empty_pairs()
+
+    flat = (bins[:, 0] * nbins[1] + bins[:, 1]) * nbins[2] + bins[:, 2]
+    order = np.argsort(flat, kind="mergesort")
+    counts = np.bincount(flat, minlength=np.prod(nbins))
+    starts = np.cumsum(counts) - counts
+
+    offsets = [[-1, 0, 1] if n >= 3 or not periodic else [0] for n in nbins]
+    all_pairs = []
+    all_distances = []
+    for shift in itertools.product(*offsets):
+        neighbor_bins = bins + shift
+        if periodic:
+            neighbor_bins %= nbins
+            atoms = np.arange(natoms)
+        else:
+            inside = np.all((neighbor_bins >= 0) & (neighbor_bins < nbins), axis=1)
+            atoms = np.nonzero(inside)[0]
+            neighbor_bins = neighbor_bins[inside]
+
+        neighbor_flat = (neighbor_bins[:, 0] * nbins[1] + neighbor_bins[:, 1]) * nbins[2]
+        neighbor_flat += neighbor_bins[:, 2]
+
+        # all the (atom, other atom in the neighbor bin) pairs
+        partners = counts[neighbor_flat]
+        first = np.repeat(atoms, partners)
+        begin = np.repeat(starts[neighbor_flat] - np.cumsum(partners) + partners, partners)
+        second = order[begin + np.arange(len(first))]
+
+        keep = first < second
+        first = first[keep]
+        second = second[keep]
+
+        vectors = positions[second] - positions[first]
+        if periodic:
+            vectors = cell._minimum_image(vectors)
+        distances = np.sqrt(np.sum(vectors ** 2, axis=1))
+
+        close = distances < cutoff
+        all_pairs.append(np.stack([first[close], second[close]], axis=1))
+        all_distances.append(distances[close])
+
+    pairs = np.concatenate(all_pairs)
+    distances = np.concatenate(all_distances)
+    # sort the pairs for reproducible output
+    order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+    return pairs[order], distances[order]
+
+
+def _empty_pairs():
+    return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+
+def _cell_widths(matrix):
+    """Get the distances between opposite faces of the cell with ``matrix``"""
+    a, b, c = matrix.T
+    volume = abs(np.linalg.det(matrix))
+    return volume / np.array([
+        np.linalg.norm(np.cross(b, c)),
+        np.linalg.norm(np.cross(c, a)),
+        np.linalg.norm(np.cross(a, b)),
+    ])
+
+
+def _limit_bins(nbins, natoms):
+    """
+    Limit the total number of bins to a few times the number of atoms, to
+    keep memory use under control for sparse systems.
+    """
+    nbins = np.maximum(nbins, 1)
+    limit = max(2 * natoms, 27)
+    while np.prod(nbins) > limit:
+        nbins = np.maximum(nbins // 2, 1)
+    return nbins
@@ -0,0 +1,69 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import multiprocessing
+import pickle
+
+from .misc import ChemfilesError
+
+# State of the current worker process, created by ``_initialize_worker``
+_WORKER = {}
+
+
+def _process_count(processes):
+    """Get the number of processes to use, defaulting to the number of CPU"""
+    if processes is None:
+        return multiprocessing.cpu_count()
+    if processes < 1:
+        raise ChemfilesError(
+            "the number of processes must be at least 1, got {}".format(processes)
+        )
+    return processes
+
+
+def _worker_copy(value):
+    """
+    Get a copy of ``value`` owned by the current worker, by pickling and
+    unpickling it. With the ``fork`` start method (the default on Linux),
+    the pool arguments are inherited from the parent process instead of
+    being pickled, so objects wrapping an open file (such as trajectories)
+    must be explicitly re-created in ``setup`` to not share the file with
+    the parent and the other workers.
+    """
+    return pickle.loads(pickle.dumps(value, protocol=2))
+
+
+def _initialize_worker(function, setup, arguments):
+    _WORKER["function"] = function
+    _WORKER["state"] = setup(*arguments)
+
+
+def _run_task(task):
+    return _WORKER["function"](_WORKER["state"], task)
+
+
+def _parallel_map(function, tasks, setup, arguments=(), processes=None):
+    """
+    Compute ``function(state, task)`` for all ``tasks``, with a pool of
+    ``processes`` worker processes, and yield the results in order.
+
+    ``state`` is created once in each worker with ``setup(*arguments)``, and
+    can be used to store expensive data such as an open trajectory or memory
+    mapped files. ``function``, ``setup`` and ``arguments`` must be picklable,
+    but ``arguments`` may also be inherited without pickling: use
+    ``_worker_copy`` in ``setup`` for objects which must not be shared.
+    With a single process, everything runs in the current process.
+    """
+    processes = min(_process_count(processes), max(len(tasks), 1))
+    if processes == 1:
+        state = setup(*arguments)
+        for task in tasks:
+            yield function(state, task)
+        return
+
+    pool = multiprocessing.Pool(processes, _initialize_worker, (function, setup, arguments))
+    try:
+        for result in pool.imap(_run_task, tasks):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
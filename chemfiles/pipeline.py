@@ -0,0 +1,162 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import threading
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from .misc import ChemfilesError
+from .utils import string_type
+from .selection import Selection, _read_frames, _evaluate_frames
+
+
+def extract_selection(input, output, selection, steps=None, stride=1,
+                      static_topology=False, threads=True, buffer_size=8):
+    """
+    Read the ``steps`` (by default all the steps) of the :py:class:`Trajectory`
+    ``input``, keeping one step every ``stride``, and write the atoms matching
+    ``selection`` to the :py:class:`Trajectory` ``output``. ``selection`` can
+    be a :py:class:`Selection` of size 1 or a selection string.
+
+    If the selection only depends on the topology and the topology does not
+    change between steps (see :py:func:`Selection.evaluate_trajectory`), the
+    selection is evaluated and the topology of the extracted frames created
+    only once.
+
+    With ``threads=True``, frames are read and written in background
+    threads, overlapping the reading and writing of files with the selection
+    and extraction of atoms. At most ``buffer_size`` frames are kept in
+    memory between the stages.
+
+    This function returns the number of frames written to ``output``.
+    """
+    if isinstance(selection, string_type):
+        selection = Selection.cached(selection)
+    if selection.size != 1:
+        raise ChemfilesError(
+            "expected a selection of size 1, got a selection of size {}".format(selection.size)
+        )
+    if stride < 1:
+        raise ChemfilesError("the stride must be at least 1, got {}".format(stride))
+
+    if steps is None:
+        steps = range(input.nsteps)
+    steps = np.asarray(steps, dtype=np.int64).reshape(-1)[::stride]
+
+    frames = _read_frames(input, steps)
+    if threads:
+        frames = _background(frames, buffer_size)
+    extracted = _extract(_evaluate_frames([selection], frames, static_topology))
+
+    if threads:
+        return _write_background(output, extracted, buffer_size)
+    else:
+        count = 0
+        for frame in extracted:
+            output.write(frame)
+            count += 1
+        return count
+
+
+def _extract(frames):
+    """
+    Extract the selected atoms from the ``(frame, matches)`` pairs produced
+    by ``_evaluate_frames``, re-using the topology of the extracted frames
+    while the matches are re-used.
+    """
+    previous = None
+    topology = None
+    for frame, (matches,) in frames:
+        indexes = matches.astype(np.int64)
+        if matches is not previous:
+            topology = frame._subset_topology(indexes)
+            previous = matches
+        yield frame._subset(indexes, topology)
+
+
+def _background(iterable, buffer_size):
+    """
+    Iterate over ``iterable`` in a background thread, yielding the items
+    through a queue containing at most ``buffer_size`` items.
+    """
+    items = queue.Queue(buffer_size)
+    stop = threading.Event()
+
+    def put(item):
+        # give up when the consumer stopped, instead of blocking forever
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def run():
+        try:
+            for item in iterable:
+                put((True, item))
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            put((False, e))
+        else:
+            put((False, None))
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            success, item = items.get()
+            if success:
+                yield item
+            elif item is None:
+                return
+            else:
+                raise item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _write_background(output, frames, buffer_size):
+    """
+    Write all the ``frames`` to ``output`` in a background thread, and return
+    the number of frames written.
+    """
+    items = queue.Queue(buffer_size)
+    errors = []
+
+    def run():
+        while True:
+            frame = items.get()
+            if frame is None:
+                return
+            if len(errors) != 0:
+                # keep consuming frames until the end
+                continue
+            try:
+                output.write(frame)
+            except BaseException as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    count = 0
+    try:
+        for frame in frames:
+            if len(errors) != 0:
+                break
+            items.put(frame)
+            count += 1
+    finally:
+        items.put(None)
+        thread.join()
+
+    if len(errors) != 0:
+        raise errors[0]
+    return count
@@ -3,6 +3,7 @@ from __future__ import absolute_import, print_function, unicode_literals
 from ctypes import c_bool, c_uint64, c_char_p
 import numpy as np
 
+from .clib import _get_c_library
 from .utils import CxxPointer, _call_with_growing_buffer, string_type
 from .misc import ChemfilesError
 from .property import Property
@@ -83,6 +84,32 @@ class Residue(CxxPointer):
     def __copy__(self):
         return Residue.from_mutable_ptr(None, self.ffi.chfl_residue_copy(self.ptr))
 
+    def __reduce__(self):
+        return (_residue_from_state, self._state())
+
+    def _state(self):
+        """
+        Get the data needed to re-create this :py:class:`Residue` with
+        ``_residue_from_state``: name, id (or ``None``), atoms and properties.
+        """
+        try:
+            id = self.id
+        except ChemfilesError:
+            id = None
+
+        atoms = np.zeros(len(self.atoms), np.uint64)
+        self.ffi.chfl_residue_atoms(self.ptr, atoms, c_uint64(len(atoms)))
+        properties = dict((name, self[name]) for name in self.list_properties())
+        return (self.name, id, atoms, properties)
+
+    def _subset(self, atoms):
+        """
+        Create a new :py:class:`Residue` with the same name, id and properties
+        as this one, but containing the atoms at indexes ``atoms``.
+        """
+        name, id, _, properties = self._state()
+        return _residue_from_state(name, id, atoms, properties)
+
     def __repr__(self):
         return "Residue('{}') with {} atoms".format(self.name, len(self.atoms))
 
@@ -148,3 +175,19 @@ class Residue(CxxPointer):
         names = StringArray()
         self.ffi.chfl_residue_list_properties(self.ptr, names, count)
         return list(map(lambda n: n.decode("utf8"), names))
+
+
+def _residue_from_state(name, id, atoms, properties):
+    """Re-create a :py:class:`Residue` from the data in ``Residue._state``"""
+    ffi = _get_c_library()
+    if id is None:
+        ptr = ffi.chfl_residue(name.encode("utf8"))
+    else:
+        ptr = ffi.chfl_residue_with_id(name.encode("utf8"), c_uint64(id))
+    residue = Residue.from_mutable_ptr(None, ptr)
+
+    for atom in atoms:
+        residue.atoms.append(int(atom))
+    for key, value in properties.items():
+        residue[key] = value
+    return residue
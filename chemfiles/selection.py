@@ -2,10 +2,23 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 from ctypes import c_uint64
+from collections import OrderedDict
+import threading
+import re
 import numpy as np
 
-from .utils import CxxPointer, _call_with_growing_buffer
+from .utils import CxxPointer, _call_with_growing_buffer, string_type
+from .misc import ChemfilesError
 from .ffi import chfl_match
+from .parallel import _parallel_map, _process_count, _worker_copy
+from .fastselection import _compile, _AtomColumns, _Unsupported
+
+# Selectors using the positions or velocities of the atoms
+_GEOMETRIC_SELECTORS = re.compile(
+    r"\b(x|y|z|vx|vy|vz|distance|angle|dihedral|out_of_plane)\b"
+)
+# Quoted strings in selections, which can contain any word
+_QUOTED = re.compile(r'"[^"]*"')
 
 
 class Selection(CxxPointer):
@@ -19,17 +32,56 @@ class Selection(CxxPointer):
     <selections-doc>`_ to know the allowed selectors and how to use them.
 
     .. selections-doc: https://chemfiles.org/chemfiles/latest/selections.html
+
+    Evaluating a selection modifies its internal buffer of matches, so each
+    :py:class:`Selection` uses a lock to allow using the same instance from
+    multiple threads.
     """
 
+    # Lock protecting the matches buffer during evaluation
+    __lock = None
+
     def __init__(self, selection):
         """
         Create a new :py:class:`Selection` from the given ``selection`` string.
         """
+        self.__lock = threading.Lock()
         ptr = self.ffi.chfl_selection(selection.encode("utf8"))
         super(Selection, self).__init__(ptr, is_const=False)
 
+    def __reduce__(self):
+        return (Selection, (self.string,))
+
     def __copy__(self):
-        return Selection.from_mutable_ptr(None, self.ffi.chfl_selection_copy(self.ptr))
+        copy = Selection.from_mutable_ptr(None, self.ffi.chfl_selection_copy(self.ptr))
+        copy.__lock = threading.Lock()
+        return copy
+
+    @classmethod
+    def cached(cls, selection):
+        """
+        Get a compiled :py:class:`Selection` for the given ``selection``
+        string from a process-wide cache, only parsing the string if it is
+        not already in the cache.
+
+        The same instance is returned to all callers using the same string,
+        including from different threads. The cache keeps the most recently
+        used selections, up to :py:func:`Selection.set_cache_size` entries.
+        """
+        return _CACHE.get(selection)
+
+    @staticmethod
+    def set_cache_size(size):
+        """
+        Set the maximal number of selections in the cache used by
+        :py:func:`Selection.cached`. The default is 128.
+        """
+        _CACHE.resize(size)
+
+    @staticmethod
+    def clear_cache():
+        """Remove all the selections from the cache used by :py:func:`Selection.cached`."""
+        _CACHE.resize(_CACHE.size, clear=True)
 
     def __repr__(self):
         return "Selection('{}')".format(self.string)
@@ -58,29 +110,435 @@ class Selection(CxxPointer):
             initial=128
         )
 
+    @property
+    def is_topological(self):
+        """
+        Check if this :py:class:`Selection` only depends on the topology of
+        the frames (names, types, residues, bonds, ...), and not on the
+        positions or velocities of the atoms.
+
+        This is a conservative check: some selections depending only on the
+        topology can be reported as not topological.
+        """
+        string = _QUOTED.sub("", self.string)
+        return _GEOMETRIC_SELECTORS.search(string) is None
+
     def evaluate(self, frame):
         """
         Evaluate a :py:class:`Selection` for a given :py:class:`Frame`, and
         return a list of matching atoms, either as a list of index or a list
         of tuples of indexes.
         """
-        matching = c_uint64()
-        self.ffi.chfl_selection_evaluate(self.mut_ptr, frame.ptr, matching)
+        matches = self.evaluate_array(frame).tolist()
+        if self.size == 1:
+            return matches
+        else:
+            return list(map(tuple, matches))
 
-        matches = np.zeros(matching.value, chfl_match)
-        self.ffi.chfl_selection_matches(self.mut_ptr, matches, matching)
+    def evaluate_array(self, frame):
+        """
+        Evaluate a :py:class:`Selection` for a given :py:class:`Frame`, and
+        return the matching atoms as a numpy array of ``uint64``. The array
+        has shape ``(n,)`` for selections of size 1, and ``(n, size)``
+        otherwise.
+        """
+        matching = c_uint64()
+        with self.__lock:
+            self.ffi.chfl_selection_evaluate(self.mut_ptr, frame.ptr, matching)
+            matches = np.zeros(matching.value, chfl_match)
+            self.ffi.chfl_selection_matches(self.mut_ptr, matches, matching)
 
         size = self.size
+        atoms = matches["atoms"]
+        if size == 1:
+            return np.ascontiguousarray(atoms[:, 0])
+        else:
+            return np.ascontiguousarray(atoms[:, :size])
+
+    def evaluate_trajectory(self, trajectory, steps=None, static_topology=False):
+        """
+        Evaluate a :py:class:`Selection` for the ``steps`` (by default all
+        the steps) of the :py:class:`Trajectory` ``trajectory``, yielding a
+        ``(frame, matches)`` tuple for each step, where ``matches`` is the
+        same as :py:func:`Selection.evaluate_array`.
+
+        If this selection is :py:attr:`Selection.is_topological` and the
+        topology does not change between steps, the selection is only
+        evaluated once and the same read-only ``matches`` array is re-used for
+        all the steps. The topology is known to be the same if it was set with
+        :py:func:`Trajectory.set_topology`; use ``static_topology=True`` if the
+        topology in the file is the same for all the steps.
+        """
+        frames = _read_frames(trajectory, steps)
+        for frame, matches in _evaluate_frames([self], frames, static_topology):
+            yield frame, matches[0]
+
+    def evaluate_mask(self, frame):
+        """
+        Evaluate a :py:class:`Selection` of size 1 for a given
+        :py:class:`Frame`, and return a numpy array of booleans with one
+        value for each atom in the frame, which is ``True`` for the matching
+        atoms.
+        """
+        if self.size != 1:
+            raise ChemfilesError(
+                "expected a selection of size 1, got a selection of size {}".format(self.size)
+            )
+        mask = np.zeros(len(frame.atoms), dtype=bool)
+        mask[self.evaluate_array(frame).astype(np.int64)] = True
+        return mask
+
+
+class SelectionSet(object):
+    """
+    Group of selections evaluated together on the same frames, for example
+    all the selections used by an analysis pipeline.
+
+    ``selections`` is a list of :py:class:`Selection` or selection strings.
+    Selections with the same string are only evaluated once for each frame.
+
+    With the default ``engine="chemfiles"``, each unique selection is still
+    evaluated separately by chemfiles: the only work shared between the
+    selections is the reading of frames in
+    :py:func:`SelectionSet.evaluate_trajectory`.
+
+    To share the extraction of atomic properties between selections, use
+    ``engine="numpy"``. Simple atomic selections (comparisons of ``name``,
+    ``type``, ``resname``, ``resid``, ``index``, ``mass``, ``x``, ``y`` and
+    ``z`` with a value, combined with ``and``, ``or`` and ``not``) are then
+    evaluated with numpy, using columns of atomic properties extracted once
+    for all the selections. When evaluating a trajectory with a static
+    topology, these columns are only extracted once for the whole
+    trajectory. Other selections, and frames where some atoms are not part
+    of a residue for ``resname`` and ``resid``, are evaluated by chemfiles.
+    """
+
+    def __init__(self, selections, engine="chemfiles"):
+        if engine not in ("chemfiles", "numpy"):
+            raise ChemfilesError("unknown selection engine '{}'".format(engine))
+        self.engine = engine
+        self.__selections = []
+        # index in __unique of the selection at the same position
+        self.__mapping = []
+        self.__unique = []
+        indexes = {}
+        for selection in selections:
+            if isinstance(selection, string_type):
+                selection = Selection.cached(selection)
+            string = selection.string
+            if string not in indexes:
+                indexes[string] = len(self.__unique)
+                self.__unique.append(selection)
+            self.__selections.append(selection)
+            self.__mapping.append(indexes[string])
+
+        if engine == "numpy":
+            self.__compiled = [_compile(selection.string) for selection in self.__unique]
+        else:
+            self.__compiled = [None for _ in self.__unique]
+
+    def __len__(self):
+        return len(self.__selections)
+
+    def __getitem__(self, index):
+        return self.__selections[index]
+
+    def __iter__(self):
+        return iter(self.__selections)
+
+    def __repr__(self):
+        return "SelectionSet with {} selections".format(len(self))
+
+    def evaluate(self, frame):
+        """
+        Evaluate all the selections in this :py:class:`SelectionSet` for the
+        :py:class:`Frame` ``frame``, and return a list containing the result
+        of :py:func:`Selection.evaluate_array` for each selection.
+        """
+        columns = None
+        if any(compiled is not None for compiled in self.__compiled):
+            columns = _AtomColumns(frame)
+        return self._expand([
+            _evaluate_array(selection, compiled, frame, columns)
+            for selection, compiled in zip(self.__unique, self.__compiled)
+        ])
+
+    def evaluate_trajectory(self, trajectory, steps=None, static_topology=False):
+        """
+        Evaluate all the selections in this :py:class:`SelectionSet` for the
+        ``steps`` (by default all the steps) of the :py:class:`Trajectory`
+        ``trajectory``, yielding a ``(frame, matches)`` tuple for each step,
+        where ``matches`` is the same as :py:func:`SelectionSet.evaluate`.
+
+        Each frame is read once for all the selections, and the results of
+        selections depending only on the topology are re-used as in
+        :py:func:`Selection.evaluate_trajectory`.
+        """
+        frames = _evaluate_frames(
+            self.__unique, _read_frames(trajectory, steps), static_topology, self.__compiled
+        )
+        for frame, matches in frames:
+            yield frame, self._expand(matches)
+
+    def _expand(self, matches):
+        """Get the matches for all selections from the matches of unique selections"""
         result = []
-        for match in matches:
-            assert match[0] == size
-            atoms = match[1]
-            if size == 1:
-                result.append(atoms[0])
-            elif size == 2:
-                result.append((atoms[0], atoms[1]))
-            elif size == 3:
-                result.append((atoms[0], atoms[1], atoms[2]))
-            elif size == 4:
-                result.append((atoms[0], atoms[1], atoms[2], atoms[3]))
+        used = set()
+        for index in self.__mapping:
+            if index in used and matches[index].flags.writeable:
+                # do not return the same writeable array twice
+                result.append(matches[index].copy())
+            else:
+                result.append(matches[index])
+            used.add(index)
         return result
+
+
+class SelectionMatches(object):
+    """
+    Matches of a :py:class:`Selection` for multiple frames, stored in two
+    arrays. ``values`` contains the matches for all the frames one after the
+    other, with the same shape as :py:func:`Selection.evaluate_array`; and
+    the matches for the frame ``i`` are ``values[offsets[i]:offsets[i + 1]]``.
+
+    Indexing a :py:class:`SelectionMatches` gives the matches for the
+    corresponding frame.
+    """
+
+    def __init__(self, offsets, values):
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("index {} is out of range for SelectionMatches".format(index))
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return "SelectionMatches for {} frames".format(len(self))
+
+    def counts(self):
+        """Get the number of matches in each frame"""
+        return np.diff(self.offsets)
+
+
+def evaluate_selections(trajectory, selections, steps=None, static_topology=False, processes=None):
+    """
+    Evaluate one or multiple ``selections`` for the ``steps`` (by default all
+    the steps) of the :py:class:`Trajectory` ``trajectory``, and return the
+    corresponding :py:class:`SelectionMatches`. ``selections`` can be a
+    :py:class:`Selection` or a selection string, giving a single
+    :py:class:`SelectionMatches`; or a list of them, giving a list of
+    :py:class:`SelectionMatches`.
+
+    The steps are split in chunks processed by ``processes`` worker processes
+    (by default, one per CPU), each opening the trajectory again and using
+    its own copy of the selections. Within a chunk, selections depending only
+    on the topology are evaluated once, as in
+    :py:func:`Selection.evaluate_trajectory`.
+    """
+    single = isinstance(selections, (Selection, string_type))
+    if single:
+        selections = [selections]
+    selections = [
+        Selection.cached(selection) if isinstance(selection, string_type) else selection
+        for selection in selections
+    ]
+
+    if steps is None:
+        steps = range(trajectory.nsteps)
+    steps = np.asarray(steps, dtype=np.int64).reshape(-1)
+
+    processes = _process_count(processes)
+    chunks = [chunk for chunk in np.array_split(steps, 4 * processes) if len(chunk) != 0]
+    # the trajectory and selections are re-created in each worker by _evaluate_setup
+    results = _parallel_map(
+        _evaluate_chunk, chunks, _evaluate_setup,
+        (trajectory, selections, static_topology), processes
+    )
+
+    counts = [[] for _ in selections]
+    values = [[] for _ in selections]
+    for chunk in results:
+        for i, (chunk_counts, chunk_values) in enumerate(chunk):
+            counts[i].append(chunk_counts)
+            values[i].append(chunk_values)
+
+    matches = []
+    for i, selection in enumerate(selections):
+        offsets = np.zeros(len(steps) + 1, dtype=np.int64)
+        if len(counts[i]) != 0:
+            np.cumsum(np.concatenate(counts[i]), out=offsets[1:])
+            selection_values = np.concatenate(values[i])
+        else:
+            size = selection.size
+            shape = (0,) if size == 1 else (0, size)
+            selection_values = np.zeros(shape, dtype=np.uint64)
+        matches.append(SelectionMatches(offsets, selection_values))
+
+    if single:
+        return matches[0]
+    else:
+        return matches
+
+
+def _evaluate_setup(trajectory, selections, static_topology):
+    """
+    Open the trajectory again and copy the selections in a worker, to not
+    share the file and the selections matches buffers with other workers
+    """
+    return _worker_copy(trajectory), _worker_copy(selections), static_topology
+
+
+def _evaluate_chunk(state, steps):
+    """
+    Evaluate the selections for the given ``steps``, returning the number of
+    matches in each step and all the matches for each selection
+    """
+    trajectory, selections, static_topology = state
+    counts = [np.zeros(len(steps), dtype=np.int64) for _ in selections]
+    values = [[] for _ in selections]
+    frames = _evaluate_frames(selections, _read_frames(trajectory, steps), static_topology)
+    for step, (_, matches) in enumerate(frames):
+        for i, selection_matches in enumerate(matches):
+            counts[i][step] = len(selection_matches)
+            values[i].append(selection_matches)
+    return [(counts[i], np.concatenate(values[i])) for i in range(len(selections))]
+
+
+def _evaluate_array(selection, compiled, frame, columns):
+    """
+    Evaluate ``selection`` with numpy if it was ``compiled`` and is supported
+    for this frame, and with chemfiles otherwise.
+    """
+    if compiled is not None:
+        try:
+            return np.nonzero(compiled(columns))[0].astype(np.uint64)
+        except _Unsupported:
+            pass
+    return selection.evaluate_array(frame)
+
+
+def _read_frames(trajectory, steps):
+    """
+    Read the ``steps`` (by default all the steps) of ``trajectory``,
+    yielding each frame with the topology generation of the trajectory, as
+    used by ``_evaluate_frames``.
+    """
+    if steps is None:
+        steps = range(trajectory.nsteps)
+    for step in steps:
+        frame = trajectory.read_step(int(step))
+        yield frame, trajectory._topology_generation
+
+
+def _evaluate_frames(selections, frames, static_topology, compiled=None):
+    """
+    Evaluate all the ``selections`` for the ``(frame, generation)`` pairs in
+    ``frames`` (see ``_read_frames``), yielding the frame and a list of
+    matches for each step. The matches of selections depending only on the
+    topology are re-used while the topology does not change, as well as the
+    atomic properties used by the ``compiled`` numpy selections. Atomic
+    properties are not extracted if there are no ``compiled`` selections.
+    """
+    if compiled is None:
+        compiled = [None for _ in selections]
+
+    topological = [selection.is_topological for selection in selections]
+    use_columns = any(function is not None for function in compiled)
+    matches = [None for _ in selections]
+    generation = None
+    natoms = None
+    columns = None
+    for frame, current in frames:
+        if static_topology and current is None:
+            current = -1
+        unchanged = (
+            current is not None and
+            current == generation and
+            len(frame.atoms) == natoms
+        )
+        generation = current
+        natoms = len(frame.atoms)
+        if use_columns:
+            if unchanged:
+                columns.update(frame)
+            else:
+                columns = _AtomColumns(frame)
+
+        for i, selection in enumerate(selections):
+            if not (topological[i] and unchanged and matches[i] is not None):
+                matches[i] = _evaluate_array(selection, compiled[i], frame, columns)
+                matches[i].flags.writeable = False
+        yield frame, list(matches)
+
+
+class _SelectionCache(object):
+    """Thread-safe LRU cache of compiled selections, indexed by string"""
+
+    def __init__(self, size):
+        self.size = size
+        self.__lock = threading.Lock()
+        self.__selections = OrderedDict()
+
+    def get(self, string):
+        with self.__lock:
+            selection = self.__selections.pop(string, None)
+            if selection is not None:
+                # move the selection to the most recently used position
+                self.__selections[string] = selection
+                return selection
+
+        # parse the selection outside of the lock, this can take some time
+        selection = Selection(string)
+        with self.__lock:
+            selection = self.__selections.setdefault(string, selection)
+            self.__evict()
+        return selection
+
+    def resize(self, size, clear=False):
+        if size < 0:
+            raise ChemfilesError("the cache size must be positive, got {}".format(size))
+        with self.__lock:
+            self.size = size
+            if clear:
+                self.__selections.clear()
+            self.__evict()
+
+    def __evict(self):
+        while len(self.__selections) > self.size:
+            self.__selections.popitem(last=False)
+
+
+_CACHE = _SelectionCache(128)
+
+
+def _selection_indexes(frame, selection):
+    """
+    Get the indexes of atoms in ``frame`` matching ``selection`` as a numpy
+    array. ``selection`` can be ``None`` (all atoms), a :py:class:`Selection`,
+    a selection string, or a list of indexes.
+    """
+    if selection is None:
+        return np.arange(len(frame.atoms))
+
+    if isinstance(selection, string_type):
+        selection = Selection.cached(selection)
+
+    if isinstance(selection, Selection):
+        if selection.size != 1:
+            raise ChemfilesError(
+                "expected a selection of size 1, got a selection of size {}".format(selection.size)
+            )
+        return selection.evaluate_array(frame).astype(np.int64)
+    else:
+        return np.asarray(selection, dtype=np.int64).reshape(-1)
@@ -0,0 +1,297 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import sys
+import pickle
+import numpy as np
+
+from .misc import ChemfilesError
+from .cell import UnitCell, CellShape
+from .frame import Frame
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    # shared_memory is only available with Python 3.8+
+    shared_memory = None
+    resource_tracker = None
+
+# Before Python 3.13, attaching to a shared memory block always registers it
+# with the resource tracker, which destroys it when the process exits
+_TRACKED_ON_ATTACH = sys.version_info < (3, 13) and os.name == "posix"
+
+
+# The shared memory block starts with a fixed size header, containing the cell
+# shape, lengths and angles, whether the frame has velocities (all as float64)
+# and the step (as uint64). Positions and velocities are stored afterward.
+_HEADER_FLOATS = 8
+_HEADER_SIZE = 8 * _HEADER_FLOATS + 8
+_HEADER_SIZE += (-_HEADER_SIZE) % 64
+
+
+def _check_shared_memory():
+    if shared_memory is None:
+        raise ChemfilesError("shared memory transport requires Python 3.8 or later")
+
+
+def _untrack(shm):
+    """Remove the shared memory block ``shm`` from the resource tracker"""
+    resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def _block_size(natoms, velocities):
+    size = _HEADER_SIZE + 3 * 8 * natoms
+    if velocities:
+        size += 3 * 8 * natoms
+    # shared memory blocks can not be empty
+    return max(size, 1)
+
+
+def _map_block(buffer, natoms, velocities):
+    """Get numpy arrays for the header, positions and velocities in ``buffer``"""
+    header = np.ndarray((_HEADER_FLOATS,), dtype=np.float64, buffer=buffer)
+    step = np.ndarray((1,), dtype=np.uint64, buffer=buffer, offset=8 * _HEADER_FLOATS)
+    offset = _HEADER_SIZE
+    positions = np.ndarray((natoms, 3), dtype=np.float64, buffer=buffer, offset=offset)
+    if velocities:
+        offset += 3 * 8 * natoms
+        velocities = np.ndarray((natoms, 3), dtype=np.float64, buffer=buffer, offset=offset)
+    else:
+        velocities = None
+    return header, step, positions, velocities
+
+
+class SharedFrameHandle(object):
+    """
+    Small picklable handle describing a :py:class:`SharedFrame`, to be sent to
+    worker processes. The topology is stored in the handle, so it is only sent
+    once to every worker.
+    """
+
+    def __init__(self, name, natoms, velocities, topology):
+        self.name = name
+        self.natoms = natoms
+        self.velocities = velocities
+        # pickled topology, only unpickled on the first access
+        self.topology = topology
+
+    def attach(self):
+        """
+        Attach to the shared memory block described by this handle, and get
+        the corresponding :py:class:`SharedFrameView`.
+        """
+        return SharedFrameView(self)
+
+
+class SharedFrame(object):
+    """
+    Publish the positions, velocities, unit cell and step of a
+    :py:class:`Frame` in a shared memory block, to send the same frame to
+    multiple processes without pickling the coordinates.
+
+    The :py:attr:`SharedFrame.handle` should be sent once to each worker
+    process, which can then use :py:func:`SharedFrameHandle.attach` to get a
+    read-only :py:class:`SharedFrameView` of the data. Calling
+    :py:func:`SharedFrame.publish` with a new frame updates the data seen by
+    all the workers: synchronization between the publisher and the workers
+    (for example with a :py:class:`multiprocessing.Barrier`) is left to the
+    caller.
+
+    This class requires Python 3.8 or later.
+    """
+
+    def __init__(self, frame):
+        """
+        Create a new :py:class:`SharedFrame` with the same number of atoms,
+        presence of velocities and topology as ``frame``, and publish the
+        data from ``frame``.
+        """
+        _check_shared_memory()
+        self.__natoms = len(frame.atoms)
+        self.__velocities = frame.has_velocities()
+        self.__topology = pickle.dumps(frame.topology, protocol=pickle.HIGHEST_PROTOCOL)
+
+        size = _block_size(self.__natoms, self.__velocities)
+        self.__shm = shared_memory.SharedMemory(create=True, size=size)
+        self.__header, self.__step, self.__positions, self.__velocities_array = _map_block(
+            self.__shm.buf, self.__natoms, self.__velocities
+        )
+        self.publish(frame)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        self.unlink()
+
+    @property
+    def handle(self):
+        """
+        Get the :py:class:`SharedFrameHandle` used to attach to this
+        :py:class:`SharedFrame` from other processes.
+        """
+        return SharedFrameHandle(
+            self.__shm.name, self.__natoms, self.__velocities, self.__topology
+        )
+
+    def publish(self, frame):
+        """
+        Copy the positions, velocities, unit cell and step of ``frame`` in the
+        shared memory block.
+
+        The frame must have the same number of atoms and presence of
+        velocities as the frame used to create this :py:class:`SharedFrame`.
+        Its topology is assumed to be the same, and is not sent again.
+        """
+        if len(frame.atoms) != self.__natoms:
+            raise ChemfilesError(
+                "wrong number of atoms in frame: expected {}, got {}".format(
+                    self.__natoms, len(frame.atoms)
+                )
+            )
+        if frame.has_velocities() != self.__velocities:
+            raise ChemfilesError("can not change velocities presence in a SharedFrame")
+
+        cell = frame.cell
+        self.__header[0] = int(cell.shape)
+        self.__header[1:4] = cell.lengths
+        self.__header[4:7] = cell.angles
+        self.__header[7] = self.__velocities
+        self.__step[0] = frame.step
+
+        if self.__natoms != 0:
+            self.__positions[:] = frame.positions
+            if self.__velocities:
+                self.__velocities_array[:] = frame.velocities
+
+    def close(self):
+        """Close access to the shared memory block from this instance."""
+        self.__header = self.__step = None
+        self.__positions = self.__velocities_array = None
+        self.__shm.close()
+
+    def unlink(self):
+        """
+        Request the shared memory block to be destroyed. This should be called
+        once, after all the workers are done with the data.
+        """
+        if _TRACKED_ON_ATTACH:
+            # views attached from processes sharing our resource tracker
+            # removed the block from it, add it back so it can be removed
+            # again by unlink
+            resource_tracker.register(self.__shm._name, "shared_memory")
+        self.__shm.unlink()
+
+
+class SharedFrameView(object):
+    """
+    Read-only view of a :py:class:`SharedFrame` from another process.
+
+    The positions and velocities are numpy arrays pointing directly into the
+    shared memory, and always reflect the latest published frame.
+    """
+
+    def __init__(self, handle):
+        """Attach to the shared memory block described by ``handle``."""
+        _check_shared_memory()
+        # do not let the resource tracker of this process destroy the block
+        # when it exits, the block is owned by the SharedFrame
+        if sys.version_info >= (3, 13):
+            self.__shm = shared_memory.SharedMemory(name=handle.name, track=False)
+        else:
+            self.__shm = shared_memory.SharedMemory(name=handle.name)
+            if _TRACKED_ON_ATTACH:
+                _untrack(self.__shm)
+
+        self.__natoms = handle.natoms
+        self.__topology_data = handle.topology
+        self.__topology = None
+        self.__header, self.__step, positions, velocities = _map_block(
+            self.__shm.buf, handle.natoms, handle.velocities
+        )
+        positions.flags.writeable = False
+        if velocities is not None:
+            velocities.flags.writeable = False
+        self.__positions = positions
+        self.__velocities = velocities
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.__natoms
+
+    def __repr__(self):
+        return "SharedFrameView with {} atoms".format(self.__natoms)
+
+    @property
+    def positions(self):
+        """Get a read-only view into the shared positions."""
+        return self.__positions
+
+    @property
+    def velocities(self):
+        """
+        Get a read-only view into the shared velocities, or ``None`` if the
+        frame does not have velocities.
+        """
+        return self.__velocities
+
+    def has_velocities(self):
+        """Check if the shared frame contains velocity."""
+        return self.__velocities is not None
+
+    @property
+    def step(self):
+        """Get the step of the shared frame."""
+        return int(self.__step[0])
+
+    @property
+    def cell(self):
+        """Get a copy of the :py:class:`UnitCell` of the shared frame."""
+        lengths = tuple(float(v) for v in self.__header[1:4])
+        angles = tuple(float(v) for v in self.__header[4:7])
+        cell = UnitCell(*(lengths + angles))
+        shape = CellShape(int(self.__header[0]))
+        if cell.shape != shape:
+            cell.shape = shape
+        return cell
+
+    @property
+    def topology(self):
+        """
+        Get the :py:class:`Topology` of the shared frame. The topology is
+        unpickled on first access, and cached afterward.
+        """
+        if self.__topology is None:
+            self.__topology = pickle.loads(self.__topology_data)
+        return self.__topology
+
+    def to_frame(self):
+        """Create a new :py:class:`Frame` containing a copy of the shared data."""
+        frame = Frame()
+        frame.resize(self.__natoms)
+        frame.topology = self.topology
+        if self.__natoms != 0:
+            frame.positions[:] = self.__positions
+        if self.__velocities is not None:
+            frame.add_velocities()
+            if self.__natoms != 0:
+                frame.velocities[:] = self.__velocities
+        frame.cell = self.cell
+        frame.step = self.step
+        return frame
+
+    def close(self):
+        """
+        Close access to the shared memory block from this view. Any array
+        obtained from :py:attr:`SharedFrameView.positions` or
+        :py:attr:`SharedFrameView.velocities` must be released before.
+        """
+        self.__header = self.__step = None
+        self.__positions = self.__velocities = None
+        self.__shm.close()
@@ -0,0 +1,167 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import copy
+import numpy as np
+
+from .misc import ChemfilesError
+from .cell import UnitCell
+from .frame import Frame
+from .selection import _selection_indexes
+
+_INT32_MAX = np.iinfo(np.int32).max - 1
+
+
+class FrameStore(object):
+    """
+    In-memory storage for the frames of a trajectory, keeping the positions
+    with a reduced precision to save memory. Positions are converted back to
+    float64 when accessed.
+
+    With ``dtype="float32"``, positions are stored as single precision
+    floating point numbers, using half the memory of the full positions. With
+    ``dtype="int32"``, positions are stored as fixed point integers (as in
+    XTC files) with an absolute ``precision`` in Angstroms. The scale is
+    chosen for each frame, and increased if some positions would not fit in
+    32-bit integers.
+
+    The topology of the first frame is shared by all the frames, which must
+    all contain the same number of atoms. Unit cells and steps are stored for
+    each frame, but velocities and frame properties are not.
+    """
+
+    def __init__(self, dtype="float32", precision=1e-3):
+        if dtype not in ("float32", "int32"):
+            raise ChemfilesError("unsupported dtype '{}' for FrameStore".format(dtype))
+        if precision <= 0:
+            raise ChemfilesError("the precision must be positive, got {}".format(precision))
+        self.dtype = dtype
+        self.precision = precision
+        self.__natoms = None
+        self.__topology = None
+        self.__positions = []
+        self.__scales = []
+        self.__cells = []
+        self.__steps = []
+
+    @classmethod
+    def from_trajectory(cls, trajectory, steps=None, dtype="float32", precision=1e-3):
+        """
+        Create a new :py:class:`FrameStore` containing the given ``steps``
+        (by default all the steps) of the :py:class:`Trajectory`
+        ``trajectory``.
+        """
+        store = cls(dtype, precision)
+        if steps is None:
+            steps = range(trajectory.nsteps)
+        for step in steps:
+            store.append(trajectory.read_step(int(step)))
+        return store
+
+    def __len__(self):
+        return len(self.__positions)
+
+    def __repr__(self):
+        return "FrameStore with {} frames ({})".format(len(self), self.dtype)
+
+    def __getitem__(self, index):
+        """
+        Get a new :py:class:`Frame` with the data stored at ``index``, with
+        float64 positions.
+        """
+        positions = self.positions(index)
+        frame = Frame()
+        frame.resize(self.__natoms)
+        frame.topology = self.__topology
+        if self.__natoms != 0:
+            frame.positions[:] = positions
+
+        lengths, angles, shape = self.__cells[index]
+        cell = UnitCell(*(lengths + angles))
+        if cell.shape != shape:
+            cell.shape = shape
+        frame.cell = cell
+        frame.step = self.__steps[index]
+        return frame
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def topology(self):
+        """Get the :py:class:`Topology` shared by all the frames."""
+        return self.__topology
+
+    @property
+    def nbytes(self):
+        """Get the memory used to store the positions, in bytes."""
+        return sum(positions.nbytes for positions in self.__positions)
+
+    def append(self, frame):
+        """Add the :py:class:`Frame` ``frame`` at the end of this store."""
+        natoms = len(frame.atoms)
+        if self.__natoms is None:
+            self.__natoms = natoms
+            self.__topology = copy.copy(frame.topology)
+        elif natoms != self.__natoms:
+            raise ChemfilesError(
+                "wrong number of atoms in frame: expected {}, got {}".format(self.__natoms, natoms)
+            )
+
+        if natoms == 0:
+            positions = np.zeros((0, 3))
+        else:
+            positions = frame.positions
+
+        if self.dtype == "float32":
+            self.__positions.append(positions.astype(np.float32))
+            self.__scales.append(1.0)
+        else:
+            scale = self.precision
+            if natoms != 0:
+                scale = max(scale, np.max(np.abs(positions)) / _INT32_MAX)
+            self.__positions.append(np.rint(positions / scale).astype(np.int32))
+            self.__scales.append(scale)
+
+        cell = frame.cell
+        self.__cells.append((cell.lengths, cell.angles, cell.shape))
+        self.__steps.append(frame.step)
+
+    def positions(self, index):
+        """Get the positions stored at ``index``, as a float64 array."""
+        positions = self.__positions[index].astype(np.float64)
+        if self.dtype == "int32":
+            positions *= self.__scales[index]
+        return positions
+
+    def read_positions(self, indexes=None, selection=None):
+        """
+        Get the positions for multiple frames stored in this
+        :py:class:`FrameStore` as a float64 array of shape ``(nframes,
+        natoms, 3)``, similar to :py:func:`Trajectory.read_positions`.
+
+        ``indexes`` defaults to all the stored frames. ``selection`` can be a
+        :py:class:`Selection`, a selection string or a list of atomic indexes,
+        and restricts the positions to the corresponding atoms. A selection is
+        only evaluated with the first frame.
+        """
+        if indexes is None:
+            indexes = range(len(self))
+        indexes = np.asarray(indexes, dtype=np.int64).reshape(-1)
+        if len(indexes) == 0:
+            return np.zeros((0, 0, 3))
+
+        atoms = None
+        if selection is not None:
+            atoms = _selection_indexes(self[int(indexes[0])], selection)
+        count = self.__natoms if atoms is None else len(atoms)
+
+        result = np.zeros((len(indexes), count, 3))
+        for i, index in enumerate(indexes):
+            stored = self.__positions[index]
+            if atoms is not None:
+                stored = stored[atoms]
+            result[i] = stored
+            if self.dtype == "int32":
+                result[i] *= self.__scales[index]
+        return result
@@ -5,9 +5,10 @@ from enum import IntEnum
 import numpy as np
 
 from .utils import CxxPointer
+from .misc import ChemfilesError
 from .ffi import chfl_bond_order
-from .atom import Atom
-from .residue import Residue
+from .atom import Atom, _atoms_table, _set_atoms_table
+from .residue import Residue, _residue_from_state
 
 
 class BondOrder(IntEnum):
@@ -34,6 +35,46 @@ class BondOrder(IntEnum):
     Aromatic = chfl_bond_order.CHFL_BOND_AROMATIC
 
 
+class BondGraph(object):
+    """
+    Compressed sparse row representation of the graph defined by the bonds
+    in a :py:class:`Topology`, created by :py:func:`Topology.adjacency`.
+
+    Each bond appears twice in the graph, once in each direction. The
+    neighbors of atom ``i`` are ``neighbors[offsets[i]:offsets[i + 1]]``
+    (sorted by index), and the ``edges`` and ``orders`` arrays are aligned
+    with ``neighbors``: ``edges`` contains the index in
+    :py:attr:`Topology.bonds` of the corresponding bond, and ``orders`` its
+    :py:class:`BondOrder`. ``degrees`` contains the number of bonds of each
+    atom.
+    """
+
+    def __init__(self, offsets, neighbors, edges, orders):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.edges = edges
+        self.orders = orders
+        self.degrees = np.diff(offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __repr__(self):
+        return "BondGraph with {} atoms and {} bonds".format(len(self), len(self.neighbors) // 2)
+
+    def neighbors_of(self, i):
+        """Get the indexes of the atoms bonded to the atom ``i``."""
+        return self.neighbors[self.offsets[i]:self.offsets[i + 1]]
+
+    def edges_of(self, i):
+        """Get the indexes in :py:attr:`Topology.bonds` of the bonds of the atom ``i``."""
+        return self.edges[self.offsets[i]:self.offsets[i + 1]]
+
+    def orders_of(self, i):
+        """Get the orders of the bonds of the atom ``i``, aligned with ``neighbors_of(i)``."""
+        return self.orders[self.offsets[i]:self.offsets[i + 1]]
+
+
 class TopologyAtoms(object):
     """Proxy object to get the atoms in a topology"""
 
@@ -54,12 +95,11 @@ class TopologyAtoms(object):
         if index >= len(self):
             raise IndexError("atom index ({}) out of range for this topology".format(index))
         else:
-            ptr = self.topology.ffi.chfl_atom_from_topology(self.topology.mut_ptr, c_uint64(index))
-            return Atom.from_mutable_ptr(self, ptr)
+            return Atom.from_mutable_ptr(self, self._atom_ptr(index))
 
     def __iter__(self):
         for i in range(len(self)):
-            yield self[i]
+            yield Atom.from_mutable_ptr(self, self._atom_ptr(i))
 
     def __delitem__(self, index):
         self.remove(index)
@@ -76,6 +116,7 @@ class TopologyAtoms(object):
         becomes ``n - 1``);
         """
         self.topology.ffi.chfl_topology_remove(self.topology.mut_ptr, c_uint64(index))
+        self.topology._modified()
 
     def append(self, atom):
         """
@@ -83,6 +124,34 @@ class TopologyAtoms(object):
         :py:class:`Topology`.
         """
         self.topology.ffi.chfl_topology_add_atom(self.topology.mut_ptr, atom.ptr)
+        self.topology._modified()
+
+    def table(self, fields=None):
+        """
+        Get the properties of all the atoms in the associated
+        :py:class:`Topology` as an :py:class:`AtomsTable` of numpy arrays.
+
+        ``fields`` can be a list of the :py:class:`AtomsTable` columns to
+        fetch (for example ``["masses", "charges"]``), by default all the
+        columns are fetched.
+        """
+        return _atoms_table(self.topology.ffi, len(self), self._atom_ptr, fields)
+
+    def set_table(self, table=None, names=None, types=None, masses=None, charges=None):
+        """
+        Set the names, types, masses and charges of all the atoms in the
+        associated :py:class:`Topology` from arrays with one value per atom.
+
+        Columns are taken from the :py:class:`AtomsTable` ``table`` if it is
+        given, and the other arguments override the corresponding columns.
+        Columns which are ``None`` are left unchanged.
+        """
+        _set_atoms_table(
+            self.topology.ffi, len(self), self._atom_ptr, table, names, types, masses, charges
+        )
+
+    def _atom_ptr(self, index):
+        return self.topology.ffi.chfl_atom_from_topology(self.topology.mut_ptr, c_uint64(index))
 
 
 class TopologyResidues(object):
@@ -131,8 +200,19 @@ class Topology(CxxPointer):
     A :py:class:`Topology` contains the definition of all the atoms in the
     system, and the liaisons between the atoms (bonds, angles, dihedrals, ...).
     It will also contain all the residues information if it is available.
+
+    The arrays returned by :py:attr:`Topology.bonds`, :py:attr:`Topology.angles`,
+    :py:attr:`Topology.dihedrals` and :py:attr:`Topology.impropers` are cached
+    until the topology is modified, and are read-only.
     """
 
+    # Incremented every time the topology is modified, used to invalidate
+    # the cached arrays
+    __modifications = 0
+    # Cached arrays, and the modifications count when they were created
+    __cache = None
+    __cache_key = None
+
     def __init__(self):
         """Create a new empty :py:class:`Topology`."""
         super(Topology, self).__init__(self.ffi.chfl_topology(), is_const=False)
@@ -140,6 +220,9 @@ class Topology(CxxPointer):
     def __copy__(self):
         return Topology.from_mutable_ptr(None, self.ffi.chfl_topology_copy(self.ptr))
 
+    def __reduce__(self):
+        return (_topology_from_state, _topology_state(self))
+
     def __repr__(self):
         return "Topology with {} atoms".format(len(self.atoms))
 
@@ -164,6 +247,7 @@ class Topology(CxxPointer):
         associated bonds, angles and dihedrals.
         """
         self.ffi.chfl_topology_resize(self.mut_ptr, count)
+        self._modified()
 
     @property
     def residues(self):
@@ -185,6 +269,24 @@ class Topology(CxxPointer):
         else:
             return None
 
+    def residue_indexes(self):
+        """
+        Get a numpy array containing the index in :py:attr:`Topology.residues`
+        of the residue containing each atom, or -1 for atoms which are not
+        part of a residue. This is much faster than calling
+        :py:func:`Topology.residue_for_atom` for all atoms.
+        """
+        result = np.full(len(self.atoms), -1, dtype=np.int64)
+        for i in range(len(self.residues)):
+            ptr = self.ffi.chfl_residue_from_topology(self.ptr, c_uint64(i))
+            residue = Residue.from_const_ptr(self, ptr)
+            count = c_uint64()
+            self.ffi.chfl_residue_atoms_count(residue.ptr, count)
+            atoms = np.zeros(count.value, np.uint64)
+            self.ffi.chfl_residue_atoms(residue.ptr, atoms, count)
+            result[atoms.astype(np.int64)] = i
+        return result
+
     def residues_linked(self, first, second):
         """
         Check if the two :py:class:`Residue` ``first`` and ``second`` from this
@@ -222,11 +324,31 @@ class Topology(CxxPointer):
     @property
     def bonds(self):
         """Get the list of bonds in this :py:class:`Topology`."""
+        return self._cached("bonds", self._bonds_array)
+
+    def _bonds_array(self):
         count = self.bonds_count()
         bonds = np.zeros((count, 2), np.uint64)
         self.ffi.chfl_topology_bonds(self.ptr, bonds, c_uint64(count))
         return bonds
 
+    def adjacency(self):
+        """
+        Get the graph of the bonds in this :py:class:`Topology` as a
+        :py:class:`BondGraph`, giving direct access to the neighbors of each
+        atom. The graph is cached until the topology is modified.
+        """
+        return self._cached("adjacency", self._adjacency)
+
+    def _adjacency(self):
+        bonds = self.bonds
+        offsets, neighbors, edges = _bonds_csr(bonds, len(self.atoms))
+        orders = self._cached("orders", self._bond_orders_array).astype(np.int64)[edges]
+        graph = BondGraph(offsets, neighbors, edges, orders)
+        for array in (graph.offsets, graph.neighbors, graph.edges, graph.orders, graph.degrees):
+            array.flags.writeable = False
+        return graph
+
     def bonds_order(self, i, j):
         """
         Get the bonds order corresponding to the bond between atoms i and j
@@ -240,14 +362,20 @@ class Topology(CxxPointer):
         """
         Get the list of bonds order for each bond in this :py:class:`Topology`.
         """
+        return list(map(BondOrder, self._cached("orders", self._bond_orders_array)))
+
+    def _bond_orders_array(self):
         count = self.bonds_count()
         orders = np.zeros(count, chfl_bond_order)
         self.ffi.chfl_topology_bond_orders(self.ptr, orders, c_uint64(count))
-        return list(map(BondOrder, orders))
+        return orders
 
     @property
     def angles(self):
         """Get the list of angles in this :py:class:`Topology`."""
+        return self._cached("angles", self._angles_array)
+
+    def _angles_array(self):
         count = self.angles_count()
         angles = np.zeros((count, 3), np.uint64)
         self.ffi.chfl_topology_angles(self.ptr, angles, c_uint64(count))
@@ -256,6 +384,9 @@ class Topology(CxxPointer):
     @property
     def dihedrals(self):
         """Get the list of dihedral angles in this :py:class:`Topology`."""
+        return self._cached("dihedrals", self._dihedrals_array)
+
+    def _dihedrals_array(self):
         count = self.dihedrals_count()
         dihedrals = np.zeros((count, 4), np.uint64)
         self.ffi.chfl_topology_dihedrals(self.ptr, dihedrals, c_uint64(count))
@@ -264,6 +395,9 @@ class Topology(CxxPointer):
     @property
     def impropers(self):
         """Get the list of improper angles in this :py:class:`Topology`."""
+        return self._cached("impropers", self._impropers_array)
+
+    def _impropers_array(self):
         count = self.impropers_count()
         impropers = np.zeros((count, 4), np.uint64)
         self.ffi.chfl_topology_impropers(self.ptr, impropers, c_uint64(count))
@@ -280,6 +414,7 @@ class Topology(CxxPointer):
             self.ffi.chfl_topology_bond_with_order(
                 self.mut_ptr, c_uint64(i), c_uint64(j), chfl_bond_order(order)
             )
+        self._modified()
 
     def remove_bond(self, i, j):
         """
@@ -289,3 +424,196 @@ class Topology(CxxPointer):
         This function does nothing if there is no bond between ``i`` and ``j``.
         """
         self.ffi.chfl_topology_remove_bond(self.mut_ptr, c_uint64(i), c_uint64(j))
+        self._modified()
+
+    def add_bonds(self, bonds, orders=None):
+        """
+        Add all the ``bonds`` (an array of shape ``(n, 2)`` of atomic
+        indexes) to this :py:class:`Topology`, optionally setting the bond
+        ``orders`` (an array with one :py:class:`BondOrder` for each bond).
+
+        This is equivalent to calling :py:func:`Topology.add_bond` for each
+        bond, but the bonds are validated all at once before modifying the
+        topology, and bonds which are duplicated or already in the topology
+        are skipped.
+        """
+        bonds, orders = _new_bonds(bonds, orders, len(self.atoms), self.bonds)
+        ptr = self.mut_ptr
+        if orders is None:
+            add_bond = self.ffi.chfl_topology_add_bond
+            for i, j in bonds.tolist():
+                add_bond(ptr, i, j)
+        else:
+            add_bond = self.ffi.chfl_topology_bond_with_order
+            for (i, j), order in zip(bonds.tolist(), orders.tolist()):
+                add_bond(ptr, i, j, order)
+        self._modified()
+
+    def remove_bonds(self, bonds):
+        """
+        Remove all the ``bonds`` (an array of shape ``(n, 2)`` of atomic
+        indexes) from this :py:class:`Topology`. Bonds which are not in the
+        topology are ignored.
+        """
+        bonds = _existing_bonds(bonds, len(self.atoms), self.bonds)
+        ptr = self.mut_ptr
+        remove_bond = self.ffi.chfl_topology_remove_bond
+        for i, j in bonds.tolist():
+            remove_bond(ptr, i, j)
+        self._modified()
+
+    def _modified(self):
+        """Invalidate the cached arrays after a modification of this topology"""
+        self.__modifications += 1
+
+    def _cached(self, name, compute):
+        """
+        Get the cached array ``name``, calling ``compute`` to create it if the
+        topology was modified since it was last cached.
+        """
+        # topologies from a frame can be modified through the frame
+        frame_generation = getattr(self._CxxPointer__origin, "_Frame__topology_generation", None)
+        key = (self.__modifications, frame_generation)
+        if self.__cache_key != key:
+            self.__cache = {}
+            self.__cache_key = key
+
+        if name not in self.__cache:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self.__cache[name] = value
+        return self.__cache[name]
+
+
+def _bonds_csr(bonds, natoms):
+    """
+    Build a compressed sparse row representation of the graph defined by the
+    ``bonds`` array between ``natoms`` atoms. This returns ``(offsets,
+    neighbors, edges)``, where the neighbors of atom ``i`` are
+    ``neighbors[offsets[i]:offsets[i + 1]]`` (sorted by index), and ``edges``
+    contains the index in ``bonds`` of the corresponding bond.
+    """
+    bonds = np.asarray(bonds, dtype=np.int64).reshape(-1, 2)
+    first = np.concatenate([bonds[:, 0], bonds[:, 1]])
+    second = np.concatenate([bonds[:, 1], bonds[:, 0]])
+    edges = np.concatenate([np.arange(len(bonds)), np.arange(len(bonds))])
+
+    order = np.lexsort((second, first))
+    counts = np.bincount(first, minlength=natoms)
+    offsets = np.zeros(natoms + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, second[order], edges[order]
+
+
+def _bonds_keys(bonds, natoms):
+    """
+    Get a unique integer key for each bond in ``bonds``, which must contain
+    sorted pairs of atomic indexes
+    """
+    return bonds[:, 0] * natoms + bonds[:, 1]
+
+
+def _check_bonds(bonds, natoms):
+    """
+    Validate the ``bonds`` array for a system with ``natoms`` atoms, and get
+    it as an array of sorted ``(i, j)`` pairs with ``i < j``.
+    """
+    bonds = np.asarray(bonds, dtype=np.int64)
+    if bonds.size == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    if bonds.ndim != 2 or bonds.shape[1] != 2:
+        raise ChemfilesError(
+            "bonds must be an array of shape (n, 2), got shape {}".format(bonds.shape)
+        )
+    if bonds.min() < 0 or bonds.max() >= natoms:
+        raise ChemfilesError(
+            "out of bounds atomic index in bonds: we have {} atoms".format(natoms)
+        )
+    if np.any(bonds[:, 0] == bonds[:, 1]):
+        raise ChemfilesError("invalid bond between an atom and itself")
+    return np.sort(bonds, axis=1)
+
+
+def _new_bonds(bonds, orders, natoms, existing):
+    """
+    Get the bonds from the ``bonds`` array which are not already in the
+    ``existing`` array, in the order of the bonds in a topology, together
+    with the corresponding ``orders`` if they are not ``None``.
+    """
+    bonds = _check_bonds(bonds, natoms)
+    if orders is not None:
+        orders = np.asarray(orders, dtype=np.int64).reshape(-1)
+        if len(orders) != len(bonds):
+            raise ChemfilesError(
+                "expected {} bond orders, got {}".format(len(bonds), len(orders))
+            )
+
+    keys = _bonds_keys(bonds, natoms)
+    # keep the first occurrence of each bond, sorted as in the topology
+    keys, first = np.unique(keys, return_index=True)
+    new = ~np.isin(keys, _bonds_keys(existing.astype(np.int64), natoms))
+    first = first[new]
+    if orders is not None:
+        orders = orders[first]
+    return bonds[first], orders
+
+
+def _existing_bonds(bonds, natoms, existing):
+    """
+    Get the bonds from the ``bonds`` array which are in the ``existing``
+    array, starting with the last one in the topology.
+    """
+    bonds = _check_bonds(bonds, natoms)
+    keys = np.unique(_bonds_keys(bonds, natoms))
+    keys = keys[np.isin(keys, _bonds_keys(existing.astype(np.int64), natoms))][::-1]
+    return np.column_stack([keys // natoms, keys % natoms]).reshape(-1, 2)
+
+
+def _topology_state(topology):
+    """
+    Get a compact representation of ``topology``, used for pickling. Atomic
+    names, types, masses and charges are stored as arrays, together with the
+    bonds and bond orders arrays. Atomic properties are only stored for the
+    atoms having some.
+    """
+    table = topology.atoms.table(["names", "types", "masses", "charges"])
+
+    properties = {}
+    for i, atom in enumerate(topology.atoms):
+        if atom.properties_count() != 0:
+            properties[i] = dict((name, atom[name]) for name in atom.list_properties())
+
+    bonds = topology.bonds
+    orders = np.zeros(len(bonds), chfl_bond_order)
+    topology.ffi.chfl_topology_bond_orders(topology.ptr, orders, c_uint64(len(bonds)))
+
+    residues = [residue._state() for residue in topology.residues]
+    return (
+        table.names,
+        table.types,
+        table.masses,
+        table.charges,
+        properties,
+        bonds,
+        orders,
+        residues,
+    )
+
+
+def _topology_from_state(names, types, masses, charges, properties, bonds, orders, residues):
+    """Re-create a :py:class:`Topology` from the data in ``_topology_state``"""
+    topology = Topology()
+    topology.resize(len(names))
+    topology.atoms.set_table(names=names, types=types, masses=masses, charges=charges)
+
+    for i, atom_properties in properties.items():
+        atom = topology.atoms[i]
+        for name, value in atom_properties.items():
+            atom[name] = value
+
+    topology.add_bonds(bonds, orders)
+
+    for residue in residues:
+        topology.residues.append(_residue_from_state(*residue))
+    return topology
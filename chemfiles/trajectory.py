@@ -1,10 +1,13 @@
 # -*- coding=utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 import ctypes
+import copy
 from ctypes import c_uint64, c_char_p
+import numpy as np
 
 from .utils import CxxPointer
 from .frame import Frame, Topology
+from .selection import _selection_indexes
 from .misc import ChemfilesError
 
 
@@ -31,6 +34,11 @@ class Trajectory(CxxPointer):
         # Store mode and format for __repr__
         self.__mode = mode
         self.__format = format
+        # Store topology and cell set by the user for pickling
+        self.__topology = None
+        self.__cell = None
+        # Incremented each time the topology is set, to detect changes
+        self.__topology_generation = 0
         ptr = self.ffi.chfl_trajectory_with_format(
             path.encode("utf8"), mode.encode("utf8"), format.encode("utf8")
         )
@@ -59,6 +67,17 @@ class Trajectory(CxxPointer):
     def __repr__(self):
         return "Trajectory('{}', '{}', '{}')".format(self.path, self.__mode, self.__format)
 
+    def __reduce__(self):
+        """
+        Trajectories opened in read mode can be pickled, for example to be
+        sent to worker processes. The file is opened again when unpickling,
+        with the same format, topology and unit cell.
+        """
+        self.__check_opened()
+        if self.__mode != "r":
+            raise ChemfilesError("only trajectories opened in read mode can be pickled")
+        return (_trajectory_from_state, (self.path, self.__format, self.__topology, self.__cell))
+
     def read(self):
         """
         Read the next step of this :py:class:`Trajectory` and return the
@@ -79,6 +98,50 @@ class Trajectory(CxxPointer):
         self.ffi.chfl_trajectory_read_step(self.mut_ptr, c_uint64(step), frame.mut_ptr)
         return frame
 
+    def read_positions(self, steps=None, selection=None):
+        """
+        Read the positions for multiple steps of this :py:class:`Trajectory`
+        in a single numpy array with shape ``(nsteps, natoms, 3)``.
+
+        ``steps`` is a list of steps to read, and defaults to all the steps in
+        the trajectory. ``selection`` can be a :py:class:`Selection`, a
+        selection string or a list of atomic indexes, and restricts the
+        positions to the corresponding atoms. A selection is only evaluated
+        with the first step read.
+        """
+        self.__check_opened()
+        if steps is None:
+            steps = range(self.nsteps)
+        steps = np.asarray(steps, dtype=np.int64).reshape(-1)
+
+        frame = Frame()
+        result = np.zeros((0, 0, 3))
+        natoms = None
+        for i, step in enumerate(steps):
+            self.ffi.chfl_trajectory_read_step(self.mut_ptr, c_uint64(int(step)), frame.mut_ptr)
+            frame._invalidate_arrays()
+            frame._topology_modified()
+            if natoms is None:
+                natoms = len(frame.atoms)
+                indexes = None
+                if selection is not None:
+                    indexes = _selection_indexes(frame, selection)
+                count = natoms if indexes is None else len(indexes)
+                result = np.zeros((len(steps), count, 3))
+            elif len(frame.atoms) != natoms:
+                raise ChemfilesError(
+                    "the number of atoms changed from {} to {} at step {}".format(
+                        natoms, len(frame.atoms), step
+                    )
+                )
+
+            if natoms != 0:
+                if indexes is None:
+                    result[i] = frame.positions
+                else:
+                    result[i] = frame.positions[indexes]
+        return result
+
     def write(self, frame):
         """Write a :py:class:`Frame` to this :py:class:`Trajectory`."""
         self.__check_opened()
@@ -102,10 +165,13 @@ class Trajectory(CxxPointer):
         self.__check_opened()
         if isinstance(topology, Topology):
             self.ffi.chfl_trajectory_set_topology(self.mut_ptr, topology.ptr)
+            self.__topology = copy.copy(topology)
         else:
             self.ffi.chfl_trajectory_topology_file(
                 self.mut_ptr, topology.encode("utf8"), format.encode("utf8")
             )
+            self.__topology = (topology, format)
+        self.__topology_generation += 1
 
     def set_cell(self, cell):
         """
@@ -117,6 +183,18 @@ class Trajectory(CxxPointer):
         """
         self.__check_opened()
         self.ffi.chfl_trajectory_set_cell(self.mut_ptr, cell.ptr)
+        self.__cell = copy.copy(cell)
+
+    @property
+    def _topology_generation(self):
+        """
+        Get a counter incremented by each call to
+        :py:func:`Trajectory.set_topology`, or ``None`` if the topology comes
+        from the file and can change between steps.
+        """
+        if self.__topology is None:
+            return None
+        return self.__topology_generation
 
     @property
     def nsteps(self):
@@ -142,3 +220,15 @@ class Trajectory(CxxPointer):
         self.__check_opened()
         self.__closed = True
         self.ffi.chfl_trajectory_close(self.ptr)
+
+
+def _trajectory_from_state(path, format, topology, cell):
+    """Re-open a :py:class:`Trajectory` from the data in ``__reduce__``"""
+    trajectory = Trajectory(path, "r", format)
+    if isinstance(topology, tuple):
+        trajectory.set_topology(*topology)
+    elif topology is not None:
+        trajectory.set_topology(topology)
+    if cell is not None:
+        trajectory.set_cell(cell)
+    return trajectory
@@ -2,18 +2,13 @@
 # Any copyright is dedicated to the Public Domain.
 # http://creativecommons.org/publicdomain/zero/1.0/
 #!/usr/bin/env python
-from chemfiles import Trajectory, Selection
+from chemfiles import Trajectory, extract_selection
 
 trajectory = Trajectory("input.arc")
 output = Trajectory("output.pdb", 'w')
 
-selection = Selection("name Zn or name N")
-
-for frame in trajectory:
-    to_remove = selection.evaluate(frame)
-    for i in reversed(sorted(to_remove)):
-        frame.remove(i)
-    output.write(frame)
+# Remove all the Zn and N atoms, keeping the other ones
+extract_selection(trajectory, output, "not (name Zn or name N)")
 
 trajectory.close()
 output.close()
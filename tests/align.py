@@ -0,0 +1,113 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+import os
+
+from chemfiles import Trajectory, ChemfilesError
+from chemfiles.align import superposition, rmsd, align, rmsd_matrix
+
+
+def get_data_path(data):
+    root = os.path.dirname(__file__)
+    return os.path.join(root, "data", data)
+
+
+def random_rotations(count, random):
+    q, _ = np.linalg.qr(random.normal(size=(count, 3, 3)))
+    # make sure these are proper rotations
+    return q * np.sign(np.linalg.det(q))[:, np.newaxis, np.newaxis]
+
+
+class TestAlign(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(42)
+        self.reference = random.normal(size=(30, 3))
+        self.rotations = random_rotations(8, random)
+        self.translations = random.normal(size=(8, 3))
+        self.mobile = np.matmul(self.reference, self.rotations) + self.translations[:, np.newaxis]
+        self.noisy = self.mobile + random.normal(scale=0.1, size=self.mobile.shape)
+        self.weights = random.uniform(1, 16, 30)
+
+    def test_superposition(self):
+        rotations, translations = superposition(self.mobile, self.reference)
+        self.assertEqual(rotations.shape, (8, 3, 3))
+        self.assertEqual(translations.shape, (8, 3))
+        aligned = np.matmul(self.mobile, rotations) + translations[:, np.newaxis]
+        self.assertTrue(np.allclose(aligned, self.reference))
+
+        rotation, translation = superposition(self.mobile[2], self.reference)
+        self.assertTrue(np.allclose(rotation, rotations[2]))
+        self.assertTrue(np.allclose(translation, translations[2]))
+
+        # reflections are not allowed
+        rotation, _ = superposition(-self.reference, self.reference)
+        self.assertAlmostEqual(np.linalg.det(rotation), 1.0)
+
+        with self.assertRaises(ChemfilesError):
+            superposition(self.mobile[:, :10], self.reference)
+
+        with self.assertRaises(ChemfilesError):
+            superposition(self.mobile, self.reference, weights=np.ones(3))
+
+    def test_rmsd(self):
+        self.assertTrue(np.allclose(rmsd(self.mobile, self.reference), 0.0))
+
+        for weights in [None, self.weights]:
+            rotations, translations = superposition(self.noisy, self.reference, weights)
+            aligned = np.matmul(self.noisy, rotations) + translations[:, np.newaxis]
+            expected = rmsd(aligned, self.reference, weights, fit=False)
+            self.assertTrue(np.allclose(rmsd(self.noisy, self.reference, weights), expected))
+
+        expected = np.sqrt(np.mean(np.sum((self.noisy[0] - self.reference) ** 2, axis=1)))
+        self.assertAlmostEqual(rmsd(self.noisy[0], self.reference, fit=False), expected)
+
+    def test_align(self):
+        positions = self.noisy.copy()
+        result = align(positions, self.reference, weights=self.weights)
+        self.assertTrue(np.allclose(result, rmsd(self.noisy, self.reference, self.weights)))
+        self.assertTrue(np.allclose(result, rmsd(positions, self.reference, self.weights, fit=False)))
+
+        fit = np.arange(10)
+        measure = np.arange(10, 30)
+        positions = self.noisy.copy()
+        result = align(positions, self.reference, fit=fit, measure=measure)
+        rotations, translations = superposition(self.noisy[:, fit], self.reference[fit])
+        aligned = np.matmul(self.noisy, rotations) + translations[:, np.newaxis]
+        self.assertTrue(np.allclose(positions, aligned))
+        expected = rmsd(aligned[:, measure], self.reference[measure], fit=False)
+        self.assertTrue(np.allclose(result, expected))
+
+        with self.assertRaises(ChemfilesError):
+            align(self.noisy.astype(np.float32), self.reference)
+
+        with self.assertRaises(ChemfilesError):
+            align(self.noisy.copy(), self.reference, fit=[])
+
+    def test_rmsd_matrix(self):
+        steps = list(range(0, 100, 9))
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            positions = trajectory.read_positions(steps, "name O")
+            expected = np.array([rmsd(positions, reference) for reference in positions])
+
+            matrix = rmsd_matrix(trajectory, "name O", steps, block_size=4, processes=1)
+            self.assertEqual(matrix.shape, (len(steps), len(steps)))
+            self.assertTrue(np.allclose(matrix, expected))
+
+            matrix = rmsd_matrix(
+                trajectory, "name O", steps, block_size=5, processes=2, output="test-tmp.npy"
+            )
+            self.assertTrue(np.allclose(matrix, expected))
+            del matrix
+            self.assertTrue(np.allclose(np.load("test-tmp.npy"), expected))
+            os.unlink("test-tmp.npy")
+
+            matrix = rmsd_matrix(trajectory, steps=[], processes=1)
+            self.assertEqual(matrix.shape, (0, 0))
+
+            with self.assertRaises(ChemfilesError):
+                rmsd_matrix(trajectory, "name Zn", steps)
+
+
+if __name__ == "__main__":
+    unittest.main()
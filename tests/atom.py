@@ -2,6 +2,7 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import unittest
 import copy
+import pickle
 
 from chemfiles import Atom, ChemfilesError
 from _utils import remove_warnings
@@ -23,6 +24,19 @@ class TestAtom(unittest.TestCase):
         self.assertEqual(atom.name, "Zn")
         self.assertEqual(cloned.name, "He")
 
+    def test_pickle(self):
+        atom = Atom("He-3", "He")
+        atom.mass = 3.016
+        atom.charge = 2
+        atom["foo"] = "bar"
+
+        cloned = pickle.loads(pickle.dumps(atom))
+        self.assertEqual(cloned.name, "He-3")
+        self.assertEqual(cloned.type, "He")
+        self.assertEqual(cloned.mass, 3.016)
+        self.assertEqual(cloned.charge, 2)
+        self.assertEqual(cloned["foo"], "bar")
+
     def test_very_long_name(self):
         atom = Atom("He" * 128)
         self.assertEqual(atom.name, "He" * 128)
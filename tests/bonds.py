@@ -0,0 +1,110 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+
+from chemfiles import Frame, Atom, UnitCell, BondGuesser, neighbor_pairs, ChemfilesError
+
+
+def brute_force_pairs(positions, cutoff, cell):
+    pairs = []
+    for i in range(len(positions)):
+        for j in range(i + 1, len(positions)):
+            vector = cell._minimum_image(positions[j] - positions[i])
+            if np.linalg.norm(vector) < cutoff:
+                pairs.append((i, j))
+    return pairs
+
+
+class TestNeighborPairs(unittest.TestCase):
+    def test_pairs(self):
+        rng = np.random.RandomState(42)
+        positions = rng.uniform(0, 12, (200, 3))
+        for cell in [UnitCell(12, 12, 12), UnitCell(12, 12, 12, 80, 95, 110), UnitCell()]:
+            pairs, distances = neighbor_pairs(positions, 3.0, cell)
+            self.assertEqual(pairs.tolist(), brute_force_pairs(positions, 3.0, cell))
+            self.assertEqual(distances.shape, (len(pairs),))
+            self.assertTrue(np.all(distances < 3.0))
+
+        pairs, _ = neighbor_pairs(positions, 3.0)
+        self.assertEqual(pairs.tolist(), brute_force_pairs(positions, 3.0, UnitCell()))
+
+        pairs, distances = neighbor_pairs(np.zeros((0, 3)), 3.0)
+        self.assertEqual(pairs.shape, (0, 2))
+
+        with self.assertRaises(ChemfilesError):
+            neighbor_pairs(positions, 7.0, UnitCell(12, 12, 12))
+
+
+class TestBondGuesser(unittest.TestCase):
+    def test_guess(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        frame.add_atom(Atom("O"), (0, 0, 0))
+        frame.add_atom(Atom("H"), (1.2, 0, 0))
+        frame.add_atom(Atom("H"), (0, 0.96, 0))
+        # bonded to the oxygen through periodic boundary conditions
+        frame.add_atom(Atom("H"), (9.0, 0, 0))
+        frame.add_atom(Atom("Zn"), (5, 5, 5))
+
+        guesser = BondGuesser()
+        bonds = guesser.guess(frame)
+        self.assertEqual(bonds.tolist(), [[0, 1], [0, 2], [0, 3]])
+
+        # small moves only re-check pairs close to their threshold
+        frame.positions[1] = (1.6, 0, 0)
+        frame.positions[3] = (9.1, 0, 0)
+        bonds = guesser.guess(frame)
+        self.assertEqual(bonds.tolist(), [[0, 2], [0, 3]])
+
+        # large moves rebuild the candidate pairs
+        frame.positions[4] = (1.0, 1.0, 1.0)
+        bonds = guesser.guess(frame)
+        self.assertEqual(bonds.tolist(), [[0, 2], [0, 3], [0, 4], [1, 4], [2, 4]])
+
+    def test_small_cell(self):
+        # the cell is too small for a cell list with the candidates cutoff
+        frame = Frame()
+        frame.cell = UnitCell(4, 4, 4)
+        frame.add_atom(Atom("O"), (0, 0, 0))
+        frame.add_atom(Atom("H"), (0.96, 0, 0))
+        frame.add_atom(Atom("H"), (3.5, 0, 0))
+
+        guesser = BondGuesser()
+        self.assertEqual(guesser.guess(frame).tolist(), [[0, 1], [0, 2]])
+
+        frame.positions[1] = (1.6, 0, 0)
+        self.assertEqual(guesser.guess(frame).tolist(), [[0, 2]])
+
+    def test_reuse(self):
+        frame = Frame()
+        frame.add_atom(Atom("O"), (0, 0, 0))
+        frame.add_atom(Atom("H"), (0.96, 0, 0))
+
+        guesser = BondGuesser(reuse_threshold=0.7)
+        self.assertEqual(guesser.guess(frame).tolist(), [[0, 1]])
+
+        # the previous bonds are re-used for small displacements
+        frame.positions[1] = (1.6, 0, 0)
+        self.assertEqual(guesser.guess(frame).tolist(), [[0, 1]])
+
+        frame.positions[1] = (2.0, 0, 0)
+        self.assertEqual(guesser.guess(frame).tolist(), [])
+
+        guesser.reset()
+        frame.positions[1] = (0.96, 0, 0)
+        self.assertEqual(guesser.guess(frame).tolist(), [[0, 1]])
+
+    def test_apply(self):
+        frame = Frame()
+        frame.add_atom(Atom("O"), (0, 0, 0))
+        frame.add_atom(Atom("H"), (0.96, 0, 0))
+        frame.add_atom(Atom("H"), (4.0, 0, 0))
+        frame.add_bond(1, 2)
+
+        BondGuesser().apply(frame)
+        self.assertEqual(frame.topology.bonds.tolist(), [[0, 1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
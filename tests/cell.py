@@ -2,6 +2,8 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import unittest
 import copy
+import pickle
+import numpy as np
 
 from chemfiles import UnitCell, CellShape
 from chemfiles import ChemfilesError
@@ -24,6 +26,18 @@ class TestUnitCell(unittest.TestCase):
         self.assertEqual(cell.lengths, (10.0, 11.0, 12.0))
         self.assertEqual(cloned.lengths, (3.0, 4.0, 5.0))
 
+    def test_pickle(self):
+        cell = UnitCell(3, 4, 5, 80, 90, 120)
+        cloned = pickle.loads(pickle.dumps(cell))
+        self.assertEqual(cloned.lengths, (3.0, 4.0, 5.0))
+        self.assertEqual(cloned.angles, (80.0, 90.0, 120.0))
+        self.assertEqual(cloned.shape, CellShape.Triclinic)
+
+        cell = UnitCell(3, 4, 5)
+        cell.shape = CellShape.Triclinic
+        cloned = pickle.loads(pickle.dumps(cell))
+        self.assertEqual(cloned.shape, CellShape.Triclinic)
+
     def test_lengths(self):
         cell = UnitCell(3, 4, 5)
         self.assertEqual(cell.lengths, (3.0, 4.0, 5.0))
@@ -73,6 +87,30 @@ class TestUnitCell(unittest.TestCase):
         self.assertEqual(wrapped[1], 1.0)
         self.assertEqual(wrapped[2], -0.5)
 
+    def test_wrap_positions(self):
+        cell = UnitCell(3, 4, 5)
+        positions = np.array([[1, 5, -5.5], [0, 0, 0], [7, -3, 2.6]])
+        self.assertIs(cell.wrap_positions(positions), positions)
+        self.assertTrue(np.allclose(positions, [[1, 1, -0.5], [0, 0, 0], [1, 1, -2.4]]))
+
+        cell = UnitCell(3, 4, 5, 80, 90, 110)
+        positions = np.random.RandomState(7).uniform(-20, 20, (4, 5, 3))
+        expected = [[cell.wrap(v) for v in row] for row in positions]
+        cell.wrap_positions(positions)
+        self.assertTrue(np.allclose(positions, expected))
+
+        cell = UnitCell(0, 0, 0)
+        self.assertEqual(cell.shape, CellShape.Infinite)
+        positions = np.array([[100.0, 200.0, 300.0]])
+        cell.wrap_positions(positions)
+        self.assertEqual(positions.tolist(), [[100.0, 200.0, 300.0]])
+
+        with self.assertRaises(ChemfilesError):
+            cell.wrap_positions([[1, 2, 3]])
+
+        with self.assertRaises(ChemfilesError):
+            cell.wrap_positions(np.zeros((3, 2)))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+
+from chemfiles import Frame, Atom, Residue, UnitCell, ContactMap, ChemfilesError
+
+
+def create_frame():
+    frame = Frame()
+    frame.cell = UnitCell(20, 20, 20)
+    positions = [(0, 0, 0), (1, 0, 0), (3, 0, 0), (4, 0, 0), (19, 0, 0), (10, 10, 10)]
+    for position in positions:
+        frame.add_atom(Atom("C"), position)
+
+    for i, atoms in enumerate([(0, 1), (2, 3), (4,)]):
+        residue = Residue("R{}".format(i), i + 1)
+        for atom in atoms:
+            residue.atoms.append(atom)
+        frame.add_residue(residue)
+    return frame
+
+
+class TestContactMap(unittest.TestCase):
+    def test_atoms(self):
+        frame = create_frame()
+        contacts = ContactMap(2.5)
+        pairs, distances = contacts.compute(frame)
+        self.assertEqual(pairs.tolist(), [[0, 1], [0, 4], [1, 2], [1, 4], [2, 3]])
+        self.assertTrue(np.allclose(distances, [1, 1, 2, 2, 1]))
+
+        contacts = ContactMap(2.5, selection=[0, 2, 3, 4])
+        pairs, _ = contacts.compute(frame)
+        self.assertEqual(pairs.tolist(), [[0, 4], [2, 3]])
+
+    def test_residues(self):
+        frame = create_frame()
+        contacts = ContactMap(2.5, residues=True)
+        pairs, distances = contacts.compute(frame)
+        self.assertEqual(pairs.tolist(), [[0, 1], [0, 2]])
+        self.assertTrue(np.allclose(distances, [2, 1]))
+
+    def test_frequencies(self):
+        frame = create_frame()
+        contacts = ContactMap(2.5, residues=True)
+        with self.assertRaises(ChemfilesError):
+            contacts.frequencies()
+
+        contacts.add(frame)
+        frame.positions[2] = (3.5, 0, 0)
+        pairs, _ = contacts.add(frame)
+        self.assertEqual(pairs.tolist(), [[0, 2]])
+        self.assertEqual(contacts.nframes, 2)
+
+        pairs, frequencies = contacts.frequencies()
+        self.assertEqual(pairs.tolist(), [[0, 1], [0, 2]])
+        self.assertEqual(frequencies.tolist(), [0.5, 1.0])
+
+        matrix = contacts.frequency_matrix()
+        self.assertEqual(matrix.shape, (3, 3))
+        self.assertEqual(matrix[1, 0], 0.5)
+        self.assertEqual(matrix[2, 0], 1.0)
+
+        contacts.reset()
+        self.assertEqual(contacts.nframes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
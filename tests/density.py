@@ -0,0 +1,89 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+import os
+
+from chemfiles import Trajectory, Frame, Atom, UnitCell, DensityGrid, density_grid
+from chemfiles import ChemfilesError
+
+
+def get_data_path(data):
+    root = os.path.dirname(__file__)
+    return os.path.join(root, "data", data)
+
+
+class TestDensityGrid(unittest.TestCase):
+    def test_add(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        frame.add_atom(Atom("O"), (1, 1, 1))
+        frame.add_atom(Atom("O"), (6, 1, 1))
+        # wrapped inside the cell
+        frame.add_atom(Atom("O"), (-4, 1, 11))
+        frame.add_atom(Atom("H"), (1, 6, 6))
+
+        grid = DensityGrid(2, "name O")
+        grid.add(frame)
+        self.assertEqual(grid.bins, (2, 2, 2))
+        self.assertEqual(grid.counts[0, 0, 0], 1)
+        self.assertEqual(grid.counts[1, 0, 0], 2)
+        self.assertEqual(grid.counts.sum(), 3)
+
+        density = grid.density()
+        self.assertAlmostEqual(density[1, 0, 0], 2 / 125.0)
+
+        other = DensityGrid((2, 2, 2), [3])
+        other.add(frame)
+        grid.merge(other)
+        self.assertEqual(grid.nframes, 2)
+        self.assertEqual(grid.counts[0, 1, 1], 1)
+
+        with self.assertRaises(ChemfilesError):
+            grid.merge(DensityGrid((2, 2, 3)))
+
+        with self.assertRaises(ChemfilesError):
+            DensityGrid(2).add(Frame())
+
+    def test_cube(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        frame.add_atom(Atom("O"), (1, 1, 1))
+        grid = DensityGrid((2, 3, 7))
+        grid.add(frame)
+        grid.write_cube("test-tmp.cube", frame)
+
+        with open("test-tmp.cube") as fd:
+            lines = fd.readlines()
+        os.unlink("test-tmp.cube")
+
+        self.assertEqual(lines[2].split()[0], "1")
+        self.assertEqual(lines[3].split()[0], "2")
+        self.assertEqual(lines[5].split()[0], "7")
+        self.assertEqual(lines[6].split()[0], "8")
+        # 2 * 3 rows of 7 values, using two lines each
+        self.assertEqual(len(lines), 7 + 2 * 3 * 2)
+        values = np.array(" ".join(lines[7:]).split(), dtype=np.float64)
+        self.assertAlmostEqual(values[0], 42 / 1000.0)
+        self.assertEqual(np.count_nonzero(values), 1)
+
+    def test_trajectory(self):
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            trajectory.set_cell(UnitCell(30, 30, 30))
+            steps = range(0, 100, 10)
+            grid = density_grid(trajectory, 5, "name O", steps, processes=1)
+            self.assertEqual(grid.nframes, 10)
+            self.assertEqual(grid.counts.sum(), 99 * 10)
+
+            other = density_grid(trajectory, 5, "name O", steps, processes=2)
+            self.assertTrue(np.array_equal(grid.counts, other.counts))
+
+            # all the steps, with workers reading the file concurrently
+            serial = density_grid(trajectory, 5, "name O", processes=1)
+            parallel = density_grid(trajectory, 5, "name O", processes=4)
+            self.assertEqual(parallel.nframes, 100)
+            self.assertTrue(np.array_equal(serial.counts, parallel.counts))
+
+
+if __name__ == "__main__":
+    unittest.main()
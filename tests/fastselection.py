@@ -0,0 +1,89 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+
+from chemfiles import Frame, Atom, Residue, Selection
+from chemfiles.fastselection import _compile, _AtomColumns, _Unsupported
+
+
+def testing_frame():
+    frame = Frame()
+    frame.add_atom(Atom("O"), [0, 0, 0])
+    frame.add_atom(Atom("H"), [1, 0, 0])
+    frame.add_atom(Atom("H"), [0, 1, 0])
+    frame.add_atom(Atom("CA", "C"), [5, 0, 0])
+    frame.add_atom(Atom("N"), [6, 0, 0])
+
+    residue = Residue("WAT", 1)
+    for i in range(3):
+        residue.atoms.append(i)
+    frame.add_residue(residue)
+
+    residue = Residue("ALA", 2)
+    for i in range(3, 5):
+        residue.atoms.append(i)
+    frame.add_residue(residue)
+    return frame
+
+
+class TestFastSelection(unittest.TestCase):
+    def test_supported(self):
+        frame = testing_frame()
+        columns = _AtomColumns(frame)
+        for string in [
+            "name H",
+            "atoms: name(#1) == H",
+            "not name H and mass > 10",
+            "resname ALA or index < 1",
+            "resid 1 and (type O or name H)",
+            "x >= 5 and y < 1",
+            'name "CA"',
+            "all",
+            "none",
+        ]:
+            compiled = _compile(string)
+            self.assertIsNotNone(compiled, string)
+            expected = Selection(string).evaluate(frame)
+            self.assertEqual(np.nonzero(compiled(columns))[0].tolist(), expected, string)
+
+    def test_unsupported(self):
+        for string in [
+            "pairs: name(#1) H",
+            "name H O",
+            "distance(#1, #2) < 3",
+            "name < H",
+            "x + 1 < 3",
+            "is_bonded(#1, #2)",
+            "(name H",
+        ]:
+            self.assertIsNone(_compile(string), string)
+
+    def test_missing_residues(self):
+        frame = testing_frame()
+        frame.add_atom(Atom("Zn"), [0, 0, 0])
+        columns = _AtomColumns(frame)
+        self.assertEqual(np.nonzero(_compile("name Zn")(columns))[0].tolist(), [5])
+        with self.assertRaises(_Unsupported):
+            _compile("resname WAT")(columns)
+
+    def test_residue_without_id(self):
+        frame = Frame()
+        frame.add_atom(Atom("O"), [0, 0, 0])
+        frame.add_atom(Atom("N"), [1, 0, 0])
+        residue = Residue("WAT")
+        residue.atoms.append(0)
+        frame.add_residue(residue)
+        residue = Residue("ALA", 2)
+        residue.atoms.append(1)
+        frame.add_residue(residue)
+
+        columns = _AtomColumns(frame)
+        expected = Selection("resname WAT").evaluate(frame)
+        self.assertEqual(np.nonzero(_compile("resname WAT")(columns))[0].tolist(), expected)
+        with self.assertRaises(_Unsupported):
+            _compile("resid 2")(columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
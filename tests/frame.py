@@ -2,6 +2,7 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import unittest
 import copy
+import pickle
 import math
 import numpy as np
 
@@ -30,6 +31,45 @@ class TestFrame(unittest.TestCase):
         self.assertEqual(len(frame.atoms), 6)
         self.assertEqual(len(cloned.atoms), 0)
 
+    def test_pickle(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 11, 12)
+        frame.step = 42
+        frame["name"] = "test"
+        frame.add_atom(Atom("O"), (1, 2, 3))
+        frame.add_atom(Atom("H"), (4, 5, 6))
+        frame.add_bond(0, 1)
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            cloned = pickle.loads(pickle.dumps(frame, protocol=protocol))
+            self.assertEqual(cloned.positions.tolist(), [[1, 2, 3], [4, 5, 6]])
+            self.assertFalse(cloned.has_velocities())
+            self.assertEqual(cloned.cell.lengths, (10, 11, 12))
+            self.assertEqual(cloned.step, 42)
+            self.assertEqual(cloned["name"], "test")
+            self.assertEqual([atom.name for atom in cloned.atoms], ["O", "H"])
+            self.assertEqual(cloned.topology.bonds.tolist(), [[0, 1]])
+
+        frame.add_velocities()
+        frame.velocities[1] = (7, 8, 9)
+        cloned = copy.deepcopy(frame)
+        self.assertEqual(cloned.velocities.tolist(), [[0, 0, 0], [7, 8, 9]])
+
+        if pickle.HIGHEST_PROTOCOL >= 5:
+            buffers = []
+            data = pickle.dumps(frame, protocol=5, buffer_callback=buffers.append)
+            # positions and velocities are sent out-of-band
+            raw_buffers = [bytes(buffer.raw()) for buffer in buffers]
+            self.assertIn(frame.positions.tobytes(), raw_buffers)
+            self.assertIn(frame.velocities.tobytes(), raw_buffers)
+            cloned = pickle.loads(data, buffers=buffers)
+            self.assertEqual(cloned.positions.tolist(), [[1, 2, 3], [4, 5, 6]])
+            self.assertEqual(cloned.velocities.tolist(), [[0, 0, 0], [7, 8, 9]])
+
+        # Empty frames
+        cloned = pickle.loads(pickle.dumps(Frame()))
+        self.assertEqual(len(cloned.atoms), 0)
+
     def test_atoms_count(self):
         frame = Frame()
         self.assertEqual(len(frame.atoms), 0)
@@ -91,6 +131,35 @@ class TestFrame(unittest.TestCase):
         frame.add_velocities()
         _ = frame.velocities
 
+    def test_arrays_views(self):
+        frame = Frame()
+        frame.resize(2)
+        frame.add_velocities()
+
+        positions = frame.positions_view()
+        velocities = frame.velocities_view()
+        self.assertEqual(positions.shape, (2, 3))
+        self.assertEqual(len(velocities), 2)
+
+        positions[1] = (1, 2, 3)
+        velocities[1, 2] = 42
+        self.assertEqual(frame.positions[1].tolist(), [1, 2, 3])
+        self.assertEqual(frame.velocities[1, 2], 42)
+
+        # the views stay valid after the frame is resized
+        frame.resize(1000)
+        self.assertEqual(positions.shape, (1000, 3))
+        self.assertEqual(positions[1].tolist(), [1, 2, 3])
+        self.assertEqual(velocities[1, 2], 42)
+
+        frame.add_atom(Atom("F"), (3, 4, 5))
+        self.assertEqual(len(positions), 1001)
+        self.assertEqual(positions[1000].tolist(), [3, 4, 5])
+
+        frame.remove(0)
+        self.assertEqual(np.asarray(positions).shape, (1000, 3))
+        self.assertEqual(positions.array[0].tolist(), [1, 2, 3])
+
     def test_cell(self):
         frame = Frame()
         frame.cell = UnitCell(1, 2, 4)
@@ -113,6 +182,20 @@ class TestFrame(unittest.TestCase):
         self.assertEqual(frame.atoms[0].name, "Zn")
         self.assertEqual(frame.atoms[1].name, "Ar")
 
+    def test_atoms_table(self):
+        frame = Frame()
+        frame.add_atom(Atom("Zn"), (0, 0, 0))
+        frame.add_atom(Atom("Ar"), (0, 0, 0))
+
+        table = frame.atoms.table(["names", "types", "charges"])
+        self.assertEqual(table.names.tolist(), ["Zn", "Ar"])
+        self.assertEqual(table.types.tolist(), ["Zn", "Ar"])
+        self.assertEqual(table.masses, None)
+
+        frame.atoms.set_table(charges=[2, 0])
+        self.assertEqual(frame.atoms[0].charge, 2)
+        self.assertEqual(frame.topology.atoms.table().charges.tolist(), [2, 0])
+
     def test_step(self):
         frame = Frame()
         self.assertEqual(frame.step, 0)
@@ -201,6 +284,160 @@ class TestFrame(unittest.TestCase):
 
         self.assertEqual(frame.out_of_plane(1, 3, 0, 2), 3.0)
 
+    def test_wrap_unwrap(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        frame.add_atom(Atom("C"), (0, 0, 4))
+        frame.add_atom(Atom("O"), (12, 0, -6))
+
+        reference = frame.positions.copy()
+        frame.wrap()
+        self.assertTrue(np.allclose(frame.positions, [[0, 0, 4], [2, 0, 4]]))
+
+        frame.positions[0, 2] = 5.5
+        frame.wrap()
+        self.assertTrue(np.allclose(frame.positions, [[0, 0, -4.5], [2, 0, 4]]))
+
+        frame.unwrap(reference)
+        self.assertTrue(np.allclose(frame.positions, [[0, 0, 5.5], [12, 0, -6]]))
+
+        previous = Frame()
+        previous.resize(2)
+        previous.positions[:] = [[0, 0, 0], [20, 0, 0]]
+        frame.unwrap(previous)
+        self.assertTrue(np.allclose(frame.positions, [[0, 0, -4.5], [22, 0, 4]]))
+
+        with self.assertRaises(ChemfilesError):
+            frame.unwrap(np.zeros((3, 3)))
+
+    def test_make_whole(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        # a linear molecule crossing the cell boundary
+        for x in [8, 9, 0, 1, 2]:
+            frame.add_atom(Atom("C"), (x, 5, 5))
+        # a triangle crossing the cell boundary in two directions
+        for position in [(5, 9.5, 9.5), (5, 0.5, 9.5), (5, 9.5, 0.5)]:
+            frame.add_atom(Atom("O"), position)
+        # an isolated atom
+        frame.add_atom(Atom("Zn"), (3, 3, 3))
+
+        for i in range(4):
+            frame.add_bond(i, i + 1)
+        frame.add_bond(5, 6)
+        frame.add_bond(6, 7)
+        frame.add_bond(7, 5)
+
+        frame.make_whole()
+        expected = [
+            [8, 5, 5], [9, 5, 5], [10, 5, 5], [11, 5, 5], [12, 5, 5],
+            [5, 9.5, 9.5], [5, 10.5, 9.5], [5, 9.5, 10.5],
+            [3, 3, 3],
+        ]
+        self.assertTrue(np.allclose(frame.positions, expected))
+
+        # frames without bonds are left untouched
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        frame.add_atom(Atom("C"), (18, 5, 5))
+        frame.make_whole()
+        self.assertEqual(frame.positions.tolist(), [[18, 5, 5]])
+
+    def test_mass_weighted_geometry(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        frame.add_atom(Atom("C"), (0, 0, 0))
+        frame.add_atom(Atom("O"), (0, 0, 2))
+        frame.add_atom(Atom("H"), (0, 0, 9))
+
+        mC = frame.atoms[0].mass
+        mO = frame.atoms[1].mass
+        expected = mO * 2.0 / (mC + mO)
+
+        com = frame.center_of_mass("name C or name O")
+        self.assertTrue(np.allclose(com, [0, 0, expected]))
+        com = frame.center_of_mass([0, 1], masses=[1, 1])
+        self.assertTrue(np.allclose(com, [0, 0, 1]))
+
+        # periodic boundary conditions
+        com = frame.center_of_mass([0, 2], masses=[1, 1])
+        self.assertTrue(np.allclose(com, [0, 0, 4.5]))
+        com = frame.center_of_mass([0, 2], masses=[1, 1], pbc=True)
+        self.assertTrue(np.allclose(com, [0, 0, -0.5]))
+
+        rg = frame.radius_of_gyration([0, 1], masses=[1, 1])
+        self.assertAlmostEqual(rg, 1.0)
+        rg = frame.radius_of_gyration([0, 2], masses=[1, 1], pbc=True)
+        self.assertAlmostEqual(rg, 0.5)
+
+        tensor = frame.inertia_tensor([0, 1], masses=[1, 1])
+        self.assertTrue(np.allclose(tensor, np.diag([2, 2, 0])))
+
+        moments, axes = frame.principal_axes([0, 1], masses=[1, 1])
+        self.assertTrue(np.allclose(moments, [0, 2, 2]))
+        self.assertTrue(np.allclose(np.abs(axes[0]), [0, 0, 1]))
+
+        with self.assertRaises(ChemfilesError):
+            frame.center_of_mass([])
+
+        with self.assertRaises(ChemfilesError):
+            frame.center_of_mass([0, 1], masses=[1])
+
+        with self.assertRaises(ChemfilesError):
+            frame.center_of_mass("pairs: all")
+
+    def test_mass_weighted_geometry_bonded_pbc(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        # a chain longer than half of the cell, crossing the cell boundary
+        for i in range(8):
+            frame.add_atom(Atom("C"), ((6 + 1.5 * i) % 10, 5, 5))
+        for i in range(7):
+            frame.add_bond(i, i + 1)
+        # an atom without bonds, close to the chain through the boundary
+        frame.add_atom(Atom("C"), (9.5, 5, 5))
+        wrapped = frame.positions.copy()
+
+        masses = np.ones(8)
+        com = frame.center_of_mass("index < 8", masses=masses, pbc=True)
+        self.assertTrue(np.allclose(com, [11.25, 5, 5]))
+        rg = frame.radius_of_gyration("index < 8", masses=masses, pbc=True)
+        self.assertAlmostEqual(rg, np.sqrt(1.5 ** 2 * 63 / 12))
+        self.assertTrue(np.array_equal(frame.positions, wrapped))
+
+        # the unbonded atom uses the minimum image of the first selected atom
+        com = frame.center_of_mass([3, 8], masses=[1, 1], pbc=True)
+        self.assertTrue(np.allclose(com, [0, 5, 5]))
+
+    def test_align_to(self):
+        reference = Frame()
+        for position in [(0, 0, 0), (1, 0, 0), (0, 2, 0), (0, 0, 3)]:
+            reference.add_atom(Atom("C"), position)
+        reference.add_atom(Atom("H"), (5, 5, 5))
+
+        frame = copy.copy(reference)
+        # rotation of 90° around z, and translation
+        rotation = np.array([[0, -1, 0], [1, 0, 0], [0, 0, 1]])
+        frame.positions[:] = np.dot(reference.positions, rotation.T) + (3, 4, 5)
+        frame.positions[4] += (0.5, 0, 0)
+
+        rmsd = frame.align_to(reference, "name C")
+        self.assertAlmostEqual(rmsd, 0.0)
+        self.assertTrue(np.allclose(frame.positions[:4], reference.positions[:4]))
+        self.assertTrue(np.allclose(frame.positions[4], (5, 4.5, 5)))
+
+        rmsd = frame.align_to(reference, [0, 1, 2, 3], measure=[4])
+        self.assertAlmostEqual(rmsd, 0.5)
+
+        rmsd = frame.align_to(reference.positions, "name C", mass_weighted=True)
+        self.assertAlmostEqual(rmsd, 0.0)
+
+        with self.assertRaises(ChemfilesError):
+            frame.align_to(reference, [])
+
+        with self.assertRaises(ChemfilesError):
+            frame.align_to(reference.positions[:3])
+
     def test_bonds(self):
         frame = Frame()
         frame.add_atom(Atom(""), (0, 0, 0))
@@ -231,6 +468,26 @@ class TestFrame(unittest.TestCase):
             frame.topology.bonds.all(), np.array([[0, 1], [1, 2]]).all()
         )
 
+    def test_bulk_bonds(self):
+        frame = Frame()
+        frame.resize(5)
+        frame.add_bond(0, 1)
+
+        frame.add_bonds(np.array([[2, 1], [3, 4], [0, 1], [4, 3]]))
+        self.assertEqual(frame.topology.bonds.tolist(), [[0, 1], [1, 2], [3, 4]])
+
+        frame.add_bonds([[0, 4]], [BondOrder.Double])
+        self.assertEqual(frame.topology.bonds_order(0, 4), BondOrder.Double)
+
+        frame.remove_bonds([[4, 3], [1, 0], [2, 4]])
+        self.assertEqual(frame.topology.bonds.tolist(), [[0, 4], [1, 2]])
+
+        with self.assertRaises(ChemfilesError):
+            frame.add_bonds([[0, 5]])
+        with self.assertRaises(ChemfilesError):
+            frame.add_bonds([[0, 1], [2, 2]])
+        self.assertEqual(frame.topology.bonds_count(), 2)
+
     def test_residues(self):
         frame = Frame()
         frame.add_residue(Residue("Foo"))
@@ -240,6 +497,49 @@ class TestFrame(unittest.TestCase):
         self.assertEqual(len(frame.topology.residues), 3)
         self.assertEqual(frame.topology.residues[0].name, "Foo")
 
+    def test_subset(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 10, 10)
+        frame.step = 3
+        frame["name"] = "water"
+        frame.add_velocities()
+        for i, name in enumerate(["O", "H", "H", "O", "H", "H"]):
+            frame.add_atom(Atom(name), (i, 0, 0), (0, i, 0))
+
+        frame.add_bond(0, 1)
+        frame.add_bond(0, 2, BondOrder.Single)
+        frame.add_bond(3, 4)
+        frame.add_bond(3, 5)
+
+        residue = Residue("WAT", 1)
+        for i in range(3):
+            residue.atoms.append(i)
+        frame.add_residue(residue)
+
+        subset = frame.subset([2, 0, 3])
+        self.assertEqual(len(subset.atoms), 3)
+        self.assertEqual([atom.name for atom in subset.atoms], ["H", "O", "O"])
+        self.assertEqual(subset.positions.tolist(), [[2, 0, 0], [0, 0, 0], [3, 0, 0]])
+        self.assertEqual(subset.velocities.tolist(), [[0, 2, 0], [0, 0, 0], [0, 3, 0]])
+        self.assertEqual(subset.cell.lengths, (10, 10, 10))
+        self.assertEqual(subset.step, 3)
+        self.assertEqual(subset["name"], "water")
+
+        self.assertEqual(subset.topology.bonds.tolist(), [[0, 1]])
+        self.assertEqual(subset.topology.bonds_orders, [BondOrder.Single])
+
+        self.assertEqual(len(subset.topology.residues), 1)
+        residue = subset.topology.residues[0]
+        self.assertEqual(residue.name, "WAT")
+        self.assertEqual(residue.id, 1)
+        self.assertEqual(list(residue.atoms), [0, 1])
+
+        with self.assertRaises(IndexError):
+            frame.subset([0, 8])
+
+        with self.assertRaises(ChemfilesError):
+            frame.subset([0, 0])
+
 
 if __name__ == "__main__":
     unittest.main()
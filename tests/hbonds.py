@@ -0,0 +1,72 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+
+from chemfiles import Frame, Atom, UnitCell, HydrogenBonds, ChemfilesError
+
+
+def create_frame():
+    # two water molecules, with an hydrogen bond between the first hydrogen
+    # of the second molecule and the first oxygen
+    frame = Frame()
+    frame.cell = UnitCell(20, 20, 20)
+    frame.add_atom(Atom("O"), (0, 0, 0))
+    frame.add_atom(Atom("H"), (-0.6, 0.75, 0))
+    frame.add_atom(Atom("H"), (-0.6, -0.75, 0))
+    frame.add_atom(Atom("O"), (2.9, 0, 0))
+    frame.add_atom(Atom("H"), (1.95, 0, 0))
+    frame.add_atom(Atom("H"), (3.2, 0.9, 0))
+    frame.add_bond(0, 1)
+    frame.add_bond(0, 2)
+    frame.add_bond(3, 4)
+    frame.add_bond(3, 5)
+    return frame
+
+
+class TestHydrogenBonds(unittest.TestCase):
+    def test_compute(self):
+        frame = create_frame()
+        hbonds = HydrogenBonds()
+        triplets, distances, angles = hbonds.compute(frame)
+        self.assertEqual(triplets.tolist(), [[3, 4, 0]])
+        self.assertTrue(np.allclose(distances, [2.9]))
+        self.assertTrue(np.allclose(angles, [180]))
+
+        # no acceptors
+        hbonds = HydrogenBonds(acceptors=[])
+        triplets, _, _ = hbonds.compute(frame)
+        self.assertEqual(triplets.shape, (0, 3))
+
+        # only the first molecule can donate hydrogen bonds
+        hbonds = HydrogenBonds(donors="index == 0")
+        triplets, _, _ = hbonds.compute(frame)
+        self.assertEqual(triplets.shape, (0, 3))
+
+    def test_statistics(self):
+        frame = create_frame()
+        hbonds = HydrogenBonds()
+        with self.assertRaises(ChemfilesError):
+            hbonds.frequencies()
+
+        hbonds.add(frame)
+        hbonds.add(frame)
+        # break the hydrogen bond
+        frame.positions[3] = (3.5, 0, 0)
+        triplets, _, _ = hbonds.add(frame)
+        self.assertEqual(triplets.shape, (0, 3))
+        frame.positions[3] = (2.9, 0, 0)
+        hbonds.add(frame)
+        self.assertEqual(hbonds.nframes, 4)
+
+        triplets, frequencies = hbonds.frequencies()
+        self.assertEqual(triplets.tolist(), [[3, 4, 0]])
+        self.assertEqual(frequencies.tolist(), [0.75])
+
+        triplets, lifetimes = hbonds.lifetimes()
+        self.assertEqual(triplets.tolist(), [[3, 4, 0], [3, 4, 0]])
+        self.assertEqual(lifetimes.tolist(), [2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
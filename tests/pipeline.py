@@ -0,0 +1,64 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+import os
+
+from chemfiles import Trajectory, Selection, extract_selection
+from chemfiles import ChemfilesError
+
+
+def get_data_path(data):
+    root = os.path.dirname(__file__)
+    return os.path.join(root, "data", data)
+
+
+class TestExtractSelection(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists("test-tmp.xyz"):
+            os.unlink("test-tmp.xyz")
+
+    def check_output(self, steps, selection):
+        with Trajectory(get_data_path("water.xyz")) as input:
+            with Trajectory("test-tmp.xyz") as output:
+                self.assertEqual(output.nsteps, len(steps))
+                for i, step in enumerate(steps):
+                    frame = input.read_step(step)
+                    expected = frame.subset(Selection(selection).evaluate(frame))
+                    extracted = output.read_step(i)
+                    self.assertEqual(len(extracted.atoms), len(expected.atoms))
+                    self.assertEqual(
+                        [atom.name for atom in extracted.atoms],
+                        [atom.name for atom in expected.atoms],
+                    )
+                    self.assertTrue(np.allclose(extracted.positions, expected.positions, atol=1e-4))
+
+    def test_extract(self):
+        for threads in [True, False]:
+            with Trajectory(get_data_path("water.xyz")) as input:
+                with Trajectory("test-tmp.xyz", "w") as output:
+                    count = extract_selection(
+                        input, output, "name O", stride=10, static_topology=True, threads=threads
+                    )
+            self.assertEqual(count, 10)
+            self.check_output(range(0, 100, 10), "name O")
+
+    def test_geometric(self):
+        with Trajectory(get_data_path("water.xyz")) as input:
+            with Trajectory("test-tmp.xyz", "w") as output:
+                selection = Selection("x < 10")
+                count = extract_selection(input, output, selection, steps=[3, 5, 7, 9], stride=2)
+        self.assertEqual(count, 2)
+        self.check_output([3, 7], "x < 10")
+
+    def test_errors(self):
+        with Trajectory(get_data_path("water.xyz")) as input:
+            with Trajectory("test-tmp.xyz", "w") as output:
+                with self.assertRaises(ChemfilesError):
+                    extract_selection(input, output, "pairs: all")
+                with self.assertRaises(ChemfilesError):
+                    extract_selection(input, output, "name O", stride=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
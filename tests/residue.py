@@ -2,6 +2,7 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import unittest
 import copy
+import pickle
 import numpy as np
 
 from chemfiles import Residue, ChemfilesError
@@ -21,6 +22,18 @@ class TestResidue(unittest.TestCase):
         residue = Residue("ARG", 34)
         self.assertEqual(residue.__repr__(), "Residue('ARG') with 0 atoms")
 
+    def test_pickle(self):
+        residue = Residue("ARG", 34)
+        residue.atoms.append(3)
+        residue.atoms.append(4)
+        residue["chain"] = "A"
+
+        cloned = pickle.loads(pickle.dumps(residue))
+        self.assertEqual(cloned.name, "ARG")
+        self.assertEqual(cloned.id, 34)
+        self.assertEqual(list(cloned.atoms), [3, 4])
+        self.assertEqual(cloned["chain"], "A")
+
     def test_copy(self):
         residue = Residue("bar")
         residue.atoms.append(7)
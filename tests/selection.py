@@ -1,9 +1,19 @@
 # -*- coding=utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 import unittest
+import threading
 import copy
+import os
+import pickle
+import numpy as np
 
-from chemfiles import Selection, Topology, Frame, Atom
+from chemfiles import Selection, Topology, Frame, Atom, Trajectory, ChemfilesError
+from chemfiles import SelectionSet, SelectionMatches, evaluate_selections
+
+
+def get_data_path(data):
+    root = os.path.dirname(__file__)
+    return os.path.join(root, "data", data)
 
 
 def testing_frame():
@@ -63,6 +73,201 @@ class TestSelection(unittest.TestCase):
 
         self.assertEqual([(0, 1, 2, 3)], res)
 
+    def test_evaluate_array(self):
+        frame = testing_frame()
+
+        res = Selection("name H").evaluate_array(frame)
+        self.assertEqual(res.dtype, np.uint64)
+        self.assertEqual(res.shape, (2,))
+        self.assertEqual(res.tolist(), [0, 3])
+
+        res = Selection("name Zn").evaluate_array(frame)
+        self.assertEqual(res.shape, (0,))
+
+        res = Selection("bonds: all").evaluate_array(frame)
+        self.assertEqual(res.shape, (3, 2))
+        self.assertTrue(res.flags["C_CONTIGUOUS"])
+        self.assertEqual(sorted(map(tuple, res.tolist())), [(0, 1), (1, 2), (2, 3)])
+
+        res = Selection("dihedrals: all").evaluate_array(frame)
+        self.assertEqual(res.tolist(), [[0, 1, 2, 3]])
+
+    def test_evaluate_mask(self):
+        frame = testing_frame()
+
+        mask = Selection("name O").evaluate_mask(frame)
+        self.assertEqual(mask.dtype, bool)
+        self.assertEqual(mask.tolist(), [False, True, True, False])
+
+        with self.assertRaises(ChemfilesError):
+            Selection("bonds: all").evaluate_mask(frame)
+
+    def test_is_topological(self):
+        self.assertTrue(Selection("name O").is_topological)
+        self.assertTrue(Selection("resname WAT and index < 1000").is_topological)
+        self.assertTrue(Selection("angles: all").is_topological)
+        self.assertTrue(Selection('name "x"').is_topological)
+        self.assertFalse(Selection("x < 3").is_topological)
+        self.assertFalse(Selection("pairs: distance(#1, #2) < 3").is_topological)
+
+    def test_evaluate_trajectory(self):
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            selection = Selection("name O")
+            results = list(selection.evaluate_trajectory(trajectory, range(3)))
+            self.assertEqual(len(results), 3)
+            for frame, matches in results:
+                self.assertEqual(matches.tolist(), selection.evaluate(frame))
+            # the topology comes from the file, the selection is evaluated again
+            self.assertIsNot(results[0][1], results[1][1])
+
+            results = list(selection.evaluate_trajectory(trajectory, range(3), static_topology=True))
+            self.assertIs(results[0][1], results[2][1])
+            self.assertFalse(results[0][1].flags.writeable)
+
+            selection = Selection("x < 5")
+            results = list(selection.evaluate_trajectory(trajectory, [0, 50], static_topology=True))
+            for frame, matches in results:
+                self.assertEqual(matches.tolist(), selection.evaluate(frame))
+
+            trajectory.set_topology(get_data_path("topology.xyz"), "XYZ")
+            selection = Selection("name Rd")
+            results = list(selection.evaluate_trajectory(trajectory, range(3)))
+            self.assertIs(results[0][1], results[2][1])
+            self.assertEqual(len(results[1][1]), 297)
+
+    def test_pickle(self):
+        selection = pickle.loads(pickle.dumps(Selection("pairs: name(#1) H")))
+        self.assertEqual(selection.string, "pairs: name(#1) H")
+        self.assertEqual(selection.size, 2)
+
+    def test_evaluate_selections(self):
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            steps = [0, 10, 50, 99]
+            oxygens, close = evaluate_selections(
+                trajectory, ["name O", Selection("pairs: distance(#1, #2) < 1.5")],
+                steps=steps, processes=2
+            )
+            self.assertIsInstance(oxygens, SelectionMatches)
+            self.assertEqual(len(oxygens), 4)
+            self.assertEqual(oxygens.counts().tolist(), [99, 99, 99, 99])
+            self.assertEqual(close.values.shape[1], 2)
+
+            for i, step in enumerate(steps):
+                frame = trajectory.read_step(step)
+                self.assertEqual(oxygens[i].tolist(), Selection("name O").evaluate(frame))
+                expected = Selection("pairs: distance(#1, #2) < 1.5").evaluate(frame)
+                self.assertEqual(list(map(tuple, close[i].tolist())), expected)
+
+            # all the steps, with workers reading the file concurrently
+            strings = ["x < 10", "pairs: distance(#1, #2) < 1.5"]
+            parallel = evaluate_selections(trajectory, strings, processes=4)
+            serial = evaluate_selections(trajectory, strings, processes=1)
+            for matches, expected in zip(parallel, serial):
+                self.assertEqual(len(matches), 100)
+                self.assertTrue(np.array_equal(matches.offsets, expected.offsets))
+                self.assertTrue(np.array_equal(matches.values, expected.values))
+            for step in range(100):
+                frame = trajectory.read_step(step)
+                self.assertEqual(parallel[0][step].tolist(), Selection("x < 10").evaluate(frame))
+
+            matches = evaluate_selections(trajectory, "name H", steps=range(3), processes=1)
+            self.assertEqual(len(matches), 3)
+            self.assertEqual(len(matches[-1]), 198)
+            self.assertRaises(IndexError, matches.__getitem__, 3)
+
+            matches = evaluate_selections(trajectory, "bonds: all", steps=[])
+            self.assertEqual(len(matches), 0)
+            self.assertEqual(matches.values.shape, (0, 2))
+
+    def test_selection_set(self):
+        frame = testing_frame()
+        selections = SelectionSet(["name H", Selection("bonds: all"), "name O", "name H"])
+        self.assertEqual(len(selections), 4)
+        self.assertEqual(selections[1].string, "bonds: all")
+        self.assertEqual([s.size for s in selections], [1, 2, 1, 1])
+
+        matches = selections.evaluate(frame)
+        self.assertEqual(len(matches), 4)
+        self.assertEqual(matches[0].tolist(), [0, 3])
+        self.assertEqual(matches[1].shape, (3, 2))
+        self.assertEqual(matches[2].tolist(), [1, 2])
+        self.assertEqual(matches[3].tolist(), [0, 3])
+        self.assertIsNot(matches[0], matches[3])
+
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            selections = SelectionSet(["name O", "x < 5", "name O"])
+            results = list(selections.evaluate_trajectory(trajectory, range(3), static_topology=True))
+            self.assertEqual(len(results), 3)
+            for frame, matches in results:
+                self.assertEqual(matches[0].tolist(), Selection("name O").evaluate(frame))
+                self.assertEqual(matches[1].tolist(), Selection("x < 5").evaluate(frame))
+            self.assertIs(results[0][1][0], results[2][1][2])
+
+    def test_numpy_engine(self):
+        with self.assertRaises(ChemfilesError):
+            SelectionSet(["name H"], engine="foo")
+
+        frame = testing_frame()
+        strings = ["name H", "bonds: all", "not name O and index > 0", "all"]
+        selections = SelectionSet(strings, engine="numpy")
+        matches = selections.evaluate(frame)
+        for string, result in zip(strings, matches):
+            self.assertEqual(result.dtype, np.uint64)
+            self.assertEqual(result.tolist(), Selection(string).evaluate_array(frame).tolist())
+
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            strings = ["name O", "x < 5 and name H", "resname WAT"]
+            selections = SelectionSet(strings, engine="numpy")
+            results = selections.evaluate_trajectory(trajectory, range(3), static_topology=True)
+            for frame, matches in results:
+                for string, result in zip(strings, matches):
+                    self.assertEqual(result.tolist(), Selection(string).evaluate(frame))
+
+    def test_cached(self):
+        Selection.clear_cache()
+        selection = Selection.cached("name H")
+        self.assertEqual(selection.string, "name H")
+        self.assertIs(Selection.cached("name H"), selection)
+        self.assertIsNot(Selection.cached("name O"), selection)
+
+        Selection.set_cache_size(2)
+        try:
+            # "name H" is the most recently used, "name O" is evicted
+            self.assertIs(Selection.cached("name H"), selection)
+            Selection.cached("index 0")
+            self.assertIs(Selection.cached("name H"), selection)
+
+            Selection.cached("index 1")
+            Selection.cached("index 2")
+            self.assertIsNot(Selection.cached("name H"), selection)
+
+            with self.assertRaises(ChemfilesError):
+                Selection.set_cache_size(-1)
+        finally:
+            Selection.set_cache_size(128)
+
+        Selection.clear_cache()
+        self.assertIsNot(Selection.cached("name H"), selection)
+
+    def test_threads(self):
+        frame = testing_frame()
+        selection = Selection.cached("name O")
+        results = []
+
+        def evaluate():
+            for _ in range(100):
+                results.append(Selection.cached("name O").evaluate(frame))
+
+        threads = [threading.Thread(target=evaluate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 400)
+        self.assertTrue(all(res == [1, 2] for res in results))
+        self.assertEqual(selection.evaluate(frame), [1, 2])
+
 
 if __name__ == "__main__":
     unittest.main()
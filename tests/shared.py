@@ -0,0 +1,102 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import multiprocessing
+import subprocess
+import pickle
+import sys
+import os
+
+from chemfiles import Frame, Atom, UnitCell, CellShape, SharedFrame, ChemfilesError
+
+
+def read_positions(handle):
+    with handle.attach() as view:
+        return view.positions.tolist()
+
+
+ATTACH_SCRIPT = """
+import pickle, sys
+handle = pickle.loads(bytes.fromhex(sys.argv[1]))
+with handle.attach() as view:
+    assert view.positions.tolist() == [[1, 2, 3]]
+"""
+
+
+@unittest.skipIf(sys.version_info < (3, 8), "shared memory requires Python 3.8")
+class TestSharedFrame(unittest.TestCase):
+    def test_publish_and_attach(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 11, 12, 90, 80, 120)
+        frame.step = 33
+        frame.add_atom(Atom("O"), (1, 2, 3))
+        frame.add_atom(Atom("H"), (4, 5, 6))
+        frame.add_bond(0, 1)
+
+        with SharedFrame(frame) as shared:
+            handle = pickle.loads(pickle.dumps(shared.handle))
+            with handle.attach() as view:
+                self.assertEqual(len(view), 2)
+                self.assertEqual(view.positions.tolist(), [[1, 2, 3], [4, 5, 6]])
+                self.assertFalse(view.has_velocities())
+                self.assertEqual(view.velocities, None)
+                self.assertEqual(view.step, 33)
+                self.assertEqual(view.cell.lengths, (10, 11, 12))
+                self.assertEqual(view.cell.angles, (90, 80, 120))
+                self.assertEqual(view.cell.shape, CellShape.Triclinic)
+                self.assertEqual([atom.name for atom in view.topology.atoms], ["O", "H"])
+                self.assertEqual(view.topology.bonds.tolist(), [[0, 1]])
+
+                with self.assertRaises(ValueError):
+                    view.positions[0, 0] = 3
+
+                frame.positions[0] = (7, 8, 9)
+                frame.step = 34
+                shared.publish(frame)
+                self.assertEqual(view.positions.tolist(), [[7, 8, 9], [4, 5, 6]])
+                self.assertEqual(view.step, 34)
+
+                copy = view.to_frame()
+                self.assertEqual(copy.positions.tolist(), [[7, 8, 9], [4, 5, 6]])
+                self.assertEqual(copy.topology.bonds.tolist(), [[0, 1]])
+
+    def test_velocities(self):
+        frame = Frame()
+        frame.add_velocities()
+        frame.add_atom(Atom("O"), (1, 2, 3), (3, 2, 1))
+
+        with SharedFrame(frame) as shared:
+            with shared.handle.attach() as view:
+                self.assertTrue(view.has_velocities())
+                self.assertEqual(view.velocities.tolist(), [[3, 2, 1]])
+
+            frame.add_atom(Atom("O"), (1, 2, 3), (3, 2, 1))
+            with self.assertRaises(ChemfilesError):
+                shared.publish(frame)
+
+    def test_workers_exit(self):
+        frame = Frame()
+        frame.add_atom(Atom("O"), (1, 2, 3))
+
+        with SharedFrame(frame) as shared:
+            # the block must survive the exit of processes attached to it
+            pool = multiprocessing.get_context("spawn").Pool(2)
+            try:
+                positions = pool.map(read_positions, [shared.handle] * 2)
+            finally:
+                pool.close()
+                pool.join()
+            self.assertEqual(positions, [[[1, 2, 3]]] * 2)
+
+            data = pickle.dumps(shared.handle, protocol=2)
+            environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+            subprocess.check_call(
+                [sys.executable, "-c", ATTACH_SCRIPT, data.hex()], env=environment
+            )
+
+            with shared.handle.attach() as view:
+                self.assertEqual(view.positions.tolist(), [[1, 2, 3]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding=utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+import unittest
+import numpy as np
+import os
+
+from chemfiles import Trajectory, Frame, Atom, UnitCell, CellShape, FrameStore
+from chemfiles import ChemfilesError
+
+
+def get_data_path(data):
+    root = os.path.dirname(__file__)
+    return os.path.join(root, "data", data)
+
+
+class TestFrameStore(unittest.TestCase):
+    def test_store(self):
+        frame = Frame()
+        frame.cell = UnitCell(10, 11, 12)
+        frame.step = 3
+        frame.add_atom(Atom("O"), (1.23456789, 2, 3))
+        frame.add_atom(Atom("H"), (-4, 5.5, 6))
+
+        for dtype in ["float32", "int32"]:
+            store = FrameStore(dtype, precision=1e-3)
+            store.append(frame)
+            frame.positions[0] = (7, 8, 9)
+            frame.cell = UnitCell(20, 20, 20, 90, 90, 100)
+            frame.step = 4
+            store.append(frame)
+            self.assertEqual(len(store), 2)
+            self.assertEqual(store.nbytes, 2 * 2 * 3 * 4)
+
+            positions = store.positions(0)
+            self.assertEqual(positions.dtype, np.float64)
+            self.assertTrue(np.allclose(positions, [[1.23456789, 2, 3], [-4, 5.5, 6]], atol=5e-4))
+
+            copy = store[1]
+            self.assertEqual(copy.step, 4)
+            self.assertEqual(copy.atoms[1].name, "H")
+            self.assertEqual(copy.cell.shape, CellShape.Triclinic)
+            self.assertTrue(np.allclose(copy.positions, [[7, 8, 9], [-4, 5.5, 6]]))
+
+            positions = store.read_positions(selection="name O")
+            self.assertEqual(positions.shape, (2, 1, 3))
+            self.assertTrue(np.allclose(positions[1], [[7, 8, 9]]))
+
+            frame.positions[0] = (1.23456789, 2, 3)
+            frame.cell = UnitCell(10, 11, 12)
+            frame.step = 3
+
+        with self.assertRaises(ChemfilesError):
+            FrameStore("float16")
+
+        frame.resize(3)
+        with self.assertRaises(ChemfilesError):
+            store.append(frame)
+
+    def test_large_values(self):
+        frame = Frame()
+        frame.add_atom(Atom("O"), (1e7, 0, 0))
+        store = FrameStore("int32", precision=1e-3)
+        store.append(frame)
+        self.assertTrue(np.allclose(store.positions(0), [[1e7, 0, 0]]))
+
+    def test_trajectory(self):
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            store = FrameStore.from_trajectory(trajectory, range(0, 100, 10), "int32")
+            self.assertEqual(len(store), 10)
+            expected = trajectory.read_positions(range(0, 100, 10))
+            self.assertTrue(np.allclose(store.read_positions(), expected, atol=5e-4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,10 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import unittest
 import copy
+import pickle
 import numpy as np
 
-from chemfiles import Topology, Atom, Residue, BondOrder, ChemfilesError
+from chemfiles import Topology, Frame, Atom, Residue, BondOrder, BondGraph, ChemfilesError
 from _utils import remove_warnings
 
 
@@ -33,6 +34,33 @@ class TestTopology(unittest.TestCase):
         self.assertEqual(len(topology.atoms), 8)
         self.assertEqual(len(cloned.atoms), 4)
 
+    def test_pickle(self):
+        topology = Topology()
+        topology.atoms.append(Atom("O"))
+        topology.atoms.append(Atom("H1", "H"))
+        topology.atoms.append(Atom("H2", "H"))
+        topology.atoms[0].charge = -0.8
+        topology.atoms[1]["foo"] = (1, 2, 3)
+        topology.add_bond(0, 1, BondOrder.Single)
+        topology.add_bond(0, 2)
+
+        residue = Residue("WAT", 3)
+        residue.atoms.append(0)
+        topology.residues.append(residue)
+
+        cloned = pickle.loads(pickle.dumps(topology))
+        self.assertEqual([atom.name for atom in cloned.atoms], ["O", "H1", "H2"])
+        self.assertEqual([atom.type for atom in cloned.atoms], ["O", "H", "H"])
+        self.assertEqual(cloned.atoms[0].charge, -0.8)
+        self.assertEqual(cloned.atoms[1]["foo"], (1, 2, 3))
+        self.assertEqual(cloned.atoms[2].list_properties(), [])
+        self.assertEqual(cloned.bonds.tolist(), [[0, 1], [0, 2]])
+        self.assertEqual(cloned.bonds_orders, [BondOrder.Single, BondOrder.Unknown])
+        self.assertEqual(cloned.angles.tolist(), [[1, 0, 2]])
+        self.assertEqual(cloned.residues[0].name, "WAT")
+        self.assertEqual(cloned.residues[0].id, 3)
+        self.assertEqual(list(cloned.residues[0].atoms), [0])
+
     def test_size(self):
         topology = Topology()
 
@@ -85,6 +113,42 @@ class TestTopology(unittest.TestCase):
             [BondOrder.Unknown, BondOrder.Unknown, BondOrder.Aromatic]
         )
 
+    def test_bulk_bonds(self):
+        topology = Topology()
+        topology.resize(6)
+        topology.add_bond(0, 1)
+
+        topology.add_bonds(
+            np.array([[2, 1], [4, 3], [1, 0], [3, 4], [5, 0]]),
+            [
+                BondOrder.Single,
+                BondOrder.Double,
+                BondOrder.Triple,
+                BondOrder.Single,
+                BondOrder.Aromatic,
+            ],
+        )
+        self.assertEqual(topology.bonds.tolist(), [[0, 1], [0, 5], [1, 2], [3, 4]])
+        self.assertEqual(
+            topology.bonds_orders,
+            [BondOrder.Unknown, BondOrder.Aromatic, BondOrder.Single, BondOrder.Double]
+        )
+        self.assertEqual(topology.angles.tolist(), [[0, 1, 2], [1, 0, 5]])
+
+        topology.add_bonds(np.zeros((0, 2)))
+        self.assertEqual(topology.bonds_count(), 4)
+
+        topology.remove_bonds([[1, 2], [5, 0], [2, 3]])
+        self.assertEqual(topology.bonds.tolist(), [[0, 1], [3, 4]])
+
+        with self.assertRaises(ChemfilesError):
+            topology.add_bonds([[0, 6]])
+        with self.assertRaises(ChemfilesError):
+            topology.add_bonds([0, 1, 2])
+        with self.assertRaises(ChemfilesError):
+            topology.add_bonds([[0, 2], [0, 3]], [BondOrder.Single])
+        self.assertEqual(topology.bonds_count(), 2)
+
     def test_angles(self):
         topology = Topology()
         topology.resize(4)
@@ -130,6 +194,77 @@ class TestTopology(unittest.TestCase):
             np.array([[0, 1, 2, 3]]).all()
         )
 
+    def test_cached_arrays(self):
+        topology = Topology()
+        topology.resize(4)
+        topology.add_bond(0, 1)
+        topology.add_bond(1, 2)
+
+        bonds = topology.bonds
+        self.assertIs(topology.bonds, bonds)
+        self.assertFalse(bonds.flags.writeable)
+        with self.assertRaises(ValueError):
+            bonds[0, 0] = 3
+
+        angles = topology.angles
+        self.assertIs(topology.angles, angles)
+        self.assertEqual(angles.tolist(), [[0, 1, 2]])
+
+        topology.add_bond(2, 3)
+        self.assertEqual(bonds.tolist(), [[0, 1], [1, 2]])
+        self.assertEqual(topology.bonds.tolist(), [[0, 1], [1, 2], [2, 3]])
+        self.assertEqual(topology.angles.tolist(), [[0, 1, 2], [1, 2, 3]])
+        self.assertEqual(topology.dihedrals.tolist(), [[0, 1, 2, 3]])
+
+        topology.remove_bond(0, 1)
+        self.assertEqual(topology.bonds.tolist(), [[1, 2], [2, 3]])
+        self.assertEqual(topology.dihedrals.tolist(), [])
+
+        del topology.atoms[0]
+        self.assertEqual(topology.bonds.tolist(), [[0, 1], [1, 2]])
+
+        topology.resize(2)
+        self.assertEqual(topology.bonds.tolist(), [[0, 1]])
+
+        frame = Frame()
+        frame.resize(3)
+        frame.add_bond(0, 1)
+        topology = frame.topology
+        self.assertEqual(topology.bonds.tolist(), [[0, 1]])
+        frame.add_bond(1, 2)
+        self.assertEqual(topology.bonds.tolist(), [[0, 1], [1, 2]])
+
+    def test_adjacency(self):
+        topology = Topology()
+        topology.resize(6)
+        topology.add_bond(0, 1)
+        topology.add_bond(1, 2, BondOrder.Double)
+        topology.add_bond(1, 3)
+        topology.add_bond(3, 4, BondOrder.Aromatic)
+
+        graph = topology.adjacency()
+        self.assertIsInstance(graph, BondGraph)
+        self.assertIs(topology.adjacency(), graph)
+        self.assertEqual(len(graph), 6)
+        self.assertEqual(graph.degrees.tolist(), [1, 3, 1, 2, 1, 0])
+        self.assertEqual(graph.offsets.tolist(), [0, 1, 4, 5, 7, 8, 8])
+        self.assertEqual(graph.neighbors_of(1).tolist(), [0, 2, 3])
+        self.assertEqual(graph.neighbors_of(5).tolist(), [])
+        self.assertEqual(
+            graph.orders_of(1).tolist(),
+            [BondOrder.Unknown, BondOrder.Double, BondOrder.Unknown]
+        )
+        self.assertEqual(graph.orders_of(4).tolist(), [BondOrder.Aromatic])
+
+        bonds = topology.bonds.tolist()
+        for i in range(6):
+            for j, edge in zip(graph.neighbors_of(i), graph.edges_of(i)):
+                self.assertEqual(sorted(bonds[edge]), sorted([i, j]))
+
+        topology.remove_bond(0, 1)
+        graph = topology.adjacency()
+        self.assertEqual(graph.degrees.tolist(), [0, 2, 1, 2, 1, 0])
+
     def test_out_of_bounds(self):
         topology = Topology()
         topology.resize(4)
@@ -178,6 +313,9 @@ class TestTopology(unittest.TestCase):
         topology.add_bond(2, 3)
         self.assertTrue(topology.residues_linked(first, second))
 
+        indexes = topology.residue_indexes()
+        self.assertEqual(indexes.tolist(), [-1, 1, 1, 0, 0, -1])
+
     def test_iter(self):
         topology = Topology()
         topology.resize(6)
@@ -194,6 +332,43 @@ class TestTopology(unittest.TestCase):
             self.assertEqual(residue.name, "foo")
         self.assertEqual(i, 2)
 
+    def test_atoms_table(self):
+        topology = Topology()
+        topology.atoms.append(Atom("O1", "O"))
+        topology.atoms.append(Atom("H1", "H"))
+        topology.atoms.append(Atom("a-very-long-atom-name-to-check-buffers-growth", "Zn"))
+
+        table = topology.atoms.table()
+        self.assertEqual(len(table), 3)
+        self.assertEqual(
+            table.names.tolist(),
+            ["O1", "H1", "a-very-long-atom-name-to-check-buffers-growth"]
+        )
+        self.assertEqual(table.types.tolist(), ["O", "H", "Zn"])
+        self.assertEqual(table.atomic_numbers.tolist(), [8, 1, 30])
+        self.assertEqual(table.charges.tolist(), [0, 0, 0])
+        self.assertAlmostEqual(table.masses[0], 15.999, places=3)
+        self.assertAlmostEqual(table.covalent_radii[1], topology.atoms[1].covalent_radius)
+        self.assertAlmostEqual(table.vdw_radii[2], topology.atoms[2].vdw_radius)
+
+        table = topology.atoms.table(["masses"])
+        self.assertEqual(table.names, None)
+        self.assertEqual(table.masses.shape, (3,))
+
+        with self.assertRaises(ChemfilesError):
+            topology.atoms.table(["foo"])
+
+        table = topology.atoms.table()
+        table.charges[:] = [-0.8, 0.4, 0.4]
+        topology.atoms.set_table(table, names=["A", "B", "C"], masses=[1, 2, 3])
+        self.assertEqual([atom.name for atom in topology.atoms], ["A", "B", "C"])
+        self.assertEqual([atom.type for atom in topology.atoms], ["O", "H", "Zn"])
+        self.assertEqual([atom.mass for atom in topology.atoms], [1, 2, 3])
+        self.assertEqual([atom.charge for atom in topology.atoms], [-0.8, 0.4, 0.4])
+
+        with self.assertRaises(ChemfilesError):
+            topology.atoms.set_table(names=["A"])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,6 +3,7 @@ from __future__ import absolute_import, print_function, unicode_literals
 import unittest
 import numpy as np
 import os
+import pickle
 from ctypes import ArgumentError
 
 from chemfiles import Trajectory, Topology, Frame, UnitCell, Atom
@@ -94,6 +95,39 @@ class TestTrajectory(unittest.TestCase):
         frame = trajectory.read()
         self.assertEqual(frame.atoms[100].name, "Rd")
 
+    def test_read_positions(self):
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            positions = trajectory.read_positions([0, 41, 10])
+            self.assertEqual(positions.shape, (3, 297, 3))
+            self.assertTrue(np.array_equal(positions[1], trajectory.read_step(41).positions))
+
+            positions = trajectory.read_positions(selection="name O")
+            self.assertEqual(positions.shape, (100, 99, 3))
+            frame = trajectory.read_step(99)
+            self.assertTrue(np.array_equal(positions[99], frame.positions[::3]))
+
+            positions = trajectory.read_positions(range(2), selection=[0, 124])
+            self.assertEqual(positions.shape, (2, 2, 3))
+            frame = trajectory.read_step(1)
+            self.assertTrue(np.array_equal(positions[1], frame.positions[[0, 124]]))
+
+    def test_pickle(self):
+        with Trajectory(get_data_path("water.xyz")) as trajectory:
+            trajectory.set_cell(UnitCell(30, 30, 30))
+            trajectory.set_topology(get_data_path("topology.xyz"), "XYZ")
+            copy = pickle.loads(pickle.dumps(trajectory))
+            self.assertEqual(copy.path, trajectory.path)
+            self.assertEqual(copy.nsteps, 100)
+
+            frame = copy.read_step(41)
+            self.assertEqual(frame.cell.lengths, (30.0, 30.0, 30.0))
+            self.assertEqual(frame.atoms[100].name, "Rd")
+            copy.close()
+
+        with Trajectory("test-tmp.xyz", "w") as trajectory:
+            self.assertRaises(ChemfilesError, pickle.dumps, trajectory)
+        os.unlink("test-tmp.xyz")
+
     def test_protocols(self):
         with Trajectory(get_data_path("water.xyz")) as trajectory:
             for frame in trajectory: